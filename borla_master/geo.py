@@ -0,0 +1,154 @@
+"""
+Distance kernels shared across apps.
+
+Two models, each as a scalar fast path (plain `math`, for one pair in a
+request) and a NumPy path (broadcast over arrays, for batch jobs):
+
+- haversine: great circle on a sphere of the mean Earth radius; error up to
+  about 0.5 % against the ellipsoid, which is negligible for proximity
+  checks and ranking;
+- vincenty: Vincenty's inverse formula on the WGS 84 ellipsoid, agreeing
+  with geopy's geodesic to well under a millimetre for any non-antipodal
+  pair. Pairs that fail to converge (nearly antipodal points) fall back to
+  haversine.
+
+All functions take degrees and return metres. Run `python -m
+borla_master.geo_bench` to compare them with geopy.
+"""
+import math
+
+import numpy as np
+
+
+EARTH_RADIUS_M = 6_371_008.8
+
+# WGS 84
+WGS84_A = 6_378_137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+
+VINCENTY_MAX_ITERATIONS = 200
+VINCENTY_TOLERANCE = 1e-12
+
+
+# ---------------------------
+# Haversine
+# ---------------------------
+
+def haversine(lat1, lng1, lat2, lng2):
+    """Great-circle distance in metres between two points."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def haversine_array(lat1, lng1, lat2, lng2):
+    """Vectorized haversine(); arguments broadcast against each other."""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    a = (np.sin((phi2 - phi1) / 2) ** 2
+         + np.cos(phi1) * np.cos(phi2) * np.sin(np.radians(np.subtract(lng2, lng1)) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+# ---------------------------
+# Vincenty (WGS 84)
+# ---------------------------
+
+def vincenty(lat1, lng1, lat2, lng2):
+    """Ellipsoidal (WGS 84) distance in metres between two points."""
+    if lat1 == lat2 and lng1 == lng2:
+        return 0.0
+    u1 = math.atan((1 - WGS84_F) * math.tan(math.radians(lat1)))
+    u2 = math.atan((1 - WGS84_F) * math.tan(math.radians(lat2)))
+    sin_u1, cos_u1 = math.sin(u1), math.cos(u1)
+    sin_u2, cos_u2 = math.sin(u2), math.cos(u2)
+    big_l = math.radians(lng2 - lng1)
+    lam = big_l
+
+    for _ in range(VINCENTY_MAX_ITERATIONS):
+        sin_lam, cos_lam = math.sin(lam), math.cos(lam)
+        sin_sigma = math.hypot(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)
+        if sin_sigma == 0:
+            return 0.0
+        cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+        sigma = math.atan2(sin_sigma, cos_sigma)
+        sin_alpha = cos_u1 * cos_u2 * sin_lam / sin_sigma
+        cos2_alpha = 1 - sin_alpha ** 2
+        cos_2sm = cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha if cos2_alpha else 0.0
+        c = WGS84_F / 16 * cos2_alpha * (4 + WGS84_F * (4 - 3 * cos2_alpha))
+        previous = lam
+        lam = big_l + (1 - c) * WGS84_F * sin_alpha * (
+            sigma + c * sin_sigma * (cos_2sm + c * cos_sigma * (-1 + 2 * cos_2sm ** 2))
+        )
+        if abs(lam - previous) < VINCENTY_TOLERANCE:
+            break
+    else:
+        return haversine(lat1, lng1, lat2, lng2)
+
+    u_sq = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+    big_a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+    big_b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+    delta_sigma = big_b * sin_sigma * (
+        cos_2sm + big_b / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sm ** 2)
+            - big_b / 6 * cos_2sm * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sm ** 2)
+        )
+    )
+    return WGS84_B * big_a * (sigma - delta_sigma)
+
+
+def vincenty_array(lat1, lng1, lat2, lng2):
+    """
+    Vectorized vincenty(); arguments broadcast against each other. Every
+    pair iterates until all have converged (a handful of rounds at city
+    scale); pairs that never converge fall back to haversine.
+    """
+    lat1, lng1, lat2, lng2 = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (lat1, lng1, lat2, lng2)))
+    u1 = np.arctan((1 - WGS84_F) * np.tan(np.radians(lat1)))
+    u2 = np.arctan((1 - WGS84_F) * np.tan(np.radians(lat2)))
+    sin_u1, cos_u1 = np.sin(u1), np.cos(u1)
+    sin_u2, cos_u2 = np.sin(u2), np.cos(u2)
+    big_l = np.radians(lng2 - lng1)
+    lam = big_l.copy()
+    converged = np.zeros(lam.shape, dtype=bool)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(VINCENTY_MAX_ITERATIONS):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.hypot(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)
+            cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cos_u1 * cos_u2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            cos_2sm = np.where(cos2_alpha == 0, 0.0, cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha)
+            c = WGS84_F / 16 * cos2_alpha * (4 + WGS84_F * (4 - 3 * cos2_alpha))
+            updated = big_l + (1 - c) * WGS84_F * sin_alpha * (
+                sigma + c * sin_sigma * (cos_2sm + c * cos_sigma * (-1 + 2 * cos_2sm ** 2))
+            )
+            converged = np.abs(updated - lam) < VINCENTY_TOLERANCE
+            lam = np.where(converged, lam, updated)
+            if converged.all():
+                break
+
+        u_sq = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+        big_a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+        big_b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+        delta_sigma = big_b * sin_sigma * (
+            cos_2sm + big_b / 4 * (
+                cos_sigma * (-1 + 2 * cos_2sm ** 2)
+                - big_b / 6 * cos_2sm * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sm ** 2)
+            )
+        )
+        metres = WGS84_B * big_a * (sigma - delta_sigma)
+
+    metres = np.where(sin_sigma == 0, 0.0, metres)
+    failed = ~converged | ~np.isfinite(metres)
+    if failed.any():
+        metres = np.where(failed, haversine_array(lat1, lng1, lat2, lng2), metres)
+    return metres
+
+
+def within(lat1, lng1, lat2, lng2, threshold_m):
+    """True when the points are at most `threshold_m` apart (ellipsoidal distance)."""
+    return vincenty(lat1, lng1, lat2, lng2) <= threshold_m
@@ -0,0 +1,67 @@
+"""
+Microbenchmark of borla_master.geo against geopy's geodesic.
+
+    python -m borla_master.geo_bench [--pairs N]
+
+Random point pairs around Accra, typically a few kilometres apart (the
+completion check's case), are measured one at a time with each scalar
+function and all at once with the array kernels. Reports the time per pair
+and the largest difference from geopy. Needs geopy, which the app itself
+no longer imports.
+"""
+import argparse
+import time
+
+import numpy as np
+from geopy.distance import geodesic
+
+from borla_master import geo
+
+
+CENTRE = (5.6037, -0.1870)
+SPREAD_DEGREES = 0.03
+
+
+def _pairs(n, seed=0):
+    rng = np.random.default_rng(seed)
+    a = np.asarray(CENTRE) + rng.uniform(-0.15, 0.15, (n, 2))
+    b = a + rng.normal(0, SPREAD_DEGREES, (n, 2))
+    return a, b
+
+
+def _timed(fn, repeat=3):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, np.asarray(result, dtype=float)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pairs', type=int, default=20_000)
+    n = parser.parse_args(argv).pairs
+    a, b = _pairs(n)
+    rows_a, rows_b = a.tolist(), b.tolist()
+
+    cases = [
+        ('geopy geodesic', lambda: [geodesic(p, q).meters for p, q in zip(rows_a, rows_b)]),
+        ('geo.vincenty', lambda: [geo.vincenty(*p, *q) for p, q in zip(rows_a, rows_b)]),
+        ('geo.haversine', lambda: [geo.haversine(*p, *q) for p, q in zip(rows_a, rows_b)]),
+        ('geo.vincenty_array', lambda: geo.vincenty_array(a[:, 0], a[:, 1], b[:, 0], b[:, 1])),
+        ('geo.haversine_array', lambda: geo.haversine_array(a[:, 0], a[:, 1], b[:, 0], b[:, 1])),
+    ]
+    reference = None
+    print(f"{n} pairs")
+    print(f"{'':22}{'per pair':>12}{'speed-up':>10}{'max |error|':>14}")
+    for name, fn in cases:
+        seconds, metres = _timed(fn)
+        if reference is None:
+            reference, base = metres, seconds
+        print(f"{name:22}{seconds / n * 1e6:>10.3f}µs{base / seconds:>9.0f}x"
+              f"{np.abs(metres - reference).max():>12.6f} m")
+
+
+if __name__ == '__main__':
+    main()
@@ -173,3 +173,16 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Offline road graph for route travel times (routes.travel_matrix).
+# Built from an OSM extract with `manage.py build_road_graph`; routes fall
+# back to straight-line distance when the file is missing.
+ROAD_GRAPH_PATH = env("ROAD_GRAPH_PATH", default=str(BASE_DIR / "data" / "road_graph.npz"))
+TRAVEL_MATRIX_CACHE_MAX_ROWS = env.int("TRAVEL_MATRIX_CACHE_MAX_ROWS", default=2_000_000)
+
+# Disk cache for the zones layer of /api/zones/tiles/ (zones.tiles); empty disables it
+ZONE_TILE_CACHE_DIR = env("ZONE_TILE_CACHE_DIR", default=str(BASE_DIR / "data" / "tiles"))
+
+# Days of collector GPS breadcrumbs kept (collector.breadcrumbs); older daily partitions are dropped
+PING_RETENTION_DAYS = env.int("PING_RETENTION_DAYS", default=90)
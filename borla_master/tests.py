@@ -0,0 +1,31 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from . import geo
+
+
+class VincentyTests(SimpleTestCase):
+    # (lat1, lng1, lat2, lng2, metres) from geopy's geodesic (Karney) on WGS 84
+    KNOWN = [
+        (5.6037, -0.1870, 6.6885, -1.6244, 199255.178),     # Accra - Kumasi
+        (5.6, -0.2, 5.601, -0.2, 110.585),
+        (51.5074, -0.1278, 40.7128, -74.0060, 5585233.579),  # London - New York
+    ]
+
+    def test_known_distances(self):
+        for lat1, lng1, lat2, lng2, metres in self.KNOWN:
+            self.assertAlmostEqual(geo.vincenty(lat1, lng1, lat2, lng2), metres, places=2)
+        lat1, lng1, lat2, lng2, metres = np.array(self.KNOWN).T
+        np.testing.assert_allclose(geo.vincenty_array(lat1, lng1, lat2, lng2), metres, atol=1e-2)
+
+    def test_coincident_points(self):
+        self.assertEqual(geo.vincenty(5.6, -0.2, 5.6, -0.2), 0.0)
+        self.assertEqual(geo.vincenty_array([5.6, 0.0], [-0.2, 0.0], [5.6, 0.0], [-0.2, 0.0]).tolist(), [0.0, 0.0])
+
+    def test_near_antipodal_falls_back_to_haversine(self):
+        for lat1, lng1, lat2, lng2 in [(0.0, 0.0, 0.5, 179.7), (0.0, 0.0, 0.0, 180.0)]:
+            expected = geo.haversine(lat1, lng1, lat2, lng2)
+            self.assertAlmostEqual(geo.vincenty(lat1, lng1, lat2, lng2), expected, places=3)
+            result = geo.vincenty_array([lat1, 5.6], [lng1, -0.2], [lat2, 5.601], [lng2, -0.2])
+            self.assertAlmostEqual(result[0], expected, places=3)
+            self.assertAlmostEqual(result[1], 110.585, places=2)  # converged pairs are unaffected
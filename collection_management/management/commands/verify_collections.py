@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from collection_management.verification import DEFAULT_THRESHOLD_M, verify_day
+
+
+class Command(BaseCommand):
+    help = "Check a day's completed collections against their pickup points and list those recorded too far away."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Collection date (YYYY-MM-DD). Defaults to yesterday.")
+        parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD_M,
+                            help=f"Metres from the pickup point (default {DEFAULT_THRESHOLD_M:g}).")
+
+    def handle(self, *args, **options):
+        day = parse_date(options['date']) if options['date'] else timezone.now().date() - timedelta(days=1)
+        if day is None:
+            raise CommandError("--date must be YYYY-MM-DD.")
+
+        started = timezone.now()
+        result = verify_day(day, options['threshold'])
+        seconds = (timezone.now() - started).total_seconds()
+        for collection_id, metres in result['far']:
+            self.stdout.write(f"Collection #{collection_id}: {metres} m from pickup point")
+        self.stdout.write(self.style.SUCCESS(
+            f"{day}: {result['checked']} checked, {result['within']} within {options['threshold']:g} m, "
+            f"{len(result['far'])} too far, {result['unverifiable']} without GPS or pickup point ({seconds:.1f}s)."
+        ))
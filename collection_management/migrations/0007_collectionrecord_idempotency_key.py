@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-16 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collection_management', '0006_alter_collectionrecord_amount_paid_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collectionrecord',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
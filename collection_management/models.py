@@ -3,6 +3,8 @@ from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
 
+from borla_master import geo
+
 
 class CollectionRecord(models.Model):
     """
@@ -118,6 +120,9 @@ class CollectionRecord(models.Model):
 
     notes = models.TextField(blank=True, null=True)
 
+    # Set by offline batch uploads so a retried completion is applied only once
+    idempotency_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
+
     # Audit
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
@@ -157,16 +162,18 @@ class CollectionRecord(models.Model):
             parts.append(f"~{self.estimated_volume_liters}L")
         return ", ".join(parts) if parts else "No volume data"
 
+    def location_distance_m(self):
+        """Metres between the recorded GPS fix and the stop's pickup point, or None when either is unknown."""
+        if self.latitude is None or self.longitude is None or self.route_stop is None:
+            return None
+        target = self.route_stop.effective_location
+        if not target:
+            return None
+        return geo.vincenty(float(self.latitude), float(self.longitude), target.y, target.x)
+
     def verify_location(self, threshold_meters=100):
-        """Check if GPS location matches client address within threshold."""
-        if not (self.latitude and self.longitude and self.client.latitude and self.client.longitude):
+        """Check if GPS location matches the pickup point within threshold."""
+        distance = self.location_distance_m()
+        if distance is None:
             return None
-        from math import radians, sin, cos, sqrt, atan2
-        R = 6371000
-        lat1, lon1 = radians(float(self.latitude)), radians(float(self.longitude))
-        lat2, lon2 = radians(float(self.client.latitude)), radians(float(self.client.longitude))
-        dlat, dlon = lat2 - lat1, lon2 - lon1
-        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-        c = 2 * atan2(sqrt(a), sqrt(1-a))
-        distance = R * c
         return distance <= threshold_meters
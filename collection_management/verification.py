@@ -0,0 +1,68 @@
+"""
+Batch GPS verification of completed collections.
+
+Checking records one by one (CollectionRecord.verify_location) costs a
+query per record for the stop and its request. Here a whole day is one
+query returning plain coordinates, and every distance is computed in one
+call to borla_master.geo.vincenty_array.
+
+The pickup point of a record follows RouteStop.effective_location: the
+linked on-demand or scheduled request's location, else the stop's own.
+"""
+import numpy as np
+
+from borla_master import geo
+from .models import CollectionRecord
+
+
+DEFAULT_THRESHOLD_M = 100.0
+
+
+def _point(*locations):
+    for location in locations:
+        if location:
+            return location.y, location.x
+    return np.nan, np.nan
+
+
+def distances(records):
+    """
+    (collection ids, metres) for a CollectionRecord queryset, as arrays.
+    The distance is NaN when the record has no GPS fix or no pickup point.
+    """
+    rows = records.values_list(
+        'collection_id', 'latitude', 'longitude',
+        'route_stop__ondemand_request__location', 'route_stop__scheduled_request__location',
+        'route_stop__location',
+    )
+    ids, fixes, targets = [], [], []
+    for collection_id, lat, lng, ondemand_location, scheduled_location, stop_location in rows.iterator():
+        ids.append(collection_id)
+        fixes.append((np.nan, np.nan) if lat is None or lng is None else (float(lat), float(lng)))
+        targets.append(_point(ondemand_location, scheduled_location, stop_location))
+    if not ids:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    fixes, targets = np.array(fixes, dtype=float), np.array(targets, dtype=float)
+    known = ~(np.isnan(fixes).any(axis=1) | np.isnan(targets).any(axis=1))
+    metres = np.full(len(ids), np.nan)
+    if known.any():
+        metres[known] = geo.vincenty_array(fixes[known, 0], fixes[known, 1], targets[known, 0], targets[known, 1])
+    return np.array(ids, dtype=np.int64), metres
+
+
+def verify_day(day, threshold_m=DEFAULT_THRESHOLD_M):
+    """
+    Check the completed collections of `day` (by collected_at) against their
+    pickup points. Returns counts plus the ids farther than `threshold_m`,
+    farthest first.
+    """
+    ids, metres = distances(CollectionRecord.objects.filter(status='completed', collected_at__date=day))
+    known = ~np.isnan(metres)
+    far = known & (metres > threshold_m)
+    order = np.argsort(-metres[far], kind='stable')
+    return {
+        'checked': int(known.sum()),
+        'unverifiable': int((~known).sum()),
+        'within': int((known & ~far).sum()),
+        'far': [(int(i), round(float(m), 1)) for i, m in zip(ids[far][order], metres[far][order])],
+    }
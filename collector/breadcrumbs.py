@@ -0,0 +1,224 @@
+"""
+GPS breadcrumb history (CollectorLocationPing).
+
+The ping table is range-partitioned by UTC day on `recorded_at`:
+
+- partitions are created on demand the first time a flush carries pings
+  for that day (remembered per process, CREATE ... IF NOT EXISTS otherwise);
+- pings are written with COPY, the cheapest bulk path into PostgreSQL;
+- retention is a DROP TABLE per day older than PING_RETENTION_DAYS
+  (drop_old_partitions), never a DELETE;
+- time-range scans use a BRIN index on recorded_at, which stays tiny because
+  rows arrive roughly in time order; per-collector reads use the
+  (collector_id, recorded_at) btree.
+
+route_track() returns a route's actual path as one encoded polyline built
+by PostGIS, so even a long day of pings is a single short round trip.
+"""
+import io
+import re
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import CollectorLocationPing
+
+
+TABLE = CollectorLocationPing._meta.db_table
+DEFAULT_RETENTION_DAYS = 90
+FUTURE_DAYS = 1
+METRES_PER_DEGREE = 111_320.0
+POLYLINE_PRECISION = 5
+
+_PARTITION_NAME = re.compile(rf'^{TABLE}_p(\d{{8}})$')
+_COLUMNS = ('collector_id', 'recorded_at', 'location', 'accuracy_m', 'speed_mps', 'heading')
+
+_partitions = set()
+
+
+def retention_days():
+    return getattr(settings, 'PING_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)
+
+
+def partition_name(day):
+    return f'{TABLE}_p{day:%Y%m%d}'
+
+
+def _utc_midnight(day):
+    return datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+
+
+def ensure_partitions(days):
+    """Create the daily partitions for `days` that this process has not seen yet."""
+    missing = sorted(set(days) - _partitions)
+    if not missing:
+        return
+    with connection.cursor() as cursor:
+        for day in missing:
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {partition_name(day)} PARTITION OF {TABLE} '
+                f'FOR VALUES FROM (%s) TO (%s)',
+                [_utc_midnight(day), _utc_midnight(day + timedelta(days=1))],
+            )
+    # Only once committed: a rolled-back flush also rolls back the CREATE
+    transaction.on_commit(lambda: _partitions.update(missing))
+
+
+def existing_partitions():
+    """{day: partition name} of the ping table's partitions."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.relname = %s
+            """,
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = {}
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            partitions[datetime.strptime(match.group(1), '%Y%m%d').date()] = name
+    return partitions
+
+
+def drop_old_partitions(keep_days=None):
+    """Drop the partitions of days older than `keep_days` (PING_RETENTION_DAYS). Returns the days dropped."""
+    cutoff = _today() - timedelta(days=retention_days() if keep_days is None else keep_days)
+    dropped = []
+    with connection.cursor() as cursor:
+        for day, name in sorted(existing_partitions().items()):
+            if day < cutoff:
+                cursor.execute(f'DROP TABLE IF EXISTS {name}')
+                _partitions.discard(day)
+                dropped.append(day)
+    return dropped
+
+
+def _today():
+    return timezone.now().astimezone(dt_timezone.utc).date()
+
+
+# ---------------------------
+# COPY
+# ---------------------------
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _copy_buffer(pings):
+    out = io.StringIO()
+    for p in pings:
+        row = (
+            p.collector_id, p.recorded_at, f'SRID=4326;POINT({p.longitude!r} {p.latitude!r})',
+            p.accuracy_m, p.speed_mps, p.heading,
+        )
+        out.write('\t'.join(_copy_value(value) for value in row))
+        out.write('\n')
+    out.seek(0)
+    return out
+
+
+def save_pings(pings):
+    """
+    COPY `pings` (collector.telemetry.Ping) into the breadcrumb table.
+    Pings dated before the retention window or more than FUTURE_DAYS ahead
+    (bad device clocks) are skipped. Returns the number written.
+    """
+    today = _today()
+    oldest, newest = today - timedelta(days=retention_days()), today + timedelta(days=FUTURE_DAYS)
+    keep = []
+    for p in pings:
+        day = p.recorded_at.astimezone(dt_timezone.utc).date()
+        if oldest <= day <= newest:
+            keep.append((day, p))
+    if not keep:
+        return 0
+    ensure_partitions({day for day, _ in keep})
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {TABLE} ({', '.join(_COLUMNS)}) FROM STDIN",
+            _copy_buffer(p for _, p in keep),
+        )
+    return len(keep)
+
+
+# ---------------------------
+# Reading
+# ---------------------------
+
+_RANGE_SQL = f"""
+    SELECT collector_id, extract(epoch FROM recorded_at)::float8, ST_Y(location), ST_X(location),
+           COALESCE(accuracy_m, 'NaN'::float8)
+    FROM {TABLE}
+    WHERE collector_id = ANY(%s) AND recorded_at >= %s AND recorded_at < %s
+    ORDER BY collector_id, recorded_at
+"""
+
+
+def pings_between(collector_ids, start, end):
+    """
+    Pings of `collector_ids` in [start, end) as one float array of rows
+    (collector_id, epoch seconds, lat, lng, accuracy_m or NaN), sorted by
+    collector then time.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(_RANGE_SQL, [list(collector_ids), start, end])
+        rows = cursor.fetchall()
+    return np.array(rows, dtype=float).reshape(-1, 5)
+
+
+# ---------------------------
+# Route tracks
+# ---------------------------
+
+_TRACK_SQL = f"""
+    SELECT count(*), min(recorded_at), max(recorded_at),
+           ST_AsEncodedPolyline(ST_SimplifyPreserveTopology(ST_MakeLine(location ORDER BY recorded_at), %(tolerance)s),
+                                {POLYLINE_PRECISION})
+    FROM {TABLE}
+    WHERE collector_id = %(collector_id)s AND recorded_at >= %(start)s AND recorded_at < %(end)s
+"""
+
+
+def route_window(route):
+    """[start, end) of the pings that belong to `route`: its actual start/end, else its whole day."""
+    if route.actual_start:
+        end = route.actual_end or timezone.now()
+        return route.actual_start, end + timedelta(microseconds=1)
+    start = timezone.make_aware(datetime.combine(route.route_date, time.min))
+    return start, start + timedelta(days=1)
+
+
+def route_track(route, simplify_m=0):
+    """
+    The collector's pings during `route` as an encoded polyline (precision
+    POLYLINE_PRECISION, simplified to `simplify_m` metres when > 0).
+    """
+    start, end = route_window(route)
+    with connection.cursor() as cursor:
+        cursor.execute(_TRACK_SQL, {
+            'collector_id': route.collector_id, 'start': start, 'end': end,
+            'tolerance': max(simplify_m, 0) / METRES_PER_DEGREE,
+        })
+        count, first, last, polyline = cursor.fetchone()
+    return {
+        'route_id': route.pk,
+        'collector': route.collector_id,
+        'pings': count,
+        'started_at': first,
+        'ended_at': last,
+        'precision': POLYLINE_PRECISION,
+        'polyline': polyline or '',
+    }
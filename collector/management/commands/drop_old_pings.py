@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from collector.breadcrumbs import drop_old_partitions, retention_days
+
+
+class Command(BaseCommand):
+    help = "Drop daily GPS breadcrumb partitions older than --days (default PING_RETENTION_DAYS)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help="Keep this many days of pings.")
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else retention_days()
+        dropped = drop_old_partitions(days)
+        self.stdout.write(self.style.SUCCESS(
+            f"Dropped {len(dropped)} partition(s)" + (f" ({dropped[0]} to {dropped[-1]})." if dropped else ".")
+        ))
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-16 17:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collector', '0005_remove_collector_employment_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollectorLocation',
+            fields=[
+                ('collector', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='live_location', serialize=False, to='collector.collector')),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('accuracy_m', models.FloatField(blank=True, null=True)),
+                ('speed_mps', models.FloatField(blank=True, null=True)),
+                ('heading', models.FloatField(blank=True, null=True)),
+                ('recorded_at', models.DateTimeField(help_text='Device time of the fix')),
+                ('received_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.7 on 2026-10-16 17:40
+
+import django.contrib.gis.db.models.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Partitioned by day on recorded_at; partitions are created on demand by
+# collector.breadcrumbs. No primary key constraint: rows are append-only and
+# every unique index on a partitioned table would have to include recorded_at.
+CREATE_SQL = """
+CREATE TABLE collector_collectorlocationping (
+    ping_id bigserial NOT NULL,
+    collector_id bigint NOT NULL,
+    recorded_at timestamp with time zone NOT NULL,
+    location geometry(Point, 4326) NOT NULL,
+    accuracy_m double precision NULL,
+    speed_mps double precision NULL,
+    heading double precision NULL
+) PARTITION BY RANGE (recorded_at);
+
+CREATE INDEX collector_ping_recorded_brin
+    ON collector_collectorlocationping USING brin (recorded_at) WITH (pages_per_range = 32);
+CREATE INDEX collector_ping_collector_time
+    ON collector_collectorlocationping (collector_id, recorded_at);
+"""
+
+DROP_SQL = "DROP TABLE IF EXISTS collector_collectorlocationping CASCADE;"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collector', '0006_collectorlocation'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_SQL, DROP_SQL),
+        migrations.CreateModel(
+            name='CollectorLocationPing',
+            fields=[
+                ('ping_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('recorded_at', models.DateTimeField()),
+                ('location', django.contrib.gis.db.models.fields.PointField(srid=4326)),
+                ('accuracy_m', models.FloatField(blank=True, null=True)),
+                ('speed_mps', models.FloatField(blank=True, null=True)),
+                ('heading', models.FloatField(blank=True, null=True)),
+                ('collector', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='location_pings', to='collector.collector')),
+            ],
+            options={
+                'db_table': 'collector_collectorlocationping',
+                'managed': False,
+            },
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.contrib.gis.db.models import PointField
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 
@@ -79,6 +80,62 @@ class Collector(models.Model):
         col_type = "Private" if self.is_private_collector else "Company"
         return f"{self.user.username} - {col_type} Collector"
 
+
+class CollectorLocation(models.Model):
+    """
+    Latest GPS fix reported by a collector's phone.
+
+    Kept apart from Collector so that high-frequency position updates never
+    lock or rewrite the profile row. Written in bulk by collector.telemetry.
+    """
+
+    collector = models.OneToOneField(
+        Collector,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='live_location'
+    )
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    accuracy_m = models.FloatField(null=True, blank=True)
+    speed_mps = models.FloatField(null=True, blank=True)
+    heading = models.FloatField(null=True, blank=True)
+    recorded_at = models.DateTimeField(help_text="Device time of the fix")
+    received_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.collector_id} @ {self.latitude:.6f},{self.longitude:.6f} ({self.recorded_at})"
+
+
+class CollectorLocationPing(models.Model):
+    """
+    Append-only GPS breadcrumb, one row per ping.
+
+    The table is range-partitioned by day on `recorded_at` and created by
+    raw SQL in the migration, so Django does not manage it. Rows are written
+    with COPY and partitions are created and dropped by collector.breadcrumbs.
+    """
+
+    ping_id = models.BigAutoField(primary_key=True)
+    collector = models.ForeignKey(
+        Collector,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='location_pings'
+    )
+    recorded_at = models.DateTimeField()
+    location = PointField(srid=4326)
+    accuracy_m = models.FloatField(null=True, blank=True)
+    speed_mps = models.FloatField(null=True, blank=True)
+    heading = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        managed = False
+        db_table = 'collector_collectorlocationping'
+
+    def __str__(self):
+        return f"{self.collector_id} @ {self.recorded_at}"
+
 """
 class CollectorRating(models.Model):
     ""
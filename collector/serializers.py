@@ -4,6 +4,7 @@ from django.contrib.auth.hashers import make_password
 from django.contrib.auth import get_user_model
 
 from .models import Collector
+from .telemetry import MAX_BATCH_PINGS
 
 User = get_user_model()
 
@@ -198,3 +199,21 @@ class CollectorUpdateSerializer(serializers.ModelSerializer):
             instance.user.save()
 
         return super().update(instance, validated_data)
+
+
+class LocationPingSerializer(serializers.Serializer):
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    longitude = serializers.FloatField(min_value=-180, max_value=180)
+    accuracy_m = serializers.FloatField(min_value=0, required=False, allow_null=True)
+    speed_mps = serializers.FloatField(min_value=0, required=False, allow_null=True)
+    heading = serializers.FloatField(min_value=0, max_value=360, required=False, allow_null=True)
+    recorded_at = serializers.DateTimeField(required=False, help_text="Device time of the fix; defaults to receipt time")
+
+
+class LocationPingBatchSerializer(serializers.Serializer):
+    pings = LocationPingSerializer(many=True, allow_empty=False)
+
+    def validate_pings(self, value):
+        if len(value) > MAX_BATCH_PINGS:
+            raise serializers.ValidationError(f"At most {MAX_BATCH_PINGS} pings per upload.")
+        return value
@@ -0,0 +1,207 @@
+"""
+In-process store for collector GPS pings.
+
+Phones upload pings in batches. Each process keeps them in memory and a
+background thread flushes them every FLUSH_SECONDS:
+
+- every ping is appended to the breadcrumb history (collector.breadcrumbs);
+- pending pings sit in a bounded ring buffer (BUFFER_SIZE); if the database
+  falls behind, the oldest unflushed pings are dropped rather than letting
+  memory grow;
+- the newest fix per collector is upserted into CollectorLocation with one
+  INSERT ... ON CONFLICT statement per flush, which only overwrites a
+  stored fix with a newer one, so processes flushing out of order are safe.
+
+The Collector profile row is never touched.
+"""
+import atexit
+import logging
+import threading
+from collections import deque, namedtuple
+
+from django.db import connection, transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from . import breadcrumbs
+from .models import CollectorLocation
+
+
+logger = logging.getLogger(__name__)
+
+BUFFER_SIZE = 50_000
+FLUSH_SECONDS = 5
+MAX_BATCH_PINGS = 200
+
+# Sent with collector_id and pings (list of Ping) as soon as an upload is queued
+pings_received = Signal()
+
+Ping = namedtuple('Ping', 'collector_id latitude longitude accuracy_m speed_mps heading recorded_at received_at')
+
+
+class LocationStore:
+    """Ring buffer of unflushed pings plus the newest fix seen per collector."""
+
+    def __init__(self, capacity=BUFFER_SIZE):
+        self._lock = threading.Lock()
+        self._pending = deque(maxlen=capacity)
+        self._latest = {}
+        self.dropped = 0
+
+    def add(self, pings):
+        with self._lock:
+            self.dropped += max(0, len(self._pending) + len(pings) - self._pending.maxlen)
+            self._pending.extend(pings)
+            for ping in pings:
+                current = self._latest.get(ping.collector_id)
+                if current is None or ping.recorded_at > current.recorded_at:
+                    self._latest[ping.collector_id] = ping
+
+    def latest(self, collector_id):
+        """Newest fix for the collector seen by this process, or None."""
+        return self._latest.get(collector_id)
+
+    def drain(self):
+        """Remove and return every pending ping, oldest first."""
+        with self._lock:
+            pings = list(self._pending)
+            self._pending.clear()
+        return pings
+
+    def __len__(self):
+        return len(self._pending)
+
+
+def newest_per_collector(pings):
+    newest = {}
+    for ping in pings:
+        current = newest.get(ping.collector_id)
+        if current is None or ping.recorded_at > current.recorded_at:
+            newest[ping.collector_id] = ping
+    return list(newest.values())
+
+
+_UPSERT_SQL = """
+    INSERT INTO {table} (collector_id, latitude, longitude, accuracy_m, speed_mps, heading, recorded_at, received_at)
+    VALUES {values}
+    ON CONFLICT (collector_id) DO UPDATE SET
+        latitude = EXCLUDED.latitude, longitude = EXCLUDED.longitude,
+        accuracy_m = EXCLUDED.accuracy_m, speed_mps = EXCLUDED.speed_mps, heading = EXCLUDED.heading,
+        recorded_at = EXCLUDED.recorded_at, received_at = EXCLUDED.received_at
+    WHERE {table}.recorded_at < EXCLUDED.recorded_at
+"""
+
+
+def save_latest(pings):
+    """Upsert the newest of `pings` per collector into CollectorLocation. Returns the rows written."""
+    rows = newest_per_collector(pings)
+    if not rows:
+        return 0
+    sql = _UPSERT_SQL.format(
+        table=connection.ops.quote_name(CollectorLocation._meta.db_table),
+        values=', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s)'] * len(rows)),
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(sql, [value for row in rows for value in row])
+    return len(rows)
+
+
+store = LocationStore()
+
+
+def record(collector_id, pings):
+    """
+    Queue pings for a collector. `pings` are dicts with latitude, longitude,
+    recorded_at and optionally accuracy_m, speed_mps and heading.
+
+    recorded_at is clamped to the receipt time: a phone whose clock runs
+    ahead would otherwise pin the latest position until real time caught up.
+    """
+    now = timezone.now()
+    pings = [
+        Ping(
+            collector_id, float(p['latitude']), float(p['longitude']),
+            p.get('accuracy_m'), p.get('speed_mps'), p.get('heading'),
+            min(p.get('recorded_at') or now, now), now,
+        )
+        for p in pings
+    ]
+    store.add(pings)
+    _start_flusher()
+    pings_received.send(sender=LocationStore, collector_id=collector_id, pings=pings)
+
+
+def flush():
+    """
+    Write everything pending now: every ping to the breadcrumb history, the
+    newest per collector to CollectorLocation. Pings are put back if the
+    write fails.
+    """
+    pings = store.drain()
+    if not pings:
+        return 0
+    try:
+        with transaction.atomic():
+            breadcrumbs.save_pings(pings)
+            return save_latest(pings)
+    except Exception:
+        store.add(pings)
+        raise
+
+
+def latest_position(collector):
+    """
+    (lat, lng) of the collector's newest known fix, or None. This process's
+    unflushed fix is used only when it is newer than the stored one, which
+    another worker may have written since.
+    """
+    ping = store.latest(collector.pk)
+    location = (
+        CollectorLocation.objects.filter(pk=collector.pk)
+        .values_list('latitude', 'longitude', 'recorded_at').first()
+    )
+    if ping is not None and (location is None or ping.recorded_at >= location[2]):
+        return ping.latitude, ping.longitude
+    if location:
+        return location[0], location[1]
+    if collector.last_known_latitude is not None and collector.last_known_longitude is not None:
+        return float(collector.last_known_latitude), float(collector.last_known_longitude)
+    return None
+
+
+# ---------------------------
+# Background flush
+# ---------------------------
+
+_flusher = None
+_flusher_lock = threading.Lock()
+_stop = threading.Event()
+
+
+def _run():
+    while not _stop.wait(FLUSH_SECONDS):
+        try:
+            flush()
+        except Exception:
+            logger.exception("Flushing collector locations failed; retrying in %ss", FLUSH_SECONDS)
+        finally:
+            connection.close()
+
+
+def _start_flusher():
+    global _flusher
+    if _flusher is not None:
+        return
+    with _flusher_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_run, name='collector-telemetry-flush', daemon=True)
+            _flusher.start()
+            atexit.register(_shutdown)
+
+
+def _shutdown():
+    _stop.set()
+    try:
+        flush()
+    except Exception:
+        logger.exception("Final flush of collector locations failed")
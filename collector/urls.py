@@ -8,6 +8,7 @@ from .views import (
     PrivateCollectorsListView,
     CollectorsByZoneView,
     CollectorApprovalView,
+    CollectorLocationPingView,
 )
 
 urlpatterns = [
@@ -53,6 +54,10 @@ urlpatterns = [
     # - Update profile (full or partial).
     path("me/", CollectorProfileView.as_view(), name="collector-profile"),
 
+    # POST /collectors/me/pings/
+    # - Collector phone uploads a batch of GPS pings: {"pings": [{"latitude", "longitude", "recorded_at", ...}]}
+    path("me/pings/", CollectorLocationPingView.as_view(), name="collector-location-pings"),
+
     # ---------------------------
     # Company Approval Flow
     # ---------------------------
@@ -4,11 +4,14 @@ from rest_framework.response import Response
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from django.shortcuts import get_object_or_404
+from accounts.permissions import IsCollector
+from . import telemetry
 from .models import Collector
 from .serializers import (
     CollectorCreateSerializer,
     CollectorListSerializer,
     CollectorUpdateSerializer,
+    LocationPingBatchSerializer,
 )
 
 # ===========================
@@ -321,4 +324,39 @@ class CollectorApprovalView(APIView):
             collector.save()
             return Response({"detail": "Collector rejected."}, status=status.HTTP_200_OK)
 
-        return Response({"error": "Invalid action. Use 'approve' or 'reject'."}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response({"error": "Invalid action. Use 'approve' or 'reject'."}, status=status.HTTP_400_BAD_REQUEST)
+
+
+# ===========================
+# GPS TELEMETRY
+# ===========================
+class CollectorLocationPingView(APIView):
+    """
+    Authenticated collector uploads a batch of GPS pings from their phone.
+    Pings are buffered in memory and written in bulk (collector.telemetry).
+    """
+
+    permission_classes = [IsCollector]
+
+    @swagger_auto_schema(
+        tags=TAGS,
+        operation_summary="Upload GPS pings",
+        operation_description=f"""
+        Upload up to {telemetry.MAX_BATCH_PINGS} GPS pings in one request.
+
+        - The collector's live position becomes the newest ping by `recorded_at`.
+        - Pings are stored asynchronously; the response only acknowledges receipt.
+        """,
+        operation_id="collector_location_pings",
+        request_body=LocationPingBatchSerializer,
+        responses={202: openapi.Response(
+            description="Accepted",
+            examples={"application/json": {"accepted": 24}}
+        ), 400: error_400}
+    )
+    def post(self, request):
+        serializer = LocationPingBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        pings = serializer.validated_data["pings"]
+        telemetry.record(request.user.pk, pings)
+        return Response({"accepted": len(pings)}, status=status.HTTP_202_ACCEPTED)
@@ -0,0 +1,210 @@
+"""
+Nearest-available-collector dispatch for on-demand requests.
+
+Collector positions are held in a process-wide snapshot with an STRtree
+over them, refreshed every POSITION_TTL_SECONDS. Dispatching a request is a
+k-nearest-neighbour search around the pickup point (the search box widens
+until enough collectors are found), one grouped query for the current load
+of that shortlist, and a weighted score:
+
+    score = distance + load + same-slot load - rating   (lower is better)
+
+so the work per request depends on the shortlist size, not on how many
+collectors are active.
+"""
+import threading
+import time
+
+import numpy as np
+import shapely
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from shapely import STRtree
+
+from borla_master import geo
+from collector.models import Collector
+from scheduled_request.models import ScheduledRequest
+from .models import OnDemandRequest
+
+
+POSITION_TTL_SECONDS = 15
+SHORTLIST_SIZE = 10
+SEARCH_RADIUS_KM = 2.0
+MAX_RADIUS_KM = 40.0
+KM_PER_DEGREE = 111.32
+
+OPEN_STATUSES = ('assigned', 'in_progress')
+DISPATCHABLE_STATUSES = ('pending', 'confirmed')
+
+# Each term is scaled to roughly 0..1 before weighting
+WEIGHTS = {
+    'distance': 1.0,    # per MAX_RADIUS_KM
+    'load': 0.5,        # per LOAD_SCALE open requests
+    'slot': 0.5,        # per LOAD_SCALE open requests in the same date and time slot
+    'rating': 0.3,      # per 5 stars
+}
+LOAD_SCALE = 10
+
+
+class CollectorPositions:
+    """Snapshot of collector positions with an STRtree for nearest-neighbour search."""
+
+    def __init__(self, ids, lats, lngs, ratings, company_ids, private):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.lats = np.asarray(lats, dtype=float)
+        self.lngs = np.asarray(lngs, dtype=float)
+        self.ratings = np.asarray(ratings, dtype=float)
+        self.company_ids = np.asarray(company_ids, dtype=np.int64)
+        self.private = np.asarray(private, dtype=bool)
+        self.tree = STRtree(shapely.points(self.lngs, self.lats))
+        self.loaded_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def nearest(self, lat, lng, k=SHORTLIST_SIZE, mask=None, max_km=MAX_RADIUS_KM):
+        """
+        Positions (indexes into the snapshot) of up to `k` collectors nearest to
+        the point and within `max_km`, with their distances in km. `mask`
+        limits the candidates (boolean array over the snapshot).
+        """
+        radius = SEARCH_RADIUS_KM
+        while True:
+            dlat = radius / KM_PER_DEGREE
+            dlng = dlat / max(np.cos(np.radians(lat)), 0.01)
+            hits = self.tree.query(shapely.box(lng - dlng, lat - dlat, lng + dlng, lat + dlat))
+            if mask is not None:
+                hits = hits[mask[hits]]
+            km = geo.haversine_array(lat, lng, self.lats[hits], self.lngs[hits]) / 1000
+            inside = km <= radius
+            if inside.sum() >= k or radius >= max_km:
+                break
+            radius = min(radius * 2, max_km)
+        hits, km = hits[inside & (km <= max_km)], km[inside & (km <= max_km)]
+        order = np.argsort(km, kind='stable')[:k]
+        return hits[order], km[order]
+
+
+def _load_positions():
+    """Live GPS position (CollectorLocation) where there is one, else the profile's last known position."""
+    rows = (
+        Collector.objects
+        .filter(user__is_active=True)
+        .filter(Q(live_location__isnull=False) | Q(last_known_latitude__isnull=False, last_known_longitude__isnull=False))
+        .values_list('pk', 'live_location__latitude', 'live_location__longitude',
+                     'last_known_latitude', 'last_known_longitude', 'average_rating',
+                     'company_id', 'is_private_collector')
+    )
+    ids, lats, lngs, ratings, companies, private = [], [], [], [], [], []
+    for pk, live_lat, live_lng, lat, lng, rating, company_id, is_private in rows:
+        if live_lat is not None:
+            lat, lng = live_lat, live_lng
+        ids.append(pk)
+        lats.append(float(lat))
+        lngs.append(float(lng))
+        ratings.append(float(rating or 0))
+        companies.append(company_id or 0)
+        private.append(is_private)
+    return CollectorPositions(ids, lats, lngs, ratings, companies, private)
+
+
+_positions = None
+_lock = threading.Lock()
+
+
+def get_positions():
+    """The process-wide position snapshot, reloaded once it is POSITION_TTL_SECONDS old."""
+    global _positions
+    with _lock:
+        if _positions is None or time.monotonic() - _positions.loaded_at > POSITION_TTL_SECONDS:
+            _positions = _load_positions()
+        return _positions
+
+
+def _loads(collector_ids, pickup_date, time_slot):
+    """{collector_id: (open requests, open requests in the same date and slot)}."""
+    same_slot = Q(pickup_date=pickup_date, pickup_time_slot=time_slot)
+    loads = {}
+    for model in (OnDemandRequest, ScheduledRequest):
+        rows = (
+            model.objects.filter(collector_id__in=collector_ids, request_status__in=OPEN_STATUSES)
+            .values('collector_id')
+            .annotate(total=Count('pk'), slot=Count('pk', filter=same_slot))
+            .values_list('collector_id', 'total', 'slot')
+        )
+        for collector_id, total, slot in rows:
+            previous = loads.get(collector_id, (0, 0))
+            loads[collector_id] = (previous[0] + total, previous[1] + slot)
+    return loads
+
+
+def shortlist(ondemand_request, company=None, private_only=False, k=SHORTLIST_SIZE):
+    """
+    Ranked candidates for `ondemand_request`: collectors of `company`, or
+    private collectors when `private_only`, nearest first then scored.
+    Returns a list of dicts, best first.
+    """
+    if not ondemand_request.location:
+        return []
+    lat, lng = ondemand_request.location.y, ondemand_request.location.x
+    positions = get_positions()
+    if not len(positions):
+        return []
+
+    mask = np.ones(len(positions), dtype=bool)
+    if company is not None:
+        mask &= positions.company_ids == company.pk
+    if private_only:
+        mask &= positions.private
+
+    # Over-fetch so load and rating can reorder the nearest few
+    hits, km = positions.nearest(lat, lng, k=k * 2, mask=mask)
+    if not len(hits):
+        return []
+    ids = positions.ids[hits]
+    loads = _loads(ids.tolist(), ondemand_request.pickup_date, ondemand_request.pickup_time_slot)
+    open_requests = np.array([loads.get(i, (0, 0))[0] for i in ids.tolist()], dtype=float)
+    same_slot = np.array([loads.get(i, (0, 0))[1] for i in ids.tolist()], dtype=float)
+    ratings = positions.ratings[hits]
+
+    scores = (
+        WEIGHTS['distance'] * km / MAX_RADIUS_KM
+        + WEIGHTS['load'] * open_requests / LOAD_SCALE
+        + WEIGHTS['slot'] * same_slot / LOAD_SCALE
+        - WEIGHTS['rating'] * ratings / 5
+    )
+    order = np.argsort(scores, kind='stable')[:k]
+    return [
+        {
+            'collector': int(ids[i]),
+            'distance_km': round(float(km[i]), 3),
+            'open_requests': int(open_requests[i]),
+            'same_slot_requests': int(same_slot[i]),
+            'rating': float(ratings[i]),
+            'score': round(float(scores[i]), 4),
+        }
+        for i in order.tolist()
+    ]
+
+
+def auto_assign(ondemand_request, candidates):
+    """
+    Assign the request to the best candidate if it is still unassigned.
+    Returns the assigned Collector, or None if the request was taken meanwhile.
+    """
+    if not candidates:
+        return None
+    with transaction.atomic():
+        locked = (
+            OnDemandRequest.objects.select_for_update()
+            .filter(pk=ondemand_request.pk, collector__isnull=True, request_status__in=DISPATCHABLE_STATUSES)
+            .first()
+        )
+        if locked is None:
+            return None
+        locked.collector_id = candidates[0]['collector']
+        locked.request_status = 'assigned'
+        locked.accepted_at = timezone.now()
+        locked.save()
+    return locked.collector
@@ -4,6 +4,7 @@ from django.core.validators import MinValueValidator
 from django.utils import timezone
 from django.contrib.gis.db.models import PointField
 from django.contrib.gis.geos import Point
+from zones.index import zone_for_location
 
 
 class OnDemandRequest(models.Model):
@@ -42,6 +43,14 @@ class OnDemandRequest(models.Model):
     landmark = models.CharField(max_length=255, blank=True)
     area_zone = models.CharField(max_length=100)
     city = models.CharField(max_length=100)
+    zone = models.ForeignKey(
+        'zones.Zone',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='on_demand_requests',
+        help_text="Zone containing `location`, resolved on save"
+    )
 
     # Store both lat/long and PointField
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
@@ -119,6 +128,7 @@ class OnDemandRequest(models.Model):
             models.Index(fields=['collector', 'request_status']),
             models.Index(fields=['pickup_date', 'request_status']),
             models.Index(fields=['area_zone', 'pickup_date']),
+            models.Index(fields=['zone', 'pickup_date']),
         ]
 
     def __str__(self):
@@ -165,6 +175,7 @@ class OnDemandRequest(models.Model):
         # Auto-populate PointField from lat/long if provided
         if self.latitude and self.longitude:
             self.location = Point(float(self.longitude), float(self.latitude))
+        self.zone_id = zone_for_location(self.location)
 
         if self.request_status == 'cancelled' and not self.cancelled_at:
             self.cancelled_at = timezone.now()
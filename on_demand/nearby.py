@@ -0,0 +1,158 @@
+"""
+"Open requests near me" feed for private collectors.
+
+Collectors poll this from their phones, many of them from the same few
+neighbourhoods, so the database is asked once per geohash cell rather than
+once per poll:
+
+1. The collector's position is bucketed into a geohash cell
+   (GEOHASH_PRECISION characters, about 1.2 x 0.6 km).
+2. The pending requests within `radius` of the cell centre, widened by the
+   cell's half-diagonal, are fetched with an index-assisted ST_DWithin on
+   the geography `location` column, KNN-ordered (`<->`) and capped at
+   CELL_LIMIT. The rows are cached for CELL_TTL_SECONDS.
+3. Every collector in the cell filters and sorts that superset by their own
+   exact distance, then pages through it with a (distance, request_id)
+   cursor.
+"""
+import math
+
+import numpy as np
+from django.core.cache import cache
+from django.db import connection
+
+from borla_master import geo
+from .models import OnDemandRequest
+
+
+GEOHASH_PRECISION = 6
+CELL_TTL_SECONDS = 10
+CELL_LIMIT = 500
+DEFAULT_RADIUS_KM = 5
+MAX_RADIUS_KM = 25
+PAGE_SIZE = 20
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash(lat, lng, precision=GEOHASH_PRECISION):
+    """Standard base-32 geohash of a point."""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+
+def geohash_bounds(cell):
+    """(south, west, north, east) of a geohash cell."""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in cell:
+        bits = _BASE32.index(char)
+        for shift in range(4, -1, -1):
+            rng = lng_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if bits >> shift & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return lat_range[0], lng_range[0], lat_range[1], lng_range[1]
+
+
+_CELL_SQL = f"""
+    SELECT r.request_id, ST_Y(r.location::geometry), ST_X(r.location::geometry),
+           r.pickup_date, r.pickup_time_slot, r.waste_type, r.bag_count, r.bin_size_liters,
+           r.quoted_price, r.address_line1, r.landmark, r.area_zone, r.zone_id
+    FROM {OnDemandRequest._meta.db_table} r
+    WHERE r.request_status = 'pending' AND r.collector_id IS NULL
+      AND ST_DWithin(r.location, ST_SetSRID(ST_MakePoint(%(lng)s, %(lat)s), 4326)::geography, %(metres)s)
+    ORDER BY r.location <-> ST_SetSRID(ST_MakePoint(%(lng)s, %(lat)s), 4326)::geography
+    LIMIT %(limit)s
+"""
+
+_COLUMNS = (
+    'request_id', 'latitude', 'longitude', 'pickup_date', 'pickup_time_slot', 'waste_type',
+    'bag_count', 'bin_size_liters', 'quoted_price', 'address_line1', 'landmark', 'area_zone', 'zone',
+)
+
+
+def _cell_requests(cell, radius_km):
+    """Pending requests that can be within `radius_km` of any point of `cell` (cached)."""
+    key = f'nearby:{cell}:{radius_km}'
+    rows = cache.get(key)
+    if rows is not None:
+        return rows
+
+    south, west, north, east = geohash_bounds(cell)
+    lat, lng = (south + north) / 2, (west + east) / 2
+    half_diagonal_km = geo.haversine(lat, lng, north, east) / 1000
+    with connection.cursor() as cursor:
+        cursor.execute(_CELL_SQL, {
+            'lat': lat, 'lng': lng, 'limit': CELL_LIMIT,
+            'metres': (radius_km + half_diagonal_km) * 1000,
+        })
+        rows = [
+            {
+                **dict(zip(_COLUMNS, row)),
+                'pickup_date': row[3].isoformat(),
+                'quoted_price': str(row[8]) if row[8] is not None else None,
+            }
+            for row in cursor.fetchall()
+        ]
+    cache.set(key, rows, CELL_TTL_SECONDS)
+    return rows
+
+
+def encode_cursor(distance_m, request_id):
+    return f'{distance_m}:{request_id}'
+
+
+def decode_cursor(cursor):
+    """(distance_m, request_id) from a cursor; ValueError when malformed."""
+    distance_m, request_id = cursor.split(':')
+    return int(distance_m), int(request_id)
+
+
+def nearby_requests(lat, lng, radius_km=DEFAULT_RADIUS_KM, cursor=None, page_size=PAGE_SIZE):
+    """
+    One page of pending requests within `radius_km` of the point, nearest
+    first: {'results': [...], 'next_cursor': str | None}.
+    """
+    radius_km = max(1, min(int(math.ceil(radius_km)), MAX_RADIUS_KM))
+    rows = _cell_requests(geohash(lat, lng), radius_km)
+    if not rows:
+        return {'results': [], 'next_cursor': None}
+
+    lats = np.array([row['latitude'] for row in rows], dtype=float)
+    lngs = np.array([row['longitude'] for row in rows], dtype=float)
+    distances = np.rint(geo.haversine_array(lat, lng, lats, lngs)).astype(np.int64)
+    ids = np.array([row['request_id'] for row in rows], dtype=np.int64)
+
+    keep = distances <= radius_km * 1000
+    if cursor is not None:
+        after_distance, after_id = cursor
+        keep &= (distances > after_distance) | ((distances == after_distance) & (ids > after_id))
+    candidates = np.flatnonzero(keep)
+    order = candidates[np.lexsort((ids[candidates], distances[candidates]))]
+
+    page = order[:page_size]
+    results = [{**rows[i], 'distance_m': int(distances[i])} for i in page.tolist()]
+    next_cursor = None
+    if len(order) > page_size:
+        last = page[-1]
+        next_cursor = encode_cursor(int(distances[last]), int(ids[last]))
+    return {'results': results, 'next_cursor': next_cursor}
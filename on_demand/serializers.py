@@ -1,7 +1,8 @@
 from rest_framework import serializers
 from django.contrib.gis.geos import Point
 from .models import OnDemandRequest
-from geopy.distance import geodesic
+from borla_master import geo
+from collector import telemetry
 
 
 
@@ -23,6 +24,7 @@ class OnDemandRequestListSerializer(serializers.ModelSerializer):
             'pickup_date',
             'pickup_time_slot',
             'area_zone',
+            'zone',
             'city',
             'waste_type',
             'bag_count',
@@ -33,7 +35,7 @@ class OnDemandRequestListSerializer(serializers.ModelSerializer):
             'request_status',
             'requested_at',
         ]
-        read_only_fields = ['request_id', 'quoted_price', 'final_price', 'requested_at']
+        read_only_fields = ['request_id', 'zone', 'quoted_price', 'final_price', 'requested_at']
 
 
 class OnDemandRequestDetailSerializer(serializers.ModelSerializer):
@@ -56,6 +58,7 @@ class OnDemandRequestDetailSerializer(serializers.ModelSerializer):
             'address_line1',
             'landmark',
             'area_zone',
+            'zone',
             'city',
             'latitude',
             'longitude',
@@ -77,7 +80,7 @@ class OnDemandRequestDetailSerializer(serializers.ModelSerializer):
             'created_at',
             'updated_at',
         ]
-        read_only_fields = ['request_id', 'quoted_price', 'final_price', 'requested_at', 'created_at', 'updated_at']
+        read_only_fields = ['request_id', 'zone', 'quoted_price', 'final_price', 'requested_at', 'created_at', 'updated_at']
 
 
 class OnDemandRequestCreateSerializer(serializers.ModelSerializer):
@@ -169,17 +172,11 @@ class OnDemandRequestUpdateSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError("Only requests in progress can be completed.")
 
             # --- GPS validation ---
-            collector = instance.collector
-            if collector.last_known_latitude is None or collector.last_known_longitude is None:
+            position = telemetry.latest_position(instance.collector)
+            if position is None:
                 raise serializers.ValidationError("Collector location not available.")
 
-            client_point_coords = (instance.location.y, instance.location.x)  # (lat, lon)
-            collector_point_coords = (
-                float(collector.last_known_latitude),
-                float(collector.last_known_longitude),
-            )
-
-            distance_m = geodesic(client_point_coords, collector_point_coords).meters
+            distance_m = geo.vincenty(instance.location.y, instance.location.x, *position)
 
             if distance_m > 300:
                 raise serializers.ValidationError(
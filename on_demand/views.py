@@ -1,3 +1,5 @@
+import math
+
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
@@ -5,9 +7,13 @@ from django.utils import timezone
 from datetime import timedelta
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from geopy.distance import geodesic
+from borla_master import geo
 from scheduled_request.models import ScheduledRequest
+from collector import telemetry
+from collector.serializers import LocationPingSerializer
+from waste_management_company.models import Company
 
+from . import dispatch, nearby
 from .models import OnDemandRequest
 from .serializers import (
     OnDemandRequestDetailSerializer,
@@ -87,6 +93,58 @@ class OnDemandRequestViewSet(viewsets.ModelViewSet):
         serializer.save(request_status="assigned", accepted_at=timezone.now())
         return Response(OnDemandRequestDetailSerializer(ondemand_request).data)
 
+    @swagger_auto_schema(
+        method='post',
+        operation_summary="Dispatch On-Demand Request",
+        operation_description=(
+            "Supervisor only: rank the nearest available collectors by distance, current load, "
+            "load in the request's time slot and rating. With auto_assign the best one is assigned."
+        ),
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'pool': openapi.Schema(
+                    type=openapi.TYPE_STRING, enum=['company', 'private'],
+                    description="Candidates: the supervisor's company collectors (default) or private collectors",
+                ),
+                'limit': openapi.Schema(type=openapi.TYPE_INTEGER, description=f"Shortlist size (max {dispatch.SHORTLIST_SIZE})"),
+                'auto_assign': openapi.Schema(type=openapi.TYPE_BOOLEAN),
+            },
+        ),
+    )
+    @action(detail=True, methods=['post'], url_path='dispatch', permission_classes=[IsSupervisor])
+    def dispatch_collector(self, request, pk=None):
+        ondemand_request = self.get_object()
+        if ondemand_request.collector_id or ondemand_request.request_status not in dispatch.DISPATCHABLE_STATUSES:
+            return Response({"detail": "Only unassigned pending or confirmed requests can be dispatched."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not ondemand_request.location:
+            return Response({"detail": "Request has no location."}, status=status.HTTP_400_BAD_REQUEST)
+
+        pool = request.data.get("pool", "company")
+        company = None
+        if pool == "company":
+            supervisor = request.user.supervisor
+            company = Company.objects.filter(user__username=supervisor.company_username).first()
+            if not company:
+                return Response({"detail": "Supervisor is not linked to a company."}, status=status.HTTP_400_BAD_REQUEST)
+        elif pool != "private":
+            return Response({"detail": "pool must be 'company' or 'private'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            limit = max(1, min(int(request.data.get("limit", dispatch.SHORTLIST_SIZE)), dispatch.SHORTLIST_SIZE))
+        except (TypeError, ValueError):
+            return Response({"detail": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        candidates = dispatch.shortlist(ondemand_request, company=company, private_only=pool == "private", k=limit)
+        data = {"request_id": ondemand_request.pk, "candidates": candidates}
+        if str(request.data.get("auto_assign", "")).lower() in ("1", "true"):
+            collector = dispatch.auto_assign(ondemand_request, candidates)
+            if collector is None and candidates:
+                return Response({"detail": "Request was assigned meanwhile."}, status=status.HTTP_409_CONFLICT)
+            data["assigned_collector"] = collector.pk if collector else None
+        return Response(data)
+
     @swagger_auto_schema(
         method='post',
         operation_summary="Start On-Demand Request",
@@ -128,15 +186,18 @@ class OnDemandRequestViewSet(viewsets.ModelViewSet):
         lng = request.data.get("longitude")
         if lat is None or lng is None:
             return Response({"detail": "Latitude and longitude are required."}, status=400)
+        position = LocationPingSerializer(data={"latitude": lat, "longitude": lng})
+        if not position.is_valid():
+            return Response(position.errors, status=400)
+        lat, lng = position.validated_data["latitude"], position.validated_data["longitude"]
 
-        collector.last_known_latitude = lat
-        collector.last_known_longitude = lng
-        collector.save()
+        # The serializer's GPS check reads this back through telemetry.latest_position
+        telemetry.record(collector.pk, [{"latitude": lat, "longitude": lng}])
 
         if ondemand_request.location:
-            client_coords = (ondemand_request.location.y, ondemand_request.location.x)
-            collector_coords = (float(lat), float(lng))
-            distance_m = geodesic(client_coords, collector_coords).meters
+            distance_m = geo.vincenty(
+                ondemand_request.location.y, ondemand_request.location.x, lat, lng
+            )
 
             if distance_m > 300:
                 return Response({"detail": "Completion rejected: collector too far (>300m)."}, status=400)
@@ -209,6 +270,50 @@ class OnDemandRequestViewSet(viewsets.ModelViewSet):
         qs = self.get_queryset().filter(request_status="pending")
         return Response(OnDemandRequestDetailSerializer(qs, many=True).data)
 
+    @swagger_auto_schema(
+        method='get',
+        operation_summary="Nearby Pending Requests",
+        operation_description=(
+            "Private collectors: pending, unassigned on-demand requests within `radius` km of the given "
+            "position (or the collector's last known position), nearest first. Pass `next_cursor` "
+            "back as `cursor` for the next page. Results may be up to a few seconds old."
+        ),
+        manual_parameters=[
+            openapi.Parameter('latitude', openapi.IN_QUERY, type=openapi.TYPE_NUMBER),
+            openapi.Parameter('longitude', openapi.IN_QUERY, type=openapi.TYPE_NUMBER),
+            openapi.Parameter('radius', openapi.IN_QUERY, type=openapi.TYPE_NUMBER,
+                              description=f"km, default {nearby.DEFAULT_RADIUS_KM}, max {nearby.MAX_RADIUS_KM}"),
+            openapi.Parameter('cursor', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+        ],
+    )
+    @action(detail=False, methods=['get'], permission_classes=[IsPrivateCollector])
+    def nearby(self, request):
+        lat = request.query_params.get("latitude")
+        lng = request.query_params.get("longitude")
+        if lat is None or lng is None:
+            lat, lng = telemetry.latest_position(request.user.collector) or (None, None)
+        if lat is None or lng is None:
+            return Response({"detail": "Latitude and longitude are required."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            lat, lng = float(lat), float(lng)
+            radius = float(request.query_params.get("radius", nearby.DEFAULT_RADIUS_KM))
+        except (TypeError, ValueError):
+            return Response({"detail": "latitude, longitude and radius must be numbers."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not all(map(math.isfinite, (lat, lng, radius))):
+            return Response({"detail": "latitude, longitude and radius must be finite numbers."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180) or radius <= 0:
+            return Response({"detail": "Position or radius out of range."}, status=status.HTTP_400_BAD_REQUEST)
+
+        cursor = request.query_params.get("cursor")
+        if cursor:
+            try:
+                cursor = nearby.decode_cursor(cursor)
+            except ValueError:
+                return Response({"detail": "Invalid cursor."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(nearby.nearby_requests(lat, lng, radius, cursor or None))
+
     @action(detail=False, methods=['get'], permission_classes=[IsSupervisor | IsCollector])
     def list_today(self, request):
         today = timezone.now().date()
@@ -0,0 +1 @@
+from .batch import batch_edit  # noqa
@@ -5,4 +5,6 @@ class RoutesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'routes'
 
-    
\ No newline at end of file
+    def ready(self):
+        """Import signals when app is ready"""
+        import routes.signals  # noqa
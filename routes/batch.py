@@ -0,0 +1,126 @@
+"""
+Batch editing of route stops.
+
+    from routes import batch_edit
+
+    with batch_edit(route) as batch:
+        batch.reorder([12, 9, 10, 11])
+        batch.update(14, expected_minutes=10, notes="Gate code 4471")
+
+Inside the block the per-stop route signals are suppressed for the route,
+the collected changes are written with bulk_update when the block exits,
+and total_distance_km, estimated_duration and completion_percent are
+recomputed exactly once. Everything runs in one transaction.
+
+Models are imported lazily so this module can be re-exported from the
+package __init__.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.utils import timezone
+
+
+_state = threading.local()
+
+
+def is_suppressed(route_id):
+    """True while a batch edit is open for the route in this thread."""
+    return getattr(_state, 'route_ids', {}).get(route_id, 0) > 0
+
+
+@contextmanager
+def suppress_route_signals(route_ids):
+    """Silence the incremental metrics signals for these routes (re-entrant)."""
+    counts = getattr(_state, 'route_ids', None)
+    if counts is None:
+        counts = _state.route_ids = {}
+    route_ids = set(route_ids)
+    for route_id in route_ids:
+        counts[route_id] = counts.get(route_id, 0) + 1
+    try:
+        yield
+    finally:
+        for route_id in route_ids:
+            counts[route_id] -= 1
+            if counts[route_id] <= 0:
+                del counts[route_id]
+
+
+class BatchEdit:
+    """Collects stop changes for one route until the batch is flushed."""
+
+    EDITABLE_FIELDS = {'order', 'expected_minutes', 'status', 'notes', 'actual_start', 'actual_end', 'location'}
+
+    def __init__(self, route):
+        self.route = route
+        self._stops = None
+        self._changed = {}
+        self._fields = set()
+
+    @property
+    def stops(self):
+        """The route's stops keyed by stop_id, loaded once."""
+        if self._stops is None:
+            from .models import RouteStop
+            self._stops = {s.pk: s for s in RouteStop.objects.filter(route=self.route)}
+        return self._stops
+
+    def update(self, stop, **fields):
+        stop_id = getattr(stop, 'pk', stop)
+        unknown = set(fields) - self.EDITABLE_FIELDS
+        if unknown:
+            raise ValueError(f"Cannot batch-edit RouteStop fields: {', '.join(sorted(unknown))}")
+        try:
+            instance = self.stops[stop_id]
+        except KeyError:
+            raise ValueError(f"Stop {stop_id} does not belong to route {self.route.pk}.")
+        for name, value in fields.items():
+            setattr(instance, name, value)
+        self._changed[stop_id] = instance
+        self._fields.update(fields)
+
+    def reorder(self, stop_ids):
+        """Give the route's stops the order of `stop_ids` (must list every stop once)."""
+        stop_ids = list(stop_ids)
+        if sorted(stop_ids) != sorted(self.stops):
+            raise ValueError("Reorder must list every stop of the route exactly once.")
+        for position, stop_id in enumerate(stop_ids, start=1):
+            if self.stops[stop_id].order != position:
+                self.update(stop_id, order=position)
+
+    def flush(self):
+        from .models import RouteStop
+        from .sync import record_changes
+        if not self._changed:
+            return 0
+        if 'order' in self._fields:
+            # The unique constraint is deferred, so a clash would only surface at COMMIT
+            orders = [stop.order for stop in self.stops.values()]
+            if len(set(orders)) != len(orders):
+                raise ValueError("Stop orders must be unique within the route.")
+        now = timezone.now()
+        for stop in self._changed.values():
+            stop.updated_at = now  # bulk_update skips auto_now
+        RouteStop.objects.bulk_update(
+            list(self._changed.values()), sorted(self._fields | {'updated_at'}), batch_size=1000
+        )
+        record_changes('route_stop', [(stop_id, self.route.collector_id) for stop_id in self._changed])
+        count = len(self._changed)
+        self._changed = {}
+        self._fields = set()
+        return count
+
+
+@contextmanager
+def batch_edit(route):
+    """Edit many stops of `route` with one bulk write and one metrics recompute."""
+    from .metrics import reconcile_route
+
+    batch = BatchEdit(route)
+    with transaction.atomic():
+        with suppress_route_signals([route.pk]):
+            yield batch
+            batch.flush()
+        reconcile_route(route)
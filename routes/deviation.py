@@ -0,0 +1,236 @@
+"""
+Planned-vs-actual deviation of routes, from collector GPS breadcrumbs.
+
+A batch over one day's routes is read COLLECTORS_PER_QUERY collectors at
+a time, two queries per chunk: every stop of their routes, and every
+breadcrumb of those collectors over the day (sorted by collector and time,
+so each route's pings are a contiguous slice found by binary search); a
+chunk's results are stored before the next is read, so memory stays
+bounded by the chunk, not the fleet. Each route is then analysed on NumPy
+arrays in a local equirectangular plane (metres), which is accurate to
+well under a metre over a city:
+
+- map matching: every ping is snapped to the nearest leg of the planned
+  path (the stops joined in `order`); its distance to that leg is how far
+  off route it was;
+- actual distance: length of the ping sequence after dropping imprecise
+  fixes (MAX_ACCURACY_M) and GPS jumps faster than MAX_SPEED_KMH;
+- visits: a stop is visited when a ping comes within ARRIVAL_RADIUS_M; the
+  first such ping is the arrival, and the dwell is the time between
+  consecutive pings that are both inside (gaps over MAX_GAP_SECONDS are
+  not counted);
+- order: visited stops sorted by arrival; those outside the longest run
+  that follows the planned order are out of order.
+
+Results are upserted into RouteDeviation.
+"""
+import math
+from bisect import bisect_left
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.utils import timezone
+
+from collector.breadcrumbs import pings_between, route_window
+from .models import Route, RouteDeviation, RouteStop
+from .optimizer import EARTH_RADIUS_KM
+
+
+ARRIVAL_RADIUS_M = 50.0
+OFFROUTE_M = 200.0
+MAX_ACCURACY_M = 50.0
+MAX_SPEED_KMH = 150.0
+MAX_GAP_SECONDS = 600.0
+CHUNK_PINGS = 20_000
+COLLECTORS_PER_QUERY = 200
+SKIPPED_STATUSES = ('draft', 'cancelled')
+
+METRES_PER_DEGREE = EARTH_RADIUS_KM * 1000 * np.pi / 180
+
+
+def _local_xy(lats, lngs, lat0, lng0):
+    """Metres east/north of (lat0, lng0)."""
+    return (lngs - lng0) * METRES_PER_DEGREE * np.cos(np.radians(lat0)), (lats - lat0) * METRES_PER_DEGREE
+
+
+def segment_distances(px, py, ax, ay, bx, by):
+    """(pings x segments) distances from points (px, py) to segments a-b, in the same units."""
+    dx, dy = bx - ax, by - ay
+    length2 = dx * dx + dy * dy
+    t = ((px[:, None] - ax) * dx + (py[:, None] - ay) * dy) / np.where(length2 > 0, length2, 1.0)
+    t = np.clip(t, 0.0, 1.0)
+    return np.hypot(px[:, None] - (ax + t * dx), py[:, None] - (ay + t * dy))
+
+
+def longest_increasing_run(values):
+    """Length of the longest strictly increasing subsequence (patience sorting)."""
+    tails = []
+    for value in values:
+        i = bisect_left(tails, value)
+        if i == len(tails):
+            tails.append(value)
+        else:
+            tails[i] = value
+    return len(tails)
+
+
+def _clean(epoch, lats, lngs, accuracy):
+    """Drop imprecise fixes, then fixes implying a jump faster than MAX_SPEED_KMH from the previous kept one."""
+    keep = ~(accuracy > MAX_ACCURACY_M)   # NaN accuracy is kept
+    epoch, lats, lngs = epoch[keep], lats[keep], lngs[keep]
+    if len(epoch) < 2:
+        return epoch, lats, lngs
+    x, y = _local_xy(lats, lngs, lats[0], lngs[0])
+    metres = np.hypot(np.diff(x), np.diff(y))
+    seconds = np.maximum(np.diff(epoch), 1.0)
+    jumps = np.flatnonzero(metres / seconds * 3.6 > MAX_SPEED_KMH)
+    if not len(jumps):
+        return epoch, lats, lngs
+
+    # Past the first jump the previous kept fix is no longer the previous
+    # fix, so walk the rest one at a time
+    max_speed = MAX_SPEED_KMH / 3.6
+    keep = np.ones(len(epoch), dtype=bool)
+    last = int(jumps[0])
+    xs, ys, ts = x.tolist(), y.tolist(), epoch.tolist()
+    for i in range(last + 1, len(ts)):
+        if math.hypot(xs[i] - xs[last], ys[i] - ys[last]) > max_speed * max(ts[i] - ts[last], 1.0):
+            keep[i] = False
+        else:
+            last = i
+    return epoch[keep], lats[keep], lngs[keep]
+
+
+def analyse(stops, epoch, lats, lngs, accuracy):
+    """
+    Deviation figures for one route. `stops` are (stop_id, order, expected
+    minutes, lat, lng) in planned order; the ping arrays are sorted by time.
+    Returns the RouteDeviation field values (without route and computed_at).
+    """
+    epoch, lats, lngs = _clean(epoch, lats, lngs, accuracy)
+    stop_ids = [s[0] for s in stops]
+    orders = np.array([s[1] for s in stops], dtype=np.int64)
+    expected = np.array([s[2] for s in stops], dtype=float)
+    stop_lat = np.array([s[3] for s in stops], dtype=float)
+    stop_lng = np.array([s[4] for s in stops], dtype=float)
+
+    result = {
+        'ping_count': len(epoch),
+        'stops_planned': len(stops),
+        'actual_distance_km': 0.0,
+        'mean_offroute_m': 0.0, 'max_offroute_m': 0.0, 'offroute_share': 0.0,
+        'stops_visited': 0, 'stops_out_of_order': 0, 'planned_minutes': 0, 'dwell_minutes': 0.0,
+        'stops': [
+            {'stop_id': stop_ids[i], 'order': int(orders[i]), 'visit_rank': None, 'arrived_at': None,
+             'dwell_minutes': 0.0, 'expected_minutes': int(expected[i])}
+            for i in range(len(stops))
+        ],
+    }
+    if not len(epoch) or not len(stops):
+        return result
+
+    lat0, lng0 = stop_lat.mean(), stop_lng.mean()
+    px, py = _local_xy(lats, lngs, lat0, lng0)
+    sx, sy = _local_xy(stop_lat, stop_lng, lat0, lng0)
+    result['actual_distance_km'] = round(float(np.hypot(np.diff(px), np.diff(py)).sum() / 1000), 3)
+
+    # Planned legs; a single stop is a zero-length leg onto itself
+    if len(stops) > 1:
+        ax, ay, bx, by = sx[:-1], sy[:-1], sx[1:], sy[1:]
+    else:
+        ax, ay, bx, by = sx, sy, sx, sy
+
+    offroute = np.empty(len(px))
+    inside = np.empty((len(px), len(stops)), dtype=bool)
+    for lo in range(0, len(px), CHUNK_PINGS):
+        chunk = slice(lo, lo + CHUNK_PINGS)
+        offroute[chunk] = segment_distances(px[chunk], py[chunk], ax, ay, bx, by).min(axis=1)
+        inside[chunk] = np.hypot(px[chunk, None] - sx, py[chunk, None] - sy) <= ARRIVAL_RADIUS_M
+    result['mean_offroute_m'] = round(float(offroute.mean()), 1)
+    result['max_offroute_m'] = round(float(offroute.max()), 1)
+    result['offroute_share'] = round(float((offroute > OFFROUTE_M).mean()), 4)
+
+    visited = inside.any(axis=0)
+    first = np.argmax(inside, axis=0)
+    gaps = np.diff(epoch)
+    gaps = np.where(gaps <= MAX_GAP_SECONDS, gaps, 0.0)
+    dwell_minutes = ((inside[:-1] & inside[1:]) * gaps[:, None]).sum(axis=0) / 60
+
+    visited_idx = np.flatnonzero(visited)
+    by_arrival = visited_idx[np.argsort(epoch[first[visited_idx]], kind='stable')]
+    for rank, i in enumerate(by_arrival.tolist(), start=1):
+        row = result['stops'][i]
+        row['visit_rank'] = rank
+        row['arrived_at'] = datetime.fromtimestamp(epoch[first[i]], tz=dt_timezone.utc).isoformat()
+        row['dwell_minutes'] = round(float(dwell_minutes[i]), 1)
+
+    result['stops_visited'] = len(visited_idx)
+    result['stops_out_of_order'] = len(by_arrival) - longest_increasing_run(orders[by_arrival].tolist())
+    result['planned_minutes'] = int(expected[visited].sum())
+    result['dwell_minutes'] = round(float(dwell_minutes[visited].sum()), 1)
+    return result
+
+
+def _stops_by_route(route_ids):
+    """Planned stops per route, placed like RouteStop.effective_location (linked request first)."""
+    stops = {}
+    rows = (
+        RouteStop.objects.filter(route_id__in=route_ids)
+        .order_by('route_id', 'order')
+        .values_list('route_id', 'stop_id', 'order', 'expected_minutes',
+                     'ondemand_request__location', 'scheduled_request__location', 'location')
+    )
+    for route_id, stop_id, order, expected_minutes, *locations in rows:
+        location = next(point for point in locations if point)
+        stops.setdefault(route_id, []).append((stop_id, order, expected_minutes, location.y, location.x))
+    return stops
+
+
+def compute_day(route_date, route_ids=None):
+    """Analyse the routes of `route_date` (or just `route_ids` among them) and store the results. Returns the count."""
+    routes = Route.objects.filter(route_date=route_date).exclude(status__in=SKIPPED_STATUSES).only(
+        'route_id', 'collector', 'route_date', 'actual_start', 'actual_end', 'total_distance_km'
+    )
+    if route_ids is not None:
+        routes = routes.filter(route_id__in=route_ids)
+    routes = list(routes)
+    if not routes:
+        return 0
+
+    by_collector = {}
+    for route in routes:
+        by_collector.setdefault(route.collector_id, []).append(route)
+    collector_ids = sorted(by_collector)
+    for lo in range(0, len(collector_ids), COLLECTORS_PER_QUERY):
+        _compute_routes([route for c in collector_ids[lo:lo + COLLECTORS_PER_QUERY] for route in by_collector[c]])
+    return len(routes)
+
+
+def _compute_routes(routes):
+    """Analyse and store `routes`, reading their collectors' breadcrumbs in one query."""
+    windows = {route.pk: route_window(route) for route in routes}
+    pings = pings_between(
+        {route.collector_id for route in routes},
+        min(start for start, _ in windows.values()),
+        max(end for _, end in windows.values()),
+    )
+    collectors, epochs = pings[:, 0], pings[:, 1]
+    stops = _stops_by_route([route.pk for route in routes])
+
+    now = timezone.now()
+    results = []
+    for route in routes:
+        lo = np.searchsorted(collectors, route.collector_id, side='left')
+        hi = np.searchsorted(collectors, route.collector_id, side='right')
+        start, end = windows[route.pk]
+        lo, hi = lo + np.searchsorted(epochs[lo:hi], start.timestamp()), lo + np.searchsorted(epochs[lo:hi], end.timestamp())
+        rows = pings[lo:hi]
+        figures = analyse(stops.get(route.pk, []), rows[:, 1], rows[:, 2], rows[:, 3], rows[:, 4])
+        results.append(RouteDeviation(
+            route_id=route.pk, computed_at=now, planned_distance_km=route.total_distance_km, **figures
+        ))
+
+    RouteDeviation.objects.bulk_create(
+        results, batch_size=500, update_conflicts=True, unique_fields=['route'],
+        update_fields=[f.name for f in RouteDeviation._meta.concrete_fields if f.name != 'route'],
+    )
@@ -0,0 +1,223 @@
+"""
+Automatic stop arrival and departure from incoming GPS pings.
+
+Every ping received by collector.telemetry is run through the collector's
+fence for today's route:
+
+- the fence is built once per route (and rebuilt every FENCE_TTL_SECONDS or
+  when the route or its stops change): stop positions in a local metric
+  plane, bucketed in a uniform grid whose cells are ARRIVAL_RADIUS_M wide,
+  so the stops that can contain a ping are in its own and the 8
+  neighbouring cells;
+- while the collector is at a stop, a ping only needs the distance to that
+  stop; leaving DEPARTURE_RADIUS_M (wider than the arrival radius, so GPS
+  jitter at the edge does not flap) stamps the departure;
+- otherwise the grid lookup finds the closest not-yet-visited stop within
+  ARRIVAL_RADIUS_M, which stamps the arrival.
+
+So each ping costs a constant amount of arithmetic and dictionary lookups;
+the database is only written on an arrival or a departure.
+
+Arrival sets the stop's actual_start (and moves a pending stop to
+in_progress); departure sets actual_end. Both are conditional updates, so
+a stamp made by the collector, or by another process, is never overwritten.
+"""
+import math
+import threading
+import time
+
+from django.utils import timezone
+
+from .models import Route, RouteStop
+from .sync import record_changes
+
+
+ARRIVAL_RADIUS_M = 50.0
+DEPARTURE_RADIUS_M = 80.0
+MAX_ACCURACY_M = 100.0
+FENCE_TTL_SECONDS = 60
+ACTIVE_ROUTE_STATUSES = ('assigned', 'in_progress')
+CLOSED_STOP_STATUSES = ('completed', 'skipped', 'failed')
+
+METRES_PER_DEGREE = 111_320.0
+
+
+class RouteFence:
+    """Stops of one route on a grid of ARRIVAL_RADIUS_M cells, plus where the collector is."""
+
+    def __init__(self, route_id, collector_id, stops):
+        """`stops` are (stop_id, lat, lng, arrived, departed)."""
+        self.route_id = route_id
+        self.collector_id = collector_id
+        self.current = None          # index of the stop the collector is at
+        self.last_inside_at = None
+
+        if stops:
+            self.lat0 = sum(s[1] for s in stops) / len(stops)
+            self.lng0 = sum(s[2] for s in stops) / len(stops)
+        else:
+            self.lat0 = self.lng0 = 0.0
+        self.kx = METRES_PER_DEGREE * math.cos(math.radians(self.lat0))
+
+        self.stop_ids, self.xy, self.visited = [], [], []
+        self.grid = {}
+        for i, (stop_id, lat, lng, arrived, departed) in enumerate(stops):
+            x, y = self.project(lat, lng)
+            self.stop_ids.append(stop_id)
+            self.xy.append((x, y))
+            self.visited.append(arrived)
+            self.grid.setdefault(self._cell(x, y), []).append(i)
+            if arrived and not departed:
+                self.current = i
+
+    def project(self, lat, lng):
+        return (lng - self.lng0) * self.kx, (lat - self.lat0) * METRES_PER_DEGREE
+
+    @staticmethod
+    def _cell(x, y):
+        return int(math.floor(x / ARRIVAL_RADIUS_M)), int(math.floor(y / ARRIVAL_RADIUS_M))
+
+    def _distance2(self, i, x, y):
+        sx, sy = self.xy[i]
+        return (sx - x) ** 2 + (sy - y) ** 2
+
+    def arriving_at(self, x, y):
+        """Index of the closest unvisited stop within ARRIVAL_RADIUS_M, or None."""
+        cx, cy = self._cell(x, y)
+        best, best_d2 = None, ARRIVAL_RADIUS_M ** 2
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for i in self.grid.get((cx + dx, cy + dy), ()):
+                    if self.visited[i]:
+                        continue
+                    d2 = self._distance2(i, x, y)
+                    if d2 <= best_d2:
+                        best, best_d2 = i, d2
+        return best
+
+    def step(self, lat, lng, at):
+        """
+        Advance with one ping. Returns the events it triggers as
+        ('arrive' | 'depart', stop_id, time) tuples (at most one of each).
+        """
+        x, y = self.project(lat, lng)
+        events = []
+        if self.current is not None:
+            if self._distance2(self.current, x, y) <= DEPARTURE_RADIUS_M ** 2:
+                self.last_inside_at = at
+                return events
+            events.append(('depart', self.stop_ids[self.current], self.last_inside_at or at))
+            self.current = None
+        hit = self.arriving_at(x, y)
+        if hit is not None:
+            self.visited[hit] = True
+            self.current = hit
+            self.last_inside_at = at
+            events.append(('arrive', self.stop_ids[hit], at))
+        return events
+
+
+def load_fence(collector_id):
+    """Fence of the collector's active route today, or None."""
+    route = (
+        Route.objects.filter(collector_id=collector_id, route_date=timezone.localdate(),
+                             status__in=ACTIVE_ROUTE_STATUSES)
+        .values_list('route_id', flat=True).first()
+    )
+    if route is None:
+        return None
+    stops = []
+    # Placed like RouteStop.effective_location: the linked request's point first
+    rows = RouteStop.objects.filter(route_id=route).values_list(
+        'stop_id', 'actual_start', 'actual_end', 'status',
+        'ondemand_request__location', 'scheduled_request__location', 'location',
+    )
+    for stop_id, actual_start, actual_end, stop_status, *locations in rows:
+        location = next(point for point in locations if point)
+        arrived = actual_start is not None or stop_status in CLOSED_STOP_STATUSES
+        departed = actual_end is not None or stop_status in CLOSED_STOP_STATUSES
+        stops.append((stop_id, location.y, location.x, arrived, departed))
+    return RouteFence(route, collector_id, stops)
+
+
+# ---------------------------
+# Per-process fences
+# ---------------------------
+
+_fences = {}             # collector_id -> (RouteFence | None, loaded_at)
+_collector_locks = {}    # collector_id -> Lock serializing that collector's pings
+_lock = threading.Lock()  # guards the two dicts only, never held across a query
+
+
+def _collector_lock(collector_id):
+    with _lock:
+        return _collector_locks.setdefault(collector_id, threading.Lock())
+
+
+def _fence_for(collector_id):
+    """The collector's fence, reloaded when stale. Call with the collector's lock held."""
+    with _lock:
+        cached = _fences.get(collector_id)
+    if cached is not None and time.monotonic() - cached[1] < FENCE_TTL_SECONDS:
+        return cached[0]
+    fence = load_fence(collector_id)
+    previous = cached[0] if cached is not None else None
+    if fence is not None and previous is not None and _same_current_stop(previous, fence):
+        fence.last_inside_at = previous.last_inside_at
+    with _lock:
+        _fences[collector_id] = (fence, time.monotonic())
+    return fence
+
+
+def _same_current_stop(a, b):
+    return (
+        a.current is not None and b.current is not None
+        and a.stop_ids[a.current] == b.stop_ids[b.current]
+    )
+
+
+def invalidate(collector_id=None, route_id=None):
+    """Forget the fence of a collector, or of whichever collector holds `route_id`."""
+    with _lock:
+        if collector_id is not None:
+            _fences.pop(collector_id, None)
+        if route_id is not None:
+            for key, (fence, _) in list(_fences.items()):
+                if fence is not None and fence.route_id == route_id:
+                    _fences.pop(key, None)
+
+
+def _stamp(fence, events):
+    for kind, stop_id, at in events:
+        if kind == 'arrive':
+            changed = (
+                RouteStop.objects.filter(pk=stop_id, actual_start__isnull=True, status='pending')
+                .update(actual_start=at, status='in_progress', updated_at=timezone.now())
+            )
+        else:
+            changed = (
+                RouteStop.objects.filter(pk=stop_id, actual_start__isnull=False, actual_end__isnull=True)
+                .update(actual_end=at, updated_at=timezone.now())
+            )
+        if changed:
+            record_changes('route_stop', [(stop_id, fence.collector_id)])
+
+
+def evaluate(collector_id, pings):
+    """
+    Run a collector's pings (collector.telemetry.Ping, any order) through
+    their route fence. Only pings of the same collector wait on each other;
+    the stamps are written after the lock is released.
+    """
+    with _collector_lock(collector_id):
+        fence = _fence_for(collector_id)
+        if fence is None:
+            return []
+        events = []
+        for ping in sorted(pings, key=lambda p: p.recorded_at):
+            if ping.accuracy_m is not None and ping.accuracy_m > MAX_ACCURACY_M:
+                continue
+            events.extend(fence.step(ping.latitude, ping.longitude, ping.recorded_at))
+    if events:
+        _stamp(fence, events)
+    return events
@@ -0,0 +1,36 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from routes.travel_matrix import cache
+from routes.travel_matrix.osm import build_graph
+
+
+class Command(BaseCommand):
+    help = "Build the offline road graph used for route travel times from an OSM XML extract."
+
+    def add_arguments(self, parser):
+        parser.add_argument('osm_file', help="OSM XML extract (.osm, .osm.bz2 or .osm.gz).")
+        parser.add_argument('--output', help="Where to write the graph. Defaults to ROAD_GRAPH_PATH.")
+        parser.add_argument('--keep-cache', action='store_true',
+                            help="Keep cached travel times (only safe if speeds did not change).")
+
+    def handle(self, *args, **options):
+        output = options['output'] or getattr(settings, 'ROAD_GRAPH_PATH', None)
+        if not output:
+            raise CommandError("Set ROAD_GRAPH_PATH or pass --output.")
+        if not os.path.exists(options['osm_file']):
+            raise CommandError(f"{options['osm_file']} does not exist.")
+
+        graph = build_graph(options['osm_file'])
+        if not len(graph):
+            raise CommandError("No drivable roads found in the extract.")
+
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        graph.save(output)
+        if not options['keep_cache']:
+            cache.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(graph)} nodes and {graph.edge_count} edges to {output}."
+        ))
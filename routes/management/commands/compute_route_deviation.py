@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from routes.deviation import compute_day
+
+
+class Command(BaseCommand):
+    help = "Compare a day's routes with the collectors' GPS breadcrumbs and store planned-vs-actual deviations."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Route date (YYYY-MM-DD). Defaults to yesterday.")
+        parser.add_argument('--route', type=int, action='append', dest='routes',
+                            help="Only this route id (repeatable).")
+
+    def handle(self, *args, **options):
+        route_date = (
+            parse_date(options['date']) if options['date'] else timezone.now().date() - timedelta(days=1)
+        )
+        if route_date is None:
+            raise CommandError("--date must be YYYY-MM-DD.")
+
+        started = timezone.now()
+        count = compute_day(route_date, options['routes'])
+        seconds = (timezone.now() - started).total_seconds()
+        self.stdout.write(self.style.SUCCESS(f"Analysed {count} routes for {route_date} in {seconds:.1f}s."))
@@ -0,0 +1,40 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from routes.planner import DEFAULT_PLAN_TIME_BUDGET, plan_day
+from waste_management_company.models import Company
+
+
+class Command(BaseCommand):
+    help = "Plan one route per collector for a company's pending requests on a given date."
+
+    def add_arguments(self, parser):
+        parser.add_argument('company_id', type=int)
+        parser.add_argument('--date', help="Route date (YYYY-MM-DD). Defaults to today.")
+        parser.add_argument('--time-budget', type=float, default=DEFAULT_PLAN_TIME_BUDGET,
+                            help="Seconds the solver may spend improving routes.")
+        parser.add_argument('--dry-run', action='store_true', help="Plan without writing routes.")
+
+    def handle(self, *args, **options):
+        try:
+            company = Company.objects.get(pk=options['company_id'])
+        except Company.DoesNotExist:
+            raise CommandError(f"Company {options['company_id']} does not exist.")
+
+        route_date = parse_date(options['date']) if options['date'] else timezone.now().date()
+        if route_date is None:
+            raise CommandError("--date must be YYYY-MM-DD.")
+
+        summary = plan_day(
+            company,
+            route_date,
+            time_budget=options['time_budget'],
+            dry_run=options['dry_run'],
+        )
+        self.stdout.write(json.dumps(summary, indent=2))
+        self.stdout.write(self.style.SUCCESS(
+            f"Planned {len(summary['routes'])} routes, {len(summary['unassigned'])} requests unassigned."
+        ))
@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from routes.sync import prune
+
+
+class Command(BaseCommand):
+    help = "Delete delta sync change log entries older than --days. Devices with older cursors resync."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help="Keep this many days of changes (default 30).")
+
+    def handle(self, *args, **options):
+        deleted = prune(timedelta(days=options['days']))
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} change log entries."))
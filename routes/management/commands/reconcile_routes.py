@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from routes.metrics import reconcile_route
+from routes.models import Route
+
+
+class Command(BaseCommand):
+    help = "Fully recompute distance, duration and completion for routes (corrects incremental drift)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Only routes on this date (YYYY-MM-DD). Defaults to today.")
+        parser.add_argument('--route', type=int, action='append', dest='route_ids',
+                            help="Only this route id (repeatable).")
+        parser.add_argument('--all', action='store_true', help="Every route, whatever the date.")
+
+    def handle(self, *args, **options):
+        routes = Route.objects.all()
+        if options['route_ids']:
+            routes = routes.filter(pk__in=options['route_ids'])
+        elif not options['all']:
+            route_date = parse_date(options['date']) if options['date'] else timezone.now().date()
+            if route_date is None:
+                raise CommandError("--date must be YYYY-MM-DD.")
+            routes = routes.filter(route_date=route_date)
+
+        count = 0
+        for route in routes.iterator():
+            reconcile_route(route)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {count} routes."))
@@ -0,0 +1,225 @@
+"""
+Incremental route metrics.
+
+Saving a RouteStop adjusts its route by delta instead of reloading every stop:
+- a completion change moves completed_stops_count by +/-1,
+- an order or location change re-measures only the legs around the stop
+  (its old neighbours are joined up, its new neighbours are split), in
+  distance and in travel time; travel time is road time over the same legs
+  when the road graph is enabled, as in the full recompute,
+- an expected_minutes change shifts estimated_duration.
+
+Each change costs a constant number of queries whatever the route size.
+reconcile_route() is the full recompute, kept as an explicit task
+(`manage.py reconcile_routes`) to correct drift from rounding or bulk
+writes that bypass signals.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+
+from . import travel_matrix
+from .batch import is_suppressed
+from .models import AVERAGE_SPEED_KMH, Route, RouteStop, leg_km
+
+
+def reconcile_route(route):
+    """Full recompute of a route's distance, duration and completion from its stops."""
+    route.update_distance_and_duration()
+    route.update_completion_status()
+    route.save(update_fields=Route.METRIC_FIELDS)
+    return route
+
+
+def apply_stop_saved(stop, created):
+    """Fold a single RouteStop save into its route's metrics."""
+    old = None if created else getattr(stop, '_loaded_values', None)
+    if not created and old is None:
+        # Instance was not loaded from the database; we cannot diff it
+        return reconcile_route(Route.objects.get(pk=stop.route_id))
+
+    if old is not None and old.get('route_id', stop.route_id) != stop.route_id:
+        _apply(old['route_id'], removed=_Snapshot.from_loaded(stop, old))
+        old = None
+
+    new = _Snapshot.from_instance(stop)
+    _apply(stop.route_id, removed=_Snapshot.from_loaded(stop, old) if old else None, added=new)
+    stop._loaded_values = {**(old or {}), **new.as_loaded()}
+
+
+def apply_stop_deleted(stop):
+    old = getattr(stop, '_loaded_values', None)
+    removed = _Snapshot.from_loaded(stop, old) if old else _Snapshot.from_instance(stop)
+    _apply(stop.route_id, removed=removed)
+
+
+def apply_request_completion(link, request_id, completed):
+    """
+    A linked request moved into or out of 'completed'. Stops that are not
+    completed themselves follow the request, so their routes change by one.
+    """
+    route_ids = (
+        RouteStop.objects
+        .filter(**{f'{link}_id': request_id})
+        .exclude(status='completed')
+        .values_list('route_id', flat=True)
+    )
+    for route_id in route_ids:
+        if is_suppressed(route_id):
+            continue
+        with transaction.atomic():
+            route = Route.objects.select_for_update().filter(pk=route_id).first()
+            if route is None:
+                continue
+            delta = 1 if completed else -1
+            route.apply_completion_counts(
+                route.stops_count,
+                min(max(route.completed_stops_count + delta, 0), route.stops_count),
+            )
+            route.save(update_fields=Route.METRIC_FIELDS)
+
+
+class _Snapshot:
+    """The parts of a stop that feed route metrics, at one point in time."""
+
+    def __init__(self, stop_id, order, location, expected_minutes, completed, loaded):
+        self.stop_id = stop_id
+        self.order = order
+        self.location = location
+        self.expected_minutes = expected_minutes or 0
+        self.completed = completed
+        self.loaded = loaded
+
+    @classmethod
+    def from_instance(cls, stop):
+        return cls(
+            stop.pk,
+            stop.order,
+            stop.effective_location,
+            stop.expected_minutes,
+            stop.is_completed,
+            {
+                'route_id': stop.route_id,
+                'order': stop.order,
+                'location': stop.location,
+                'expected_minutes': stop.expected_minutes,
+                'status': stop.status,
+                'ondemand_request_id': stop.ondemand_request_id,
+                'scheduled_request_id': stop.scheduled_request_id,
+            },
+        )
+
+    @classmethod
+    def from_loaded(cls, stop, loaded):
+        """Rebuild the stop as it was when loaded, reusing linked requests when unchanged."""
+        old = RouteStop(
+            stop_id=stop.pk,
+            route_id=loaded.get('route_id', stop.route_id),
+            order=loaded.get('order', stop.order),
+            location=loaded.get('location', stop.location),
+            expected_minutes=loaded.get('expected_minutes', stop.expected_minutes),
+            status=loaded.get('status', stop.status),
+            ondemand_request_id=loaded.get('ondemand_request_id', stop.ondemand_request_id),
+            scheduled_request_id=loaded.get('scheduled_request_id', stop.scheduled_request_id),
+        )
+        # Requests are not edited by a stop save, so an unchanged link reuses the cached object
+        if old.ondemand_request_id and old.ondemand_request_id == stop.ondemand_request_id:
+            old.ondemand_request = stop.ondemand_request
+        if old.scheduled_request_id and old.scheduled_request_id == stop.scheduled_request_id:
+            old.scheduled_request = stop.scheduled_request
+        return cls.from_instance(old)
+
+    def as_loaded(self):
+        return dict(self.loaded)
+
+    def same_position(self, other):
+        return (
+            self.order == other.order
+            and _same_point(self.location, other.location)
+        )
+
+
+def _same_point(a, b):
+    if a is None or b is None:
+        return a is b
+    return a.x == b.x and a.y == b.y
+
+
+def _neighbours(route_id, order, exclude_id):
+    """Stops immediately before and after `order` on a route, ignoring `exclude_id`."""
+    stops = RouteStop.objects.filter(route_id=route_id).exclude(pk=exclude_id).select_related(
+        'ondemand_request', 'scheduled_request'
+    )
+    prev = stops.filter(order__lt=order).order_by('-order').first()
+    nxt = stops.filter(order__gt=order).order_by('order').first()
+    return (
+        prev.effective_location if prev else None,
+        nxt.effective_location if nxt else None,
+    )
+
+
+def _path_minutes(points, road):
+    """Travel minutes through the located `points` in order: over the road graph when `road`, else at AVERAGE_SPEED_KMH."""
+    located = [p for p in points if p]
+    if len(located) < 2:
+        return 0.0
+    if road:
+        return travel_matrix.path_minutes([p.y for p in located], [p.x for p in located])
+    return sum(leg_km(a, b) for a, b in zip(located, located[1:])) / AVERAGE_SPEED_KMH * 60
+
+
+def _splice(route_id, snapshot, sign, road):
+    """(km, travel minutes) change from inserting (+1) or removing (-1) a stop at its position."""
+    if not snapshot.location:
+        return 0.0, 0.0
+    prev, nxt = _neighbours(route_id, snapshot.order, snapshot.stop_id)
+    km = leg_km(prev, snapshot.location) + leg_km(snapshot.location, nxt)
+    minutes = _path_minutes([prev, snapshot.location, nxt], road)
+    if prev and nxt:
+        km -= leg_km(prev, nxt)
+        minutes -= _path_minutes([prev, nxt], road)
+    return sign * km, sign * minutes
+
+
+def _apply(route_id, removed=None, added=None):
+    with transaction.atomic():
+        route = Route.objects.select_for_update().filter(pk=route_id).first()
+        if route is None:
+            return
+
+        stops_total = route.stops_count
+        completed = route.completed_stops_count
+        road = travel_matrix.is_enabled()
+        splices = []
+        minutes_delta = 0
+
+        if removed is not None and added is not None:
+            completed += int(added.completed) - int(removed.completed)
+            minutes_delta += added.expected_minutes - removed.expected_minutes
+            if not removed.same_position(added):
+                splices.append(_splice(route_id, removed, -1, road))
+                splices.append(_splice(route_id, added, +1, road))
+        elif added is not None:
+            stops_total += 1
+            completed += int(added.completed)
+            minutes_delta += added.expected_minutes
+            splices.append(_splice(route_id, added, +1, road))
+        elif removed is not None:
+            stops_total -= 1
+            completed -= int(removed.completed)
+            minutes_delta -= removed.expected_minutes
+            splices.append(_splice(route_id, removed, -1, road))
+        distance_delta = sum(km for km, _ in splices)
+        travel_delta = sum(minutes for _, minutes in splices)
+
+        stops_total = max(stops_total, 0)
+        route.apply_completion_counts(stops_total, min(max(completed, 0), stops_total))
+
+        total_km = max(float(route.total_distance_km) + distance_delta, 0.0)
+        route.total_distance_km = Decimal(str(round(total_km, 3)))
+        if stops_total < 2:
+            route.total_distance_km = Decimal('0')
+        duration_delta = timedelta(minutes=travel_delta + minutes_delta)
+        route.estimated_duration = max(route.estimated_duration + duration_delta, timedelta(0))
+        route.save(update_fields=Route.METRIC_FIELDS)
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-16 09:14
+
+import django.db.models.constraints
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0010_remove_routestop_client_routestop_ondemand_request_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='routestop',
+            name='unique_stop_order_per_route',
+        ),
+        migrations.AddConstraint(
+            model_name='routestop',
+            constraint=models.UniqueConstraint(deferrable=django.db.models.constraints.Deferrable['DEFERRED'], fields=('route', 'order'), name='unique_stop_order_per_route'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.7 on 2026-10-16 10:02
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_stop_counters(apps, schema_editor):
+    Route = apps.get_model('routes', 'Route')
+    routes = Route.objects.annotate(
+        n_stops=Count('stops'),
+        n_completed=Count('stops', filter=(
+            Q(stops__status='completed')
+            | Q(stops__ondemand_request__request_status='completed')
+            | Q(stops__scheduled_request__request_status='completed')
+        )),
+    )
+    batch = []
+    for route in routes.iterator(chunk_size=2000):
+        route.stops_count = route.n_stops
+        route.completed_stops_count = route.n_completed
+        batch.append(route)
+        if len(batch) >= 2000:
+            Route.objects.bulk_update(batch, ['stops_count', 'completed_stops_count'])
+            batch = []
+    Route.objects.bulk_update(batch, ['stops_count', 'completed_stops_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0011_alter_routestop_unique_stop_order_per_route'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='route',
+            name='completed_stops_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='stops_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_stop_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-16 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0012_route_completed_stops_count_route_stops_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TravelTime',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_node', models.BigIntegerField()),
+                ('to_node', models.BigIntegerField()),
+                ('seconds', models.FloatField(blank=True, help_text='Empty when the graph cannot connect the nodes', null=True)),
+                ('last_used_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('from_node', 'to_node'), name='unique_travel_time_pair')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-16 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0013_traveltime'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('entity', models.CharField(choices=[('route', 'Route'), ('route_stop', 'Route stop'), ('ondemand_request', 'On-demand request'), ('scheduled_request', 'Scheduled request')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('upsert', 'Created or updated'), ('delete', 'Deleted')], default='upsert', max_length=10)),
+                ('collector_id', models.BigIntegerField(blank=True, null=True)),
+                ('changed_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['collector_id', 'id'], name='changelog_collector_cursor')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-16 18:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0014_changelog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteDeviation',
+            fields=[
+                ('route', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='deviation', serialize=False, to='routes.route')),
+                ('computed_at', models.DateTimeField()),
+                ('ping_count', models.PositiveIntegerField(default=0)),
+                ('planned_distance_km', models.DecimalField(decimal_places=3, default=0, max_digits=10)),
+                ('actual_distance_km', models.DecimalField(decimal_places=3, default=0, max_digits=10)),
+                ('mean_offroute_m', models.FloatField(default=0)),
+                ('max_offroute_m', models.FloatField(default=0)),
+                ('offroute_share', models.FloatField(default=0, help_text='Share of pings farther than OFFROUTE_M from the planned path')),
+                ('stops_planned', models.PositiveIntegerField(default=0)),
+                ('stops_visited', models.PositiveIntegerField(default=0)),
+                ('stops_out_of_order', models.PositiveIntegerField(default=0, help_text='Visited stops outside the longest run that follows the planned order')),
+                ('planned_minutes', models.PositiveIntegerField(default=0, help_text='Sum of expected_minutes of visited stops')),
+                ('dwell_minutes', models.FloatField(default=0, help_text='Time spent within the arrival radius of visited stops')),
+                ('stops', models.JSONField(default=list)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['computed_at'], name='routes_rout_compute_000bad_idx')],
+            },
+        ),
+    ]
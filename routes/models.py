@@ -1,7 +1,18 @@
 from datetime import timedelta
 from django.contrib.gis.db import models as gis_models
-from django.db import models
+from django.db import connections, models
 from django.core.validators import MinValueValidator, MaxValueValidator
+from .optimizer import haversine_km, haversine_path_km
+
+
+AVERAGE_SPEED_KMH = 40
+
+
+def leg_km(a, b):
+    """Great-circle length (km) of the leg between two points, 0 if either is missing."""
+    if not a or not b:
+        return 0.0
+    return haversine_km(a.y, a.x, b.y, b.x)
 
 
 class Route(models.Model):
@@ -36,6 +47,10 @@ class Route(models.Model):
     ]
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft', db_index=True)
 
+    # Maintained incrementally by routes.metrics (see reconcile_route for a full recompute)
+    stops_count = models.PositiveIntegerField(default=0)
+    completed_stops_count = models.PositiveIntegerField(default=0)
+
     # Analytics
     total_distance_km = models.DecimalField(max_digits=10, decimal_places=3, default=0)  # more precision
     estimated_duration = models.DurationField(default=timedelta)  # use DurationField for flexibility
@@ -43,6 +58,15 @@ class Route(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    METRIC_FIELDS = [
+        'total_distance_km',
+        'estimated_duration',
+        'stops_count',
+        'completed_stops_count',
+        'completion_percent',
+        'status',
+    ]
+
     class Meta:
         ordering = ['-route_date', '-created_at']
         constraints = [
@@ -53,64 +77,96 @@ class Route(models.Model):
         ]
 
     def update_distance_and_duration(self):
-        stops = list(self.stops.all().order_by('order'))
-        if len(stops) < 2:
-            self.total_distance_km = 0
-            self.estimated_duration = timedelta(minutes=0)
-            return
-
-        total_distance = 0.0
-        for i in range(len(stops) - 1):
-            # Get location from linked request if available
-            loc1 = None
-            loc2 = None
-
-            if stops[i].ondemand_request and stops[i].ondemand_request.location:
-                loc1 = stops[i].ondemand_request.location
-            elif stops[i].scheduled_request and stops[i].scheduled_request.location:
-                loc1 = stops[i].scheduled_request.location
-            else:
-                loc1 = stops[i].location  # fallback
-
-            if stops[i+1].ondemand_request and stops[i+1].ondemand_request.location:
-                loc2 = stops[i+1].ondemand_request.location
-            elif stops[i+1].scheduled_request and stops[i+1].scheduled_request.location:
-                loc2 = stops[i+1].scheduled_request.location
-            else:
-                loc2 = stops[i+1].location  # fallback
-
-            if loc1 and loc2:
-                total_distance += loc1.distance(loc2) / 1000  # meters → km
+        connection = connections[self._state.db or 'default']
+        if connection.vendor == 'postgresql':
+            total_distance, total_stop_time = self._route_length_postgis(connection)
+        else:
+            total_distance, total_stop_time = self._route_length_numpy()
 
         self.total_distance_km = round(total_distance, 3)
 
         # Estimate duration = travel time + stop time
-        total_stop_time = sum([s.expected_minutes for s in stops if s.expected_minutes])
-        average_speed_kmh = 40  # configurable
-        travel_time_minutes = (total_distance / average_speed_kmh) * 60
+        travel_time_minutes = self._road_travel_minutes()
+        if travel_time_minutes is None:
+            travel_time_minutes = (total_distance / AVERAGE_SPEED_KMH) * 60
 
         total_minutes = travel_time_minutes + total_stop_time
         self.estimated_duration = timedelta(minutes=total_minutes)
-        
-    def update_completion_status(self):
-        stops_total = self.stops.count()
-        if stops_total == 0:
-            self.completion_percent = 0
-            return
 
+    def _route_length_postgis(self, connection):
+        """
+        Route length (km) and total stop minutes in one round trip.
+        Each stop's point is the linked request's location, falling back to the
+        stop's own; LAG() pairs it with the previous stop by `order` and
+        ST_Distance measures the leg on the sphere (same model as haversine).
+        """
+        from on_demand.models import OnDemandRequest
+        from scheduled_request.models import ScheduledRequest
+
+        qn = connection.ops.quote_name
+        point = (
+            f"COALESCE(o.{qn('location')}, r.{qn('location')}, s.{qn('location')}::geography)"
+        )
+        sql = f"""
+            SELECT COALESCE(SUM(ST_Distance(legs.prev_point, legs.point, false)), 0) / 1000.0,
+                   COALESCE(SUM(legs.expected_minutes), 0)
+            FROM (
+                SELECT s.{qn('expected_minutes')} AS expected_minutes,
+                       {point} AS point,
+                       LAG({point}) OVER (ORDER BY s.{qn('order')}) AS prev_point
+                FROM {qn(RouteStop._meta.db_table)} s
+                LEFT JOIN {qn(OnDemandRequest._meta.db_table)} o
+                    ON o.{qn(OnDemandRequest._meta.pk.column)} = s.{qn('ondemand_request_id')}
+                LEFT JOIN {qn(ScheduledRequest._meta.db_table)} r
+                    ON r.{qn(ScheduledRequest._meta.pk.column)} = s.{qn('scheduled_request_id')}
+                WHERE s.{qn('route_id')} = %s
+            ) legs
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [self.pk])
+            distance_km, stop_minutes = cursor.fetchone()
+        return float(distance_km), int(stop_minutes)
+
+    def _route_length_numpy(self):
+        """Fallback for databases without PostGIS: haversine over the ordered stop points."""
+        stops = list(
+            self.stops.select_related('ondemand_request', 'scheduled_request').order_by('order')
+        )
+        points = [s.effective_location for s in stops]
+        located = [p for p in points if p]
+        total_distance = haversine_path_km([p.y for p in located], [p.x for p in located])
+        total_stop_time = sum([s.expected_minutes for s in stops if s.expected_minutes])
+        return total_distance, total_stop_time
+
+    def _road_travel_minutes(self):
+        """Driving minutes along the stops over the road graph, or None when it is not configured."""
+        from .travel_matrix import is_enabled, path_minutes
+
+        if not is_enabled():
+            return None
+        stops = self.stops.select_related('ondemand_request', 'scheduled_request').order_by('order')
+        located = [p for p in (s.effective_location for s in stops) if p]
+        return path_minutes([p.y for p in located], [p.x for p in located])
+
+    def update_completion_status(self):
+        stops_total = 0
         completed_stops = 0
 
-        for stop in self.stops.all():
-            # Check linked OnDemandRequest
-            if stop.ondemand_request and stop.ondemand_request.request_status == "completed":
-                completed_stops += 1
-            # Check linked ScheduledRequest
-            elif stop.scheduled_request and stop.scheduled_request.request_status == "completed":
-                completed_stops += 1
-            # Optional: if no request linked, fall back to stop.status
-            elif stop.status == "completed":
+        for stop in self.stops.select_related('ondemand_request', 'scheduled_request'):
+            stops_total += 1
+            if stop.is_completed:
                 completed_stops += 1
 
+        self.apply_completion_counts(stops_total, completed_stops)
+
+    def apply_completion_counts(self, stops_total, completed_stops):
+        """Set the stop counters and derive completion_percent and status from them."""
+        self.stops_count = stops_total
+        self.completed_stops_count = completed_stops
+        if stops_total == 0:
+            self.completion_percent = 0
+            return
+
         self.completion_percent = int((completed_stops / stops_total) * 100)
 
         # Auto-update route status, but preserve cancelled
@@ -125,13 +181,13 @@ class Route(models.Model):
         else:
             self.status = 'assigned'
 
-    
-
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)  # initial save
-        self.update_distance_and_duration()
-        self.update_completion_status()
-        super().save(update_fields=['total_distance_km', 'estimated_duration', 'completion_percent', 'status'])
+        # Targeted saves (e.g. incremental metrics) must not trigger a full recompute,
+        # and a brand-new route has no stops yet, so its defaults are already right.
+        if kwargs.get('update_fields') is None and not self._state.adding:
+            self.update_distance_and_duration()
+            self.update_completion_status()
+        super().save(*args, **kwargs)
 
 
 
@@ -183,9 +239,21 @@ class RouteStop(models.Model):
     class Meta:
         ordering = ['order']
         constraints = [
-            models.UniqueConstraint(fields=['route', 'order'], name='unique_stop_order_per_route')
+            # Deferred so a whole route can be reordered in one bulk update
+            models.UniqueConstraint(
+                fields=['route', 'order'],
+                name='unique_stop_order_per_route',
+                deferrable=models.Deferrable.DEFERRED,
+            )
         ]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Snapshot of the loaded row so routes.metrics can apply changes by delta
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     def __str__(self):
         request_ref = (
             f"OnDemand #{self.ondemand_request_id}" if self.ondemand_request
@@ -193,3 +261,110 @@ class RouteStop(models.Model):
             else "Unlinked"
         )
         return f"Stop {self.order} for Route {self.route.route_id} ({request_ref})"
+
+    @property
+    def effective_location(self):
+        """Location of the linked request, falling back to the stop's own point."""
+        if self.ondemand_request and self.ondemand_request.location:
+            return self.ondemand_request.location
+        if self.scheduled_request and self.scheduled_request.location:
+            return self.scheduled_request.location
+        return self.location
+
+    @property
+    def is_completed(self):
+        """A stop counts as done when it, or the request it serves, is completed."""
+        if self.ondemand_request and self.ondemand_request.request_status == "completed":
+            return True
+        if self.scheduled_request and self.scheduled_request.request_status == "completed":
+            return True
+        return self.status == "completed"
+
+
+class TravelTime(models.Model):
+    """Cached road travel time between two snapped road graph nodes (see routes.travel_matrix)."""
+    from_node = models.BigIntegerField()
+    to_node = models.BigIntegerField()
+    seconds = models.FloatField(null=True, blank=True, help_text="Empty when the graph cannot connect the nodes")
+    last_used_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['from_node', 'to_node'],
+                name='unique_travel_time_pair'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.from_node} -> {self.to_node}: {self.seconds}s"
+
+
+class ChangeLog(models.Model):
+    """
+    Append-only log of changes to the rows collectors' devices sync.
+    The id is the cursor handed to devices (see routes.sync).
+    """
+    ENTITY_CHOICES = [
+        ('route', 'Route'),
+        ('route_stop', 'Route stop'),
+        ('ondemand_request', 'On-demand request'),
+        ('scheduled_request', 'Scheduled request'),
+    ]
+    ACTION_CHOICES = [
+        ('upsert', 'Created or updated'),
+        ('delete', 'Deleted'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    entity = models.CharField(max_length=20, choices=ENTITY_CHOICES)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES, default='upsert')
+    # Whose device should see the change; not a FK so entries outlive the collector
+    collector_id = models.BigIntegerField(null=True, blank=True)
+    changed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['collector_id', 'id'], name='changelog_collector_cursor'),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.action} {self.entity} {self.object_id}"
+
+
+class RouteDeviation(models.Model):
+    """
+    Planned-vs-actual summary of one route, computed from the collector's GPS
+    breadcrumbs by routes.deviation.
+    """
+    route = models.OneToOneField('Route', on_delete=models.CASCADE, primary_key=True, related_name='deviation')
+    computed_at = models.DateTimeField()
+
+    ping_count = models.PositiveIntegerField(default=0)
+    planned_distance_km = models.DecimalField(max_digits=10, decimal_places=3, default=0)
+    actual_distance_km = models.DecimalField(max_digits=10, decimal_places=3, default=0)
+
+    # Distance from each ping to the planned path (stop-to-stop legs)
+    mean_offroute_m = models.FloatField(default=0)
+    max_offroute_m = models.FloatField(default=0)
+    offroute_share = models.FloatField(default=0, help_text="Share of pings farther than OFFROUTE_M from the planned path")
+
+    stops_planned = models.PositiveIntegerField(default=0)
+    stops_visited = models.PositiveIntegerField(default=0)
+    stops_out_of_order = models.PositiveIntegerField(
+        default=0, help_text="Visited stops outside the longest run that follows the planned order"
+    )
+    planned_minutes = models.PositiveIntegerField(default=0, help_text="Sum of expected_minutes of visited stops")
+    dwell_minutes = models.FloatField(default=0, help_text="Time spent within the arrival radius of visited stops")
+
+    # [{"stop_id", "order", "visit_rank", "arrived_at", "dwell_minutes", "expected_minutes"}] in planned order
+    stops = models.JSONField(default=list)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['computed_at']),
+        ]
+
+    def __str__(self):
+        return f"Route #{self.route_id}: {self.actual_distance_km} km driven vs {self.planned_distance_km} km planned"
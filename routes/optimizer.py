@@ -0,0 +1,244 @@
+"""
+Route ordering engine.
+
+Stops are ordered on a cost matrix that is built once per route
+(haversine km by default, or road minutes from routes.travel_matrix). Engines are registered by name so callers can pick a
+strategy without knowing how it works:
+
+- center_distance: legacy ordering by distance from the start point.
+- nearest_neighbour: greedy construction only.
+- two_opt: nearest-neighbour construction improved with 2-opt and Or-opt
+  moves until no move helps or the time budget runs out (default).
+
+Routes are open paths: they start at the depot / zone center (when given)
+and end at the last stop, so the closing leg is never counted.
+"""
+import math
+import time
+
+import numpy as np
+
+
+EARTH_RADIUS_KM = 6371.0088
+DEFAULT_ENGINE = 'two_opt'
+DEFAULT_TIME_BUDGET = 0.3  # seconds spent improving a single route
+
+ENGINES = {}
+
+
+def register_engine(name):
+    """Register an ordering engine under `name`."""
+    def decorator(func):
+        ENGINES[name] = func
+        return func
+    return decorator
+
+
+def get_engine(name):
+    try:
+        return ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Unknown route optimizer engine '{name}'. Choices: {sorted(ENGINES)}")
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance (km) between two points given in degrees."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def haversine_path_km(lats, lngs):
+    """Length (km) of the path through consecutive points, vectorized over all legs."""
+    lat = np.radians(np.asarray(lats, dtype=float))
+    lng = np.radians(np.asarray(lngs, dtype=float))
+    if len(lat) < 2:
+        return 0.0
+    a = (np.sin(np.diff(lat) / 2) ** 2
+         + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lng) / 2) ** 2)
+    return float((2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))).sum())
+
+
+def haversine_matrix(lats, lngs):
+    """
+    Pairwise great-circle distances (km) between points given as degree arrays.
+    Uses the chord form of the haversine (hav(theta) = chord**2 / 4) so the
+    n x n work is a single matrix product instead of n**2 trig calls.
+    """
+    lat = np.radians(np.asarray(lats, dtype=float))
+    lng = np.radians(np.asarray(lngs, dtype=float))
+    xyz = np.column_stack((np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)))
+    chord_sq = 2.0 - 2.0 * (xyz @ xyz.T)
+    np.clip(chord_sq, 0.0, 4.0, out=chord_sq)
+    np.sqrt(chord_sq, out=chord_sq)
+    chord_sq *= 0.5
+    np.arcsin(chord_sq, out=chord_sq)
+    chord_sq *= 2 * EARTH_RADIUS_KM
+    np.fill_diagonal(chord_sq, 0.0)
+    return chord_sq
+
+
+def path_length(dist, tour):
+    """Length of an open path visiting `tour` in order."""
+    tour = np.asarray(tour)
+    if len(tour) < 2:
+        return 0.0
+    return float(dist[tour[:-1], tour[1:]].sum())
+
+
+# ---------------------------
+# Engines
+# ---------------------------
+
+@register_engine('center_distance')
+def center_distance(dist, deadline=None):
+    """Order nodes by distance from node 0 (the start point)."""
+    return np.argsort(dist[0], kind='stable')
+
+
+@register_engine('nearest_neighbour')
+def nearest_neighbour(dist, deadline=None):
+    """Greedy tour: always drive to the closest unvisited node, starting at node 0."""
+    n = len(dist)
+    tour = np.empty(n, dtype=np.int64)
+    visited = np.zeros(n, dtype=bool)
+    current = 0
+    for step in range(n):
+        tour[step] = current
+        visited[current] = True
+        if step == n - 1:
+            break
+        row = np.where(visited, np.inf, dist[current])
+        current = int(np.argmin(row))
+    return tour
+
+
+@register_engine('two_opt')
+def two_opt(dist, deadline=None):
+    """Nearest-neighbour construction followed by 2-opt and Or-opt improvement."""
+    tour = nearest_neighbour(dist)
+    while True:
+        improved = _two_opt_pass(dist, tour, deadline)
+        improved |= _or_opt_pass(dist, tour, deadline)
+        if not improved or _expired(deadline):
+            return tour
+
+
+def _expired(deadline):
+    return deadline is not None and time.perf_counter() >= deadline
+
+
+def _two_opt_pass(dist, tour, deadline, eps=1e-9):
+    """
+    One sweep of 2-opt over an open path with a fixed first node.
+    For each position i the best reversal of tour[i..j] is found in a
+    single vectorized step over every j. Mutates `tour` in place.
+
+    Reversing a segment also drives every leg inside it the other way,
+    which costs something on an asymmetric matrix (one-way roads); that
+    difference is the running sum of backward minus forward legs.
+    """
+    n = len(tour)
+    improved = False
+    for i in range(1, n - 1):
+        a, b = tour[i - 1], tour[i]
+        c = tour[i + 1:]                       # candidate last node of the reversed segment
+        after = np.append(tour[i + 2:], -1)    # node following c (-1 = end of path)
+        has_next = after >= 0
+        nxt = np.where(has_next, after, 0)
+        delta = dist[a, c] - dist[a, b]
+        delta += np.where(has_next, dist[b, nxt] - dist[c, nxt], 0.0)
+        inner = tour[i:]
+        delta += np.cumsum(dist[inner[1:], inner[:-1]] - dist[inner[:-1], inner[1:]])
+        k = int(np.argmin(delta))
+        if delta[k] < -eps:
+            j = i + 1 + k
+            tour[i:j + 1] = tour[i:j + 1][::-1].copy()
+            improved = True
+        if _expired(deadline):
+            break
+    return improved
+
+
+def _or_opt_pass(dist, tour, deadline, max_segment=3, eps=1e-9):
+    """
+    One sweep of Or-opt: move segments of 1..max_segment consecutive
+    stops to the cheapest other position in the path. Mutates `tour`.
+    """
+    improved = False
+    for length in range(1, max_segment + 1):
+        i = 1
+        while i + length <= len(tour):
+            n = len(tour)
+            seg = tour[i:i + length]
+            p = tour[i - 1]
+            first, last = seg[0], seg[-1]
+            if i + length < n:
+                nx = tour[i + length]
+                removal_gain = dist[p, first] + dist[last, nx] - dist[p, nx]
+            else:
+                removal_gain = dist[p, first]
+
+            rest = np.concatenate((tour[:i], tour[i + length:]))
+            left = rest
+            right = np.append(rest[1:], -1)
+            has_right = right >= 0
+            r = np.where(has_right, right, 0)
+            insert_cost = dist[left, first] + np.where(
+                has_right, dist[last, r] - dist[left, r], 0.0
+            )
+            insert_cost[i - 1] = np.inf  # that is where the segment came from
+            k = int(np.argmin(insert_cost))
+            if insert_cost[k] - removal_gain < -eps:
+                tour[:] = np.concatenate((rest[:k + 1], seg, rest[k + 1:]))
+                improved = True
+            i += 1
+            if _expired(deadline):
+                return improved
+    return improved
+
+
+# ---------------------------
+# Public API
+# ---------------------------
+
+def order_by_matrix(dist, engine=DEFAULT_ENGINE, time_budget=DEFAULT_TIME_BUDGET):
+    """
+    Order the nodes of a square cost matrix. Node 0 is the fixed start.
+    Returns an array of node indices, beginning with 0.
+    """
+    dist = np.asarray(dist, dtype=float)
+    if len(dist) <= 2:
+        return np.arange(len(dist))
+    deadline = time.perf_counter() + time_budget if time_budget is not None else None
+    tour = np.asarray(get_engine(engine)(dist, deadline), dtype=np.int64)
+    if tour[0] != 0:
+        # Engines that do not pin the start (e.g. argsort) are rotated back.
+        tour = np.concatenate(([0], tour[tour != 0]))
+    return tour
+
+
+def optimize_order(lats, lngs, start=None, engine=DEFAULT_ENGINE, time_budget=DEFAULT_TIME_BUDGET,
+                   cost=haversine_matrix):
+    """
+    Return the visiting order of the given points as indices into lats/lngs.
+    `start` is an optional (lat, lng) the route departs from (e.g. the zone center).
+    `cost(lats, lngs)` builds the square matrix that is minimised; it defaults
+    to haversine distance (e.g. pass travel_matrix.time_matrix for road times).
+    """
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    if len(lats) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    if start is not None:
+        dist = cost(np.append(start[0], lats), np.append(start[1], lngs))
+        return order_by_matrix(dist, engine, time_budget)[1:] - 1
+
+    # No depot: start from the point furthest from the centroid so the path
+    # sweeps across the area instead of starting in the middle.
+    first = int(np.argmax((lats - lats.mean()) ** 2 + (lngs - lngs.mean()) ** 2))
+    idx = np.concatenate(([first], np.delete(np.arange(len(lats)), first)))
+    dist = cost(lats[idx], lngs[idx])
+    return idx[order_by_matrix(dist, engine, time_budget)]
@@ -0,0 +1,345 @@
+"""
+Daily multi-collector route planner (capacitated VRP).
+
+plan_day() takes every pending request of a company for a date and splits
+them across the company's collectors:
+
+1. Requests are grouped by the zone that contains them.
+2. Collectors are handed out to zones in proportion to the waste volume
+   (litres) waiting there; collectors whose assigned_area_zone matches a
+   zone go there first.
+3. Inside a zone a sweep heuristic sorts requests by polar angle around the
+   zone center and cuts them into capacity-sized sectors, one per collector.
+4. Each sector is ordered by time slot (morning -> evening) and then with
+   the route optimizer, sharing one time budget across all routes. Road
+   travel times are used when a road graph is configured.
+5. Routes, stops and request assignments are written in bulk.
+"""
+import math
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from collector.models import Collector
+from on_demand.models import OnDemandRequest
+from scheduled_request.models import ScheduledRequest
+from zones import index as zone_index
+from zones.models import Zone
+from . import travel_matrix
+from .models import Route, RouteStop
+from .optimizer import DEFAULT_ENGINE, haversine_matrix, order_by_matrix, path_length
+from .services import estimate_stop_minutes
+from .sync import record_changes
+
+
+DEFAULT_PLAN_TIME_BUDGET = 10.0  # seconds for the whole day
+BAG_LITRES = 60
+AVERAGE_SPEED_KMH = 40
+
+DEFAULT_VEHICLE_CAPACITY_LITRES = 6000
+VEHICLE_CAPACITY_LITRES = {
+    'tricycle': 1500,
+    'motorbike': 1500,
+    'pickup': 4000,
+    'van': 6000,
+    'truck': 16000,
+    'compactor': 20000,
+}
+
+TIME_SLOT_RANK = {'morning': 0, 'afternoon': 1, 'evening': 2}
+
+
+def request_litres(request):
+    """Volume a request takes up on the vehicle."""
+    if request.bin_size_liters:
+        return request.bin_size_liters
+    return max(request.bag_count or 1, 1) * BAG_LITRES
+
+
+def vehicle_capacity(collector):
+    vehicle_type = (collector.vehicle_type or '').lower()
+    for name, litres in VEHICLE_CAPACITY_LITRES.items():
+        if name in vehicle_type:
+            return litres
+    return DEFAULT_VEHICLE_CAPACITY_LITRES
+
+
+# ---------------------------
+# Solver (pure NumPy, no database access)
+# ---------------------------
+
+def allocate_vehicles(zone_loads, capacities):
+    """
+    Decide how many vehicles each zone gets.
+    zone_loads: {zone_id: litres}; capacities: litres per available vehicle.
+    Returns {zone_id: vehicle count}.
+    """
+    if not zone_loads or not capacities:
+        return {}
+    avg_capacity = float(np.mean(capacities))
+    need = {z: max(1, math.ceil(load / avg_capacity)) for z, load in zone_loads.items()}
+    available = len(capacities)
+    if sum(need.values()) <= available:
+        return need
+
+    # Not enough vehicles: largest-remainder split of the fleet by load
+    total = sum(zone_loads.values())
+    shares = {z: available * load / total for z, load in zone_loads.items()}
+    counts = {z: min(need[z], int(share)) for z, share in shares.items()}
+    spare = available - sum(counts.values())
+    for z in sorted(shares, key=lambda z: shares[z] - int(shares[z]), reverse=True):
+        if spare == 0:
+            break
+        if counts[z] < need[z]:
+            counts[z] += 1
+            spare -= 1
+    return counts
+
+
+def sweep_partition(lats, lngs, loads, center, capacities):
+    """
+    Split points into sectors around `center` (lat, lng), one per capacity.
+    Returns (list of index arrays, array of unassigned indices).
+    """
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    loads = np.asarray(loads, dtype=float)
+    n = len(lats)
+    if n == 0 or not capacities:
+        return [np.empty(0, dtype=np.int64) for _ in capacities], np.arange(n)
+
+    angles = np.arctan2(lats - center[0], (lngs - center[1]) * math.cos(math.radians(center[0])))
+    order = np.argsort(angles, kind='stable')
+    # Start the sweep right after the widest empty wedge so no cluster is cut in two
+    if n > 1:
+        gaps = np.diff(np.append(angles[order], angles[order[0]] + 2 * math.pi))
+        order = np.roll(order, -(int(np.argmax(gaps)) + 1))
+
+    # Sectors are sized by the share of the total load each vehicle should carry
+    cumulative = np.cumsum(loads[order])
+    total_capacity = float(sum(capacities))
+    targets = np.cumsum(capacities) * min(1.0, cumulative[-1] / total_capacity)
+    cuts = np.searchsorted(cumulative, targets, side='right')
+    if cumulative[-1] <= total_capacity:
+        cuts[-1] = n  # everything fits; don't lose the tail to float rounding
+
+    sectors = []
+    start = 0
+    for capacity, cut in zip(capacities, cuts):
+        sector = order[start:cut]
+        # Never exceed the vehicle: push overflow back into the next sector
+        fits = np.cumsum(loads[sector]) <= capacity
+        keep = int(fits.sum()) if not fits.all() else len(sector)
+        sectors.append(sector[:keep])
+        start += keep
+    unassigned = order[start:]
+    return sectors, unassigned
+
+
+def order_sector(lats, lngs, slots, start, engine=DEFAULT_ENGINE, time_budget=None, cost=None):
+    """
+    Order one collector's requests: earlier time slots first, each slot
+    optimized on its own matrix, continuing from the last stop.
+    `cost(lats, lngs)` optionally supplies travel minutes (road graph) to
+    order on instead of distance.
+    Returns (ordered indices, path length in km, travel minutes or None).
+    The first leg from `start` is not counted: it is not driven between stops.
+    """
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    slots = np.asarray(slots)
+    ordered = []
+    total_km = 0.0
+    total_minutes = 0.0 if cost is not None else None
+    position = start
+    deadline = time.perf_counter() + time_budget if time_budget is not None else None
+    for slot in np.unique(slots):
+        idx = np.flatnonzero(slots == slot)
+        remaining = max(deadline - time.perf_counter(), 0.0) if deadline else None
+        slot_lats, slot_lngs = np.append(position[0], lats[idx]), np.append(position[1], lngs[idx])
+        dist = haversine_matrix(slot_lats, slot_lngs)
+        minutes = cost(slot_lats, slot_lngs) if cost is not None else None
+        tour = order_by_matrix(minutes if minutes is not None else dist, engine, remaining)
+        driven = tour[1:] if not ordered else tour
+        total_km += path_length(dist, driven)
+        if minutes is not None:
+            total_minutes += path_length(minutes, driven)
+        chosen = idx[tour[1:] - 1]
+        ordered.extend(chosen.tolist())
+        position = (lats[chosen[-1]], lngs[chosen[-1]])
+    return ordered, total_km, total_minutes
+
+
+# ---------------------------
+# Database glue
+# ---------------------------
+
+def _pending_requests(company, route_date):
+    fields = ('location', 'bin_size_liters', 'bag_count', 'pickup_time_slot')
+    scheduled = ScheduledRequest.objects.filter(
+        company=company,
+        pickup_date=route_date,
+        request_status='pending',
+        collector__isnull=True,
+        location__isnull=False,
+        route_stops__isnull=True,
+    ).only('id', *fields)
+
+    # On-demand requests have no company; take the unassigned ones in the company's cities
+    cities = company.operational_cities or []
+    ondemand = OnDemandRequest.objects.filter(
+        pickup_date=route_date,
+        request_status__in=['pending', 'confirmed'],
+        collector__isnull=True,
+        location__isnull=False,
+        route_stops__isnull=True,
+        city__in=cities,
+    ).only('request_id', *fields)
+    return [('scheduled_request', r) for r in scheduled] + [('ondemand_request', r) for r in ondemand]
+
+
+def _zone_of_each(zones, lats, lngs):
+    """Index into `zones` of the (smallest) active zone covering each point (-1 if none)."""
+    position = {z.zone_id: i for i, z in enumerate(zones)}
+    return np.array([position.get(int(zone_id), -1) for zone_id in zone_index.lookup(lats, lngs)], dtype=np.int64)
+
+
+def _available_collectors(company, route_date, supervisor=None):
+    collectors = (
+        Collector.objects
+        .filter(company=company, is_private_collector=False, user__is_active=True)
+        .exclude(route__route_date=route_date)
+        .select_related('supervisor')
+    )
+    # Route.supervisor is required
+    return [c for c in collectors if c.supervisor or supervisor]
+
+
+def plan_day(company, route_date, supervisor=None, engine=DEFAULT_ENGINE,
+             time_budget=DEFAULT_PLAN_TIME_BUDGET, dry_run=False):
+    """
+    Plan one route per collector for `route_date` from the company's pending requests.
+    `supervisor` is used for collectors that have no supervisor of their own.
+    Returns a summary dict; nothing is written when dry_run is True.
+    """
+    started = time.perf_counter()
+    requests = _pending_requests(company, route_date)
+    collectors = _available_collectors(company, route_date, supervisor)
+    summary = {'route_date': str(route_date), 'routes': [], 'unassigned': []}
+    if not requests:
+        return summary
+
+    lats = np.array([r.location.y for _, r in requests])
+    lngs = np.array([r.location.x for _, r in requests])
+    loads = np.array([request_litres(r) for _, r in requests], dtype=float)
+    slots = np.array([TIME_SLOT_RANK.get((r.pickup_time_slot or '').lower(), 1) for _, r in requests])
+
+    zones = list(Zone.objects.filter(is_active=True).defer('boundary', 'boundary_z9', 'boundary_z13'))
+    zone_idx = _zone_of_each(zones, lats, lngs)
+
+    zone_loads = {int(z): float(loads[zone_idx == z].sum()) for z in np.unique(zone_idx) if z >= 0}
+    allocation = allocate_vehicles(zone_loads, [vehicle_capacity(c) for c in collectors])
+
+    # Hand collectors to zones, preferring the zone they are assigned to by name/code
+    pool = sorted(collectors, key=vehicle_capacity, reverse=True)
+    fleet = {z: [] for z in allocation}
+    for z, count in allocation.items():
+        names = {zones[z].name.lower(), zones[z].zone_code.lower()}
+        for collector in [c for c in pool if (c.assigned_area_zone or '').strip().lower() in names]:
+            if len(fleet[z]) < count:
+                fleet[z].append(collector)
+                pool.remove(collector)
+    for z, count in sorted(allocation.items(), key=lambda item: zone_loads[item[0]], reverse=True):
+        while len(fleet[z]) < count and pool:
+            fleet[z].append(pool.pop(0))
+
+    plans = []
+    for z, members in fleet.items():
+        idx = np.flatnonzero(zone_idx == z)
+        center = zones[z].center_point
+        origin = (center.y, center.x) if center else (lats[idx].mean(), lngs[idx].mean())
+        sectors, _ = sweep_partition(
+            lats[idx], lngs[idx], loads[idx], origin, [vehicle_capacity(c) for c in members]
+        )
+        for collector, sector in zip(members, sectors):
+            if len(sector):
+                plans.append((zones[z], collector, idx[sector], origin))
+
+    cost = travel_matrix.time_matrix if travel_matrix.is_enabled() else None
+    routes, stops, assigned = [], [], {'ondemand_request': [], 'scheduled_request': []}
+    now = timezone.now()
+    for position, (zone, collector, members, origin) in enumerate(plans):
+        remaining = max(time_budget - (time.perf_counter() - started), 0.0)
+        ordered, distance_km, travel_minutes = order_sector(
+            lats[members], lngs[members], slots[members], origin,
+            engine=engine, time_budget=remaining / (len(plans) - position), cost=cost,
+        )
+        if travel_minutes is None:
+            travel_minutes = distance_km / AVERAGE_SPEED_KMH * 60
+        route = Route(
+            company=company,
+            zone=zone,
+            supervisor=collector.supervisor or supervisor,
+            collector=collector,
+            route_date=route_date,
+            status='assigned',
+            stops_count=len(members),
+            total_distance_km=round(distance_km, 3),
+        )
+        stop_minutes = 0
+        for order, i in enumerate(members[ordered], start=1):
+            link, request = requests[i]
+            minutes = estimate_stop_minutes(request)
+            stop_minutes += minutes
+            stops.append(RouteStop(
+                route=route,
+                location=request.location,
+                order=order,
+                expected_minutes=minutes,
+                status='pending',
+                **{link: request},
+            ))
+            request.collector = collector
+            request.request_status = 'assigned'
+            request.accepted_at = now
+            assigned[link].append(request)
+        route.estimated_duration = timedelta(minutes=travel_minutes + stop_minutes)
+        routes.append(route)
+        summary['routes'].append({
+            'collector': collector.pk,
+            'zone': zone.pk,
+            'stops': len(members),
+            'litres': float(loads[members].sum()),
+            'total_distance_km': round(distance_km, 3),
+        })
+
+    # Whatever no route took: outside every zone, zones without vehicles, sectors over capacity
+    placed = np.zeros(len(requests), dtype=bool)
+    for _, _, members, _ in plans:
+        placed[members] = True
+    summary['unassigned'] = [
+        {'type': requests[i][0], 'id': requests[i][1].pk} for i in np.flatnonzero(~placed).tolist()
+    ]
+    if dry_run or not routes:
+        return summary
+
+    with transaction.atomic():
+        # bulk_create skips Route.save(), so metrics computed above are kept as-is
+        Route.objects.bulk_create(routes)
+        RouteStop.objects.bulk_create(stops, batch_size=1000)
+        # bulk_update skips auto_now, and none of these writes send signals
+        fields = ['collector', 'request_status', 'accepted_at', 'updated_at']
+        for link, model in (('ondemand_request', OnDemandRequest), ('scheduled_request', ScheduledRequest)):
+            for request in assigned[link]:
+                request.updated_at = now
+            model.objects.bulk_update(assigned[link], fields, batch_size=1000)
+            record_changes(link, [(r.pk, r.collector_id) for r in assigned[link]])
+        record_changes('route', [(r.pk, r.collector_id) for r in routes])
+        record_changes('route_stop', [(s.pk, s.route.collector_id) for s in stops])
+
+    for entry, route in zip(summary['routes'], routes):
+        entry['route_id'] = route.pk
+    return summary
@@ -0,0 +1,24 @@
+from rest_framework.renderers import BaseRenderer
+
+try:
+    import msgpack
+except ImportError:  # optional: `pip install msgpack` to serve application/msgpack
+    msgpack = None
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Renders responses as MessagePack (request with Accept: application/msgpack or ?format=msgpack)."""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, use_bin_type=True)
+
+
+def available_binary_renderers():
+    """MessagePackRenderer when msgpack is installed, otherwise nothing."""
+    return [MessagePackRenderer] if msgpack is not None else []
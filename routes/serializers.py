@@ -1,8 +1,10 @@
 from rest_framework import serializers
+from django.db.models import Prefetch
 from django.contrib.gis.geos import Point
 from django.contrib.gis.geos import Point
 from client.models import Client
-from .models import Route, RouteStop
+from collection_management.serializers import CollectionRecordCreateSerializer
+from .models import Route, RouteDeviation, RouteStop
 from on_demand.serializers import OnDemandRequestDetailSerializer
 from scheduled_request.serializers import ScheduledRequestDetailSerializer
 
@@ -50,12 +52,22 @@ class RouteStopSerializer(serializers.ModelSerializer):
         return obj.status  # fallback to stop status
 
     def get_client_name(self, obj):
-        if obj.ondemand_request and obj.ondemand_request.client:
-            return obj.ondemand_request.client.full_name
-        elif obj.scheduled_request and obj.scheduled_request.client:
-            return obj.scheduled_request.client.full_name
+        request = obj.ondemand_request or obj.scheduled_request
+        if request and request.client:
+            return f"{request.client.first_name or ''} {request.client.last_name or ''}".strip()
         return None
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Join everything the nested request serializers read, so each stop costs no extra query."""
+        return queryset.select_related(
+            'ondemand_request__client__user',
+            'ondemand_request__collector__user',
+            'scheduled_request__client',
+            'scheduled_request__collector',
+            'scheduled_request__company',
+        )
+
 
 class RouteSerializer(serializers.ModelSerializer):
     stops = RouteStopSerializer(many=True, read_only=True)
@@ -92,15 +104,117 @@ class RouteSerializer(serializers.ModelSerializer):
             "stops",
         ]
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Load routes with their stops and linked requests in a constant number
+        of queries, whatever the page size. Stop counts are the route's
+        maintained counters (routes.metrics), so they cost nothing.
+        """
+        stops = RouteStopSerializer.setup_eager_loading(RouteStop.objects.order_by('order'))
+        return queryset.select_related('collector', 'supervisor').prefetch_related(
+            Prefetch('stops', queryset=stops)
+        )
+
     def get_total_stops(self, obj):
-        return obj.stops.count()
+        return obj.stops_count
 
     def get_completed_stops(self, obj):
-        return obj.stops.filter(status="completed").count()
+        return obj.completed_stops_count
 
     def get_collector_name(self, obj):
         return obj.collector.full_name if obj.collector else None
 
     def get_supervisor_name(self, obj):
-        return obj.supervisor.user.get_full_name() if obj.supervisor else None
+        if not obj.supervisor:
+            return None
+        return f"{obj.supervisor.first_name or ''} {obj.supervisor.last_name or ''}".strip()
+
+
+
+class RouteStopBulkItemSerializer(serializers.Serializer):
+    stop_id = serializers.IntegerField()
+    expected_minutes = serializers.IntegerField(min_value=1, required=False)
+    status = serializers.ChoiceField(choices=RouteStop.STATUS_CHOICES, required=False)
+    notes = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+
+class RouteStopBulkEditSerializer(serializers.Serializer):
+    """Bulk reorder / patch of a route's stops, applied with routes.batch_edit."""
+    route = serializers.PrimaryKeyRelatedField(queryset=Route.objects.all())
+    order = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        help_text="Every stop_id of the route in the new visiting order"
+    )
+    stops = RouteStopBulkItemSerializer(many=True, required=False)
+
+    def validate(self, data):
+        if not data.get('order') and not data.get('stops'):
+            raise serializers.ValidationError("Provide 'order' and/or 'stops'.")
+        return data
+
+
+class RouteSyncSerializer(RouteSerializer):
+    """A route without its nested stops; devices receive stops as separate sync rows."""
+    stops = None
 
+    class Meta(RouteSerializer.Meta):
+        fields = [f for f in RouteSerializer.Meta.fields if f != "stops"]
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('collector', 'supervisor')
+
+
+class RouteStopSyncSerializer(serializers.ModelSerializer):
+    """Flat stop row for delta sync: related requests are referenced by id."""
+    latitude = serializers.SerializerMethodField()
+    longitude = serializers.SerializerMethodField()
+
+    class Meta:
+        model = RouteStop
+        fields = [
+            "stop_id",
+            "route",
+            "order",
+            "latitude",
+            "longitude",
+            "expected_minutes",
+            "actual_start",
+            "actual_end",
+            "status",
+            "notes",
+            "ondemand_request",
+            "scheduled_request",
+            "updated_at",
+        ]
+
+    def get_latitude(self, obj):
+        return obj.location.y if obj.location else None
+
+    def get_longitude(self, obj):
+        return obj.location.x if obj.location else None
+
+
+class StopCompletionSerializer(CollectionRecordCreateSerializer):
+    """One completion queued on a collector's device (photos are uploaded separately)."""
+    idempotency_key = serializers.CharField(max_length=64)
+    stop_id = serializers.IntegerField()
+    started_at = serializers.DateTimeField(required=False, allow_null=True)
+    completed_at = serializers.DateTimeField(help_text="Device time the stop was completed")
+
+    class Meta(CollectionRecordCreateSerializer.Meta):
+        fields = ["idempotency_key", "stop_id", "started_at", "completed_at"] + [
+            f for f in CollectionRecordCreateSerializer.Meta.fields if not f.startswith("photo_")
+        ]
+
+
+class StopCompletionBatchSerializer(serializers.Serializer):
+    completions = StopCompletionSerializer(many=True, allow_empty=False, max_length=500)
+
+
+class RouteDeviationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RouteDeviation
+        fields = '__all__'
@@ -1,61 +1,240 @@
-from django.contrib.gis.measure import D
-from django.contrib.gis.db.models.functions import Distance
-from .models import Route, RouteStop
-from client.models import Client
+from contextlib import ExitStack
 
-def auto_generate_stops(route):
+from django.db import transaction
+from django.utils import timezone
+
+from .batch import batch_edit
+from .metrics import reconcile_route
+from . import travel_matrix
+from .models import RouteStop
+from .optimizer import DEFAULT_ENGINE, DEFAULT_TIME_BUDGET, haversine_matrix, optimize_order
+from .sync import record_changes
+from collection_management.models import CollectionRecord
+from on_demand.models import OnDemandRequest
+from scheduled_request.models import ScheduledRequest
+
+
+def estimate_stop_minutes(request):
+    """Expected time at a stop, based on how much waste the request declares."""
+    if request.bin_size_liters and request.bin_size_liters >= 660:
+        return 10
+    if (request.bag_count or 0) > 5:
+        return 7
+    return 5
+
+
+def ordering_cost():
+    """Cost matrix builder for the optimizer: road minutes when a road graph is loaded, else km."""
+    return travel_matrix.time_matrix if travel_matrix.is_enabled() else haversine_matrix
+
+
+def auto_generate_stops(route, engine=DEFAULT_ENGINE, time_budget=DEFAULT_TIME_BUDGET):
     """
-    Auto-generates stops for a route based on clients in the zone.
-    - Finds clients within the zone boundary.
-    - Orders stops by proximity to previous stop (simple nearest-neighbor).
-    - Sets expected_minutes based on client property_type.
+    Auto-generates stops for a route based on pending requests in the zone.
+    - Finds on-demand and scheduled requests for the route date inside the zone boundary
+      that are not already on a route.
+    - Orders stops with the route optimizer (nearest-neighbour + 2-opt/Or-opt),
+      starting from the zone center, on road travel times when available.
+    - Sets expected_minutes based on the declared bin size / bag count.
     """
     if not route.zone.boundary:
         raise ValueError("Zone must have a boundary to auto-generate stops.")
 
-    # Find clients in zone (using geospatial contains)
-    clients = Client.objects.filter(
-        location__within=route.zone.boundary  # Assuming Client has PointField 'location'
-    ).annotate(
-        distance=Distance('location', route.zone.center_point)
-    ).order_by('distance')  # Rough ordering by distance from center
-
-    stops = []
-    order = 1
+    boundary = route.zone.boundary
+    ondemand = OnDemandRequest.objects.filter(
+        pickup_date=route.route_date,
+        request_status__in=['pending', 'confirmed'],
+        location__coveredby=boundary,
+        route_stops__isnull=True,
+    )
+    scheduled = ScheduledRequest.objects.filter(
+        company=route.company,
+        pickup_date=route.route_date,
+        request_status='pending',
+        location__coveredby=boundary,
+        route_stops__isnull=True,
+    )
 
-    for client in clients:
-        # Calculate expected time based on property_type (customize as needed)
-        if client.property_type == 'residential':
-            expected_minutes = 5
-        elif client.property_type == 'commercial':
-            expected_minutes = 10
-        else:
-            expected_minutes = 7
+    requests = [('ondemand_request', r) for r in ondemand] + [('scheduled_request', r) for r in scheduled]
+    if not requests:
+        return []
 
+    center = route.zone.center_point
+    order = optimize_order(
+        [r.location.y for _, r in requests],
+        [r.location.x for _, r in requests],
+        start=(center.y, center.x) if center else None,
+        engine=engine,
+        time_budget=time_budget,
+        cost=ordering_cost(),
+    )
 
     stops = []
-    order = 1
-    for client in clients:
-        stop = RouteStop(
+    for position, idx in enumerate(order, start=1):
+        link, request = requests[idx]
+        stops.append(RouteStop(
             route=route,
-            client=client,
-            location=client.location,
-            order=order,
-            expected_minutes=expected_minutes,
-            status='pending'
-        )
-        stops.append(stop)
-        order += 1
-    
+            location=request.location,
+            order=position,
+            expected_minutes=estimate_stop_minutes(request),
+            status='pending',
+            **{link: request},
+        ))
+
     # Bulk create all stops at once (no signal here!)
     RouteStop.objects.bulk_create(stops)
-    
+    record_changes('route_stop', [(stop.pk, route.collector_id) for stop in stops])
+
     # ✅ NOW update metrics ONCE after all stops exist
-    route.update_distance_and_duration()
-    route.update_completion_status()
-    route.save(update_fields=[
-        'total_distance_km', 
-        'estimated_duration', 
-        'completion_percent', 
-        'status'
-    ])
\ No newline at end of file
+    reconcile_route(route)
+    return stops
+
+
+def optimize_route(route, engine=DEFAULT_ENGINE, time_budget=DEFAULT_TIME_BUDGET):
+    """
+    Re-orders the existing stops of a route with the route optimizer and
+    writes every RouteStop.order in a single bulk update.
+    """
+    stops = list(route.stops.select_related('ondemand_request', 'scheduled_request').order_by('order'))
+    located = [s for s in stops if s.effective_location]
+    if len(located) < 2:
+        return stops
+
+    center = route.zone.center_point
+    order = optimize_order(
+        [s.effective_location.y for s in located],
+        [s.effective_location.x for s in located],
+        start=(center.y, center.x) if center else None,
+        engine=engine,
+        time_budget=time_budget,
+        cost=ordering_cost(),
+    )
+
+    # Stops without a location keep their relative order at the end of the route
+    ordered = [located[idx] for idx in order] + [s for s in stops if not s.effective_location]
+
+    # unique_stop_order_per_route is deferred, so the permutation is valid at commit
+    with batch_edit(route) as batch:
+        batch.reorder([stop.pk for stop in ordered])
+    return ordered
+
+
+# Collector input copied from a completion onto its CollectionRecord
+COMPLETION_RECORD_FIELDS = [
+    'payment_method', 'amount_paid', 'bag_count', 'bin_size_liters',
+    'estimated_volume_liters', 'waste_type', 'latitude', 'longitude', 'notes',
+]
+
+
+def complete_stops(collector, completions):
+    """
+    Apply completions queued offline by a collector's device, all in one transaction.
+    - Each completion carries an idempotency key: a key that was already applied
+      is reported as 'duplicate' and changes nothing, so uploads can be retried,
+      also concurrently (the stops and their records are locked first).
+    - Device timestamps become the stop's actual_start / actual_end and the
+      record's collection times (clamped to the server clock).
+    - Stops are written with one bulk update per route, CollectionRecords with
+      one bulk create / update, and every affected route is recomputed once.
+    Returns (results in input order, affected routes).
+    """
+    now = timezone.now()
+    unique = {}
+    for item in completions:
+        unique.setdefault(item['idempotency_key'], item)
+
+    results = {}
+    with transaction.atomic():
+        # Lock the stops before looking at keys: a concurrent upload touching
+        # the same stops (a retry, or another key for the same stop) waits
+        # here and then sees this one's records as duplicate / conflict.
+        stops = {
+            stop.pk: stop for stop in RouteStop.objects.select_related(
+                'route', 'ondemand_request', 'scheduled_request'
+            ).select_for_update(of=('self',)).filter(
+                pk__in=[item['stop_id'] for item in unique.values()], route__collector=collector
+            ).order_by('pk')
+        }
+        records = {
+            r.route_stop_id: r
+            for r in CollectionRecord.objects.select_for_update().filter(route_stop_id__in=list(stops))
+        }
+
+        applied = CollectionRecord.objects.filter(idempotency_key__in=list(unique)).values_list(
+            'idempotency_key', 'collection_id', 'route_stop_id'
+        )
+        for key, collection_id, stop_id in applied:
+            results[key] = {'status': 'duplicate', 'collection_id': collection_id, 'stop_id': stop_id}
+        pending = [item for key, item in unique.items() if key not in results]
+
+        created, updated, by_route = [], [], {}
+        for item in pending:
+            key = item['idempotency_key']
+            stop = stops.get(item['stop_id'])
+            if stop is None:
+                results[key] = {'status': 'not_found', 'stop_id': item['stop_id']}
+                continue
+            request = stop.ondemand_request or stop.scheduled_request
+            if request is None:
+                results[key] = {'status': 'rejected', 'stop_id': stop.pk, 'detail': "Stop has no linked request."}
+                continue
+            record = records.get(stop.pk)
+            if record is not None and record.idempotency_key:
+                # Completed from another upload; keep the first one
+                # `record` may be an earlier key's in this batch, so its pk is read after the write
+                results[key] = {'status': 'conflict', 'stop_id': stop.pk, 'record': record}
+                continue
+
+            end = min(item['completed_at'], now)
+            start = item.get('started_at') or stop.actual_start or end
+            start = min(start, end)
+            if record is None:
+                record = CollectionRecord(
+                    client=request.client,
+                    collector=collector,
+                    route=stop.route,
+                    route_stop=stop,
+                    collection_type="on_demand" if stop.ondemand_request else "scheduled",
+                    scheduled_date=stop.route.route_date,
+                )
+                created.append(record)
+            else:
+                updated.append(record)
+            for field in COMPLETION_RECORD_FIELDS:
+                if field in item:
+                    setattr(record, field, item[field])
+            # Mirrors CollectionRecord.save(), which bulk writes skip
+            record.idempotency_key = key
+            record.status = "completed"
+            record.collection_start = start
+            record.collection_end = end
+            record.collected_at = end
+            record.duration_minutes = int((end - start).total_seconds() / 60)
+            record.updated_at = now
+            records[stop.pk] = record
+            by_route.setdefault(stop.route_id, (stop.route, []))[1].append((stop.pk, start, end))
+            results[key] = {'status': 'completed', 'stop_id': stop.pk, 'record': record}
+
+        # One batch per route: bulk stop update and a single recompute when the stack unwinds
+        with ExitStack() as stack:
+            for route, entries in by_route.values():
+                batch = stack.enter_context(batch_edit(route))
+                for stop_id, start, end in entries:
+                    batch.update(stop_id, status="completed", actual_start=start, actual_end=end)
+            CollectionRecord.objects.bulk_create(created, batch_size=500)
+            CollectionRecord.objects.bulk_update(
+                updated,
+                COMPLETION_RECORD_FIELDS + [
+                    'idempotency_key', 'status', 'collection_start', 'collection_end',
+                    'collected_at', 'duration_minutes', 'updated_at',
+                ],
+                batch_size=500,
+            )
+
+    for result in results.values():
+        record = result.pop('record', None)
+        if record is not None:
+            result['collection_id'] = record.pk
+    ordered = [dict(results[item['idempotency_key']], idempotency_key=item['idempotency_key'])
+               for item in completions]
+    return ordered, [route for route, _ in by_route.values()]
@@ -0,0 +1,73 @@
+"""
+Compact route sheet for the collectors' mobile app.
+
+A sheet is columnar: one array per field, indexed by stop position, so
+the payload carries each key once instead of once per stop:
+
+    {"route_id": 12, "route_date": "2026-10-16", "status": "assigned",
+     "stops": {"stop_id": [...], "order": [...], "lat": [...], "lng": [...],
+               "expected_minutes": [...], "status": [...], "label": [...]}}
+
+The ETag is a hash of the sheet itself, so it changes exactly when
+something the phone shows has changed.
+"""
+import hashlib
+import json
+
+
+SHEET_COLUMNS = ('stop_id', 'order', 'lat', 'lng', 'expected_minutes', 'status', 'label')
+COORDINATE_DECIMALS = 6  # ~0.1 m
+
+
+def client_label(first_name, last_name):
+    """Short label for a client, e.g. 'Kofi B.'."""
+    first_name = (first_name or '').strip()
+    last_name = (last_name or '').strip()
+    if first_name and last_name:
+        return f"{first_name} {last_name[0]}."
+    return first_name or last_name
+
+
+def build_route_sheet(route):
+    """Columnar sheet of a route's stops, read in a single query."""
+    rows = route.stops.order_by('order').values_list(
+        'stop_id', 'order', 'location', 'expected_minutes', 'status',
+        'ondemand_request__location', 'ondemand_request__request_status',
+        'ondemand_request__client__first_name', 'ondemand_request__client__last_name',
+        'scheduled_request__location', 'scheduled_request__request_status',
+        'scheduled_request__client__first_name', 'scheduled_request__client__last_name',
+    )
+    columns = {name: [] for name in SHEET_COLUMNS}
+    for (stop_id, order, location, minutes, stop_status,
+         od_location, od_status, od_first, od_last,
+         sr_location, sr_status, sr_first, sr_last) in rows:
+        point = od_location or sr_location or location
+        completed = 'completed' in (od_status, sr_status)
+        columns['stop_id'].append(stop_id)
+        columns['order'].append(order)
+        columns['lat'].append(round(point.y, COORDINATE_DECIMALS) if point else None)
+        columns['lng'].append(round(point.x, COORDINATE_DECIMALS) if point else None)
+        columns['expected_minutes'].append(minutes)
+        columns['status'].append('completed' if completed else stop_status)
+        columns['label'].append(client_label(od_first, od_last) or client_label(sr_first, sr_last))
+
+    return {
+        'route_id': route.pk,
+        'route_date': route.route_date.isoformat(),
+        'status': route.status,
+        'stops': columns,
+    }
+
+
+def sheet_etag(sheet, variant=''):
+    """Strong ETag for a sheet; `variant` separates representations (json / msgpack)."""
+    payload = json.dumps(sheet, sort_keys=True, separators=(',', ':'))
+    return '"%s"' % hashlib.sha1(f"{variant}:{payload}".encode()).hexdigest()
+
+
+def etag_matches(if_none_match, etag):
+    """True when an If-None-Match header value covers `etag`."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in candidates or any(tag.removeprefix('W/') == etag for tag in candidates)
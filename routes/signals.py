@@ -1,16 +1,139 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from .models import RouteStop, Route
+from . import geofence, metrics
+from .batch import is_suppressed
+from .sync import record_changes
+from collector.telemetry import LocationStore, pings_received
+from on_demand.models import OnDemandRequest
+from scheduled_request.models import ScheduledRequest
+
 
 @receiver(post_save, sender=RouteStop)
 def update_route_on_stop_change(sender, instance, created, **kwargs):
-    # Skip if this is part of bulk creation
+    # Skip fixture loading
+    if kwargs.get('raw', False):
+        return
+
+    # batch_edit() recomputes the route once when it exits
+    if instance.route_id and not is_suppressed(instance.route_id):
+        # Adjust the route by delta instead of reloading every stop
+        metrics.apply_stop_saved(instance, created)
+
+
+@receiver(post_delete, sender=RouteStop)
+def update_route_on_stop_delete(sender, instance, **kwargs):
+    # The whole route is being deleted; nothing left to update
+    if isinstance(kwargs.get('origin'), Route):
+        return
+    if instance.route_id and not is_suppressed(instance.route_id):
+        metrics.apply_stop_deleted(instance)
+
+
+@receiver(pre_save, sender=OnDemandRequest)
+@receiver(pre_save, sender=ScheduledRequest)
+def remember_request_status(sender, instance, **kwargs):
+    if kwargs.get('raw', False) or instance.pk is None:
+        instance._previous_request_status = None
+        instance._previous_collector_id = None
+        return
+    previous = sender.objects.filter(pk=instance.pk).values_list('request_status', 'collector_id').first()
+    instance._previous_request_status, instance._previous_collector_id = previous or (None, None)
+
+
+@receiver(post_save, sender=OnDemandRequest)
+@receiver(post_save, sender=ScheduledRequest)
+def update_routes_on_request_completion(sender, instance, created, **kwargs):
+    if kwargs.get('raw', False) or created:
+        return
+    was_completed = getattr(instance, '_previous_request_status', None) == 'completed'
+    is_completed = instance.request_status == 'completed'
+    if was_completed != is_completed:
+        link = 'ondemand_request' if sender is OnDemandRequest else 'scheduled_request'
+        metrics.apply_request_completion(link, instance.pk, is_completed)
+
+
+# ---------------------------
+# Delta sync change log (routes.sync)
+# ---------------------------
+
+def _collectors(instance):
+    """Devices that must hear about a change: the current collector and, if reassigned, the previous one."""
+    collector_ids = [instance.collector_id]
+    previous = getattr(instance, '_previous_collector_id', None)
+    if previous and previous != instance.collector_id:
+        collector_ids.append(previous)
+    return collector_ids
+
+
+@receiver(pre_save, sender=Route)
+def remember_route_collector(sender, instance, update_fields=None, **kwargs):
+    instance._previous_collector_id = None
+    if kwargs.get('raw', False) or instance.pk is None:
+        return
+    if update_fields is not None and 'collector' not in update_fields:
+        return
+    instance._previous_collector_id = (
+        sender.objects.filter(pk=instance.pk).values_list('collector_id', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Route)
+@receiver(post_save, sender=OnDemandRequest)
+@receiver(post_save, sender=ScheduledRequest)
+def log_change(sender, instance, **kwargs):
     if kwargs.get('raw', False):
         return
-    
-    if instance.route:
-        route = instance.route
-        route.update_completion_status()
-        route.update_distance_and_duration()
-        # Use update_fields to avoid re-triggering the full save logic
-        route.save(update_fields=['total_distance_km', 'estimated_duration', 'completion_percent', 'status'])
\ No newline at end of file
+    entity = SYNC_ENTITIES[sender]
+    record_changes(entity, [(instance.pk, c) for c in _collectors(instance)])
+
+
+@receiver(post_delete, sender=Route)
+@receiver(post_delete, sender=OnDemandRequest)
+@receiver(post_delete, sender=ScheduledRequest)
+def log_delete(sender, instance, **kwargs):
+    record_changes(SYNC_ENTITIES[sender], [(instance.pk, instance.collector_id)], action='delete')
+
+
+@receiver(post_save, sender=RouteStop)
+def log_stop_change(sender, instance, **kwargs):
+    if kwargs.get('raw', False):
+        return
+    record_changes('route_stop', [(instance.pk, _route_collector(instance))])
+
+
+@receiver(post_delete, sender=RouteStop)
+def log_stop_delete(sender, instance, **kwargs):
+    origin = kwargs.get('origin')
+    collector_id = origin.collector_id if isinstance(origin, Route) else _route_collector(instance)
+    record_changes('route_stop', [(instance.pk, collector_id)], action='delete')
+
+
+@receiver(pings_received, sender=LocationStore)
+def evaluate_geofence(sender, collector_id, pings, **kwargs):
+    geofence.evaluate(collector_id, pings)
+
+
+@receiver(post_save, sender=Route)
+@receiver(post_delete, sender=Route)
+def drop_route_fence(sender, instance, **kwargs):
+    geofence.invalidate(collector_id=instance.collector_id, route_id=instance.pk)
+
+
+@receiver(post_save, sender=RouteStop)
+@receiver(post_delete, sender=RouteStop)
+def drop_stop_fence(sender, instance, **kwargs):
+    geofence.invalidate(route_id=instance.route_id)
+
+
+def _route_collector(stop):
+    if 'route' in stop._state.fields_cache:
+        return stop.route.collector_id
+    return Route.objects.filter(pk=stop.route_id).values_list('collector_id', flat=True).first()
+
+
+SYNC_ENTITIES = {
+    Route: 'route',
+    OnDemandRequest: 'ondemand_request',
+    ScheduledRequest: 'scheduled_request',
+}
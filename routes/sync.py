@@ -0,0 +1,182 @@
+"""
+Delta sync for collectors' devices.
+
+Every write to a Route, RouteStop, OnDemandRequest or ScheduledRequest
+appends a ChangeLog row: the signals in routes.signals cover single saves
+and deletes, and bulk writes call record_changes() themselves. A device
+polls with the id of the last entry it saw (its cursor) and receives only
+the rows changed since then, so a poll costs one index range scan on
+(collector_id, id) plus one query per entity type that actually changed.
+
+Log rows are inserted when the transaction commits, so ids follow commit
+order; entries younger than SETTLE_SECONDS are held back so a concurrent
+commit that drew a lower id cannot land behind a cursor already handed out.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from on_demand.models import OnDemandRequest
+from on_demand.serializers import OnDemandRequestDetailSerializer
+from scheduled_request.models import ScheduledRequest
+from scheduled_request.serializers import ScheduledRequestDetailSerializer
+from .models import ChangeLog, Route, RouteStop
+from .serializers import RouteStopSyncSerializer, RouteSyncSerializer
+
+
+SYNC_PAGE_SIZE = 500
+SETTLE_SECONDS = 2
+
+# entity -> (queryset, serializer, lookup of the collector whose device holds the row)
+ENTITIES = {
+    'route': (
+        lambda: RouteSyncSerializer.setup_eager_loading(Route.objects.all()),
+        RouteSyncSerializer,
+        'collector_id',
+    ),
+    'route_stop': (
+        lambda: RouteStop.objects.select_related('route'),
+        RouteStopSyncSerializer,
+        'route__collector_id',
+    ),
+    'ondemand_request': (
+        lambda: OnDemandRequest.objects.select_related('client__user', 'collector__user'),
+        OnDemandRequestDetailSerializer,
+        'collector_id',
+    ),
+    'scheduled_request': (
+        lambda: ScheduledRequest.objects.select_related('client', 'collector', 'company'),
+        ScheduledRequestDetailSerializer,
+        'collector_id',
+    ),
+}
+
+
+class CursorExpired(Exception):
+    """The cursor points at log entries that were already pruned; the device must resync."""
+
+
+def record_changes(entity, rows, action='upsert'):
+    """
+    Log changes to `entity` for delta sync. `rows` are (object_id, collector_id)
+    pairs; the entries are written once the current transaction commits.
+    """
+    entries = [
+        ChangeLog(entity=entity, object_id=object_id, collector_id=collector_id, action=action)
+        for object_id, collector_id in rows
+    ]
+    if entries:
+        transaction.on_commit(lambda: ChangeLog.objects.bulk_create(entries, batch_size=1000))
+
+
+def _settled_log():
+    return ChangeLog.objects.filter(changed_at__lte=timezone.now() - timedelta(seconds=SETTLE_SECONDS))
+
+
+def current_cursor():
+    """Cursor that covers every settled change so far."""
+    return _settled_log().aggregate(latest=Max('id'))['latest'] or 0
+
+
+def _rows(entity, ids, collector_ids):
+    """Serialized rows of `entity`, and the ids that are gone or no longer on these devices."""
+    queryset, serializer_class, collector_lookup = ENTITIES[entity]
+    queryset = queryset().filter(pk__in=ids)
+    if collector_ids is not None:
+        queryset = queryset.filter(**{f'{collector_lookup}__in': collector_ids})
+    objects = list(queryset)
+    present = {obj.pk for obj in objects}
+    return serializer_class(objects, many=True).data, sorted(set(ids) - present)
+
+
+def changes_since(cursor, collector_ids=None, limit=SYNC_PAGE_SIZE):
+    """
+    Rows changed after `cursor`, for the devices of `collector_ids` (None = all).
+    Returns {'cursor', 'has_more', '<entity>s': [rows], 'deleted': {entity: [ids]}}.
+    """
+    if cursor:
+        # prune() always keeps the newest entry, so an empty log means the
+        # cursor's entries were removed some other way (e.g. a truncate)
+        oldest = ChangeLog.objects.aggregate(oldest=Min('id'))['oldest']
+        if oldest is None or oldest > cursor + 1:
+            raise CursorExpired(cursor)
+
+    # Taken first: a page that reaches the end of the log advances the cursor
+    # to here even when none of the entries up to it are for these devices
+    settled = current_cursor()
+    log = _settled_log().filter(id__gt=cursor, id__lte=settled)
+    if collector_ids is not None:
+        log = log.filter(collector_id__in=collector_ids)
+    entries = list(log.order_by('id').values_list('id', 'entity', 'object_id', 'action')[:limit + 1])
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    # Only the latest action per row matters
+    latest = {}
+    for _, entity, object_id, action in entries:
+        latest[(entity, object_id)] = action
+
+    result = {
+        'cursor': entries[-1][0] if has_more else max(settled, cursor),
+        'has_more': has_more,
+        'deleted': {},
+    }
+    for entity in ENTITIES:
+        upserts = [oid for (e, oid), action in latest.items() if e == entity and action == 'upsert']
+        deleted = [oid for (e, oid), action in latest.items() if e == entity and action == 'delete']
+        rows, missing = _rows(entity, upserts, collector_ids) if upserts else ([], [])
+        result[f'{entity}s'] = rows
+        if deleted or missing:
+            result['deleted'][entity] = sorted(set(deleted) | set(missing))
+    return result
+
+
+def snapshot(collector_ids=None, since_date=None):
+    """
+    Full state for a device that has no cursor yet: routes from `since_date`
+    (default today), their stops and linked requests, plus the cursor to poll from.
+    """
+    cursor = current_cursor()
+    routes = Route.objects.filter(route_date__gte=since_date or timezone.now().date())
+    if collector_ids is not None:
+        routes = routes.filter(collector_id__in=collector_ids)
+    route_ids = list(routes.values_list('pk', flat=True))
+    stops = list(RouteStop.objects.filter(route_id__in=route_ids).values_list(
+        'pk', 'ondemand_request_id', 'scheduled_request_id'
+    ))
+
+    # Requests on those routes, plus requests handed to the collectors directly
+    requests = {'ondemand_request': {od for _, od, _ in stops if od},
+                'scheduled_request': {sr for _, _, sr in stops if sr}}
+    for entity, model in (('ondemand_request', OnDemandRequest), ('scheduled_request', ScheduledRequest)):
+        assigned = model.objects.filter(pickup_date__gte=since_date or timezone.now().date())
+        if collector_ids is not None:
+            assigned = assigned.filter(collector_id__in=collector_ids)
+        else:
+            assigned = assigned.filter(collector__isnull=False)
+        requests[entity].update(assigned.values_list('pk', flat=True))
+
+    result = {'cursor': cursor, 'has_more': False, 'deleted': {}}
+    for entity, ids in (
+        ('route', route_ids),
+        ('route_stop', [pk for pk, _, _ in stops]),
+        ('ondemand_request', sorted(requests['ondemand_request'])),
+        ('scheduled_request', sorted(requests['scheduled_request'])),
+    ):
+        result[f'{entity}s'] = _rows(entity, ids, None)[0] if ids else []
+    return result
+
+
+def prune(older_than):
+    """
+    Delete log entries older than `older_than` (a timedelta). Devices behind them must resync.
+    The newest entry is always kept: its id is the watermark changes_since() compares
+    cursors with, so a device that was up to date before the prune is not sent to resync.
+    """
+    newest = ChangeLog.objects.aggregate(newest=Max('id'))['newest']
+    deleted, _ = (
+        ChangeLog.objects.filter(changed_at__lt=timezone.now() - older_than).exclude(id=newest).delete()
+    )
+    return deleted
@@ -1,3 +1,379 @@
-from django.test import TestCase
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+
+from django.contrib.auth import get_user_model
+from django.contrib.gis.geos import Point, Polygon
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from client.models import Client
+from collection_management.models import CollectionRecord
+from collector.models import Collector
+from on_demand.models import OnDemandRequest
+from scheduled_request.models import ScheduledRequest
+from supervisor.models import Supervisor
+from waste_management_company.models import Company
+from zones.models import Zone
+from .deviation import _clean
+from .geofence import METRES_PER_DEGREE, RouteFence
+from .metrics import reconcile_route
+from .models import ChangeLog, Route, RouteStop
+from .optimizer import (
+    _two_opt_pass, haversine_km, haversine_matrix, nearest_neighbour, optimize_order, path_length, two_opt,
+)
+from .sync import prune
+
+User = get_user_model()
+
+
+class RouteTestCase(TestCase):
+    """A company with a zone, a supervisor, a client and four collectors; add_routes() fills in routes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        company_user = User.objects.create(username='CMP0001', phone_number='0200000001', role='company')
+        cls.company = Company.objects.create(
+            user=company_user, company_name='Test Co', gst_number='GST-1', weighing_system='scale',
+            complaint_resolution_sla=24, opening_time=time(6), closing_time=time(18),
+        )
+        cls.zone = Zone.objects.create(
+            zone_code='ACC-TST-01', name='Test', city='Accra',
+            boundary=Polygon.from_bbox((-0.25, 5.55, -0.15, 5.65)),
+        )
+        cls.supervisor = Supervisor.objects.create(
+            user=User.objects.create(username='SUP0001', phone_number='0200000002', role='supervisor'),
+            first_name='Ama', last_name='Mensah', company_username='CMP0001',
+        )
+        cls.client_profile = Client.objects.create(
+            user=User.objects.create(username='CLT0001', phone_number='0200000003', role='client'),
+            first_name='Kofi', last_name='Boateng',
+        )
+        cls.collectors = [
+            Collector.objects.create(
+                user=User.objects.create(username=f'COL{i:04d}', phone_number=f'021000{i:04d}', role='collector'),
+                first_name='Collector', last_name=str(i), company=cls.company, supervisor=cls.supervisor,
+                vehicle_number=f'GR-{i}', vehicle_type='truck', assigned_area_zone='Test',
+                daily_wage_or_incentive_rate=50,
+            )
+            for i in range(1, 5)
+        ]
+        cls.next_day = 0
+
+    def add_routes(self, count, stops_per_route):
+        routes = []
+        for _ in range(count):
+            collector = self.collectors[self.next_day % len(self.collectors)]
+            route = Route.objects.create(
+                company=self.company, zone=self.zone, supervisor=self.supervisor, collector=collector,
+                route_date=date(2026, 1, 1) + timedelta(days=self.next_day),
+            )
+            self.next_day += 1
+            stops = []
+            for order in range(1, stops_per_route + 1):
+                location = Point(-0.2 + order * 0.001, 5.6)
+                if order % 2:
+                    request = OnDemandRequest.objects.create(
+                        client=self.client_profile, collector=collector, pickup_date=route.route_date,
+                        pickup_time_slot='morning', address_line1='1 Test St', area_zone='Test',
+                        city='Accra', waste_type='mixed', bag_count=2, location=location,
+                    )
+                    link = {'ondemand_request': request}
+                else:
+                    request = ScheduledRequest.objects.create(
+                        client=self.client_profile, company=self.company, collector=collector,
+                        pickup_date=route.route_date, pickup_time_slot='morning',
+                        address_line1='1 Test St', city='Accra', area_zone='Test',
+                        waste_type='household', bin_size_liters=240, location=location,
+                    )
+                    link = {'scheduled_request': request}
+                stops.append(RouteStop(route=route, order=order, location=location, status='pending', **link))
+            RouteStop.objects.bulk_create(stops)
+            # bulk_create skips the signals that maintain the route's counters
+            reconcile_route(route)
+            routes.append(route)
+        return routes
+
+
+class RouteListQueryCountTests(RouteTestCase):
+    """The route list must not issue queries per route or per stop."""
+
+    def list_query_count(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = APIClient().get('/api/routes/', {'limit': 50})
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.json()
+
+    def test_list_query_count_is_constant(self):
+        self.add_routes(2, 3)
+        small, _ = self.list_query_count()
+
+        self.add_routes(6, 12)
+        large, body = self.list_query_count()
+
+        # pagination count, routes, prefetched stops with their requests
+        self.assertEqual(large, 3)
+        self.assertEqual(small, large)
+        self.assertEqual(body['count'], 8)
+        route = next(r for r in body['results'] if len(r['stops']) == 12)
+        self.assertEqual(route['total_stops'], 12)
+        self.assertEqual(route['completed_stops'], 0)
+        self.assertEqual(route['supervisor_name'], 'Ama Mensah')
+        self.assertEqual(route['stops'][0]['client_name'], 'Kofi Boateng')
+
+        # Counts are the maintained counters, not a recount of the stops
+        Route.objects.filter(pk=route['route_id']).update(stops_count=40, completed_stops_count=7)
+        _, body = self.list_query_count()
+        route = next(r for r in body['results'] if r['route_id'] == route['route_id'])
+        self.assertEqual((route['total_stops'], route['completed_stops']), (40, 7))
+
+
+def _fake_road_minutes(lats, lngs):
+    """Stand-in for travel_matrix.path_minutes: additive per leg, and unlike the flat-speed estimate."""
+    return sum(
+        3 * haversine_km(lats[i], lngs[i], lats[i + 1], lngs[i + 1]) + 1 for i in range(len(lats) - 1)
+    )
+
+
+class IncrementalMetricsTests(RouteTestCase):
+    """After every kind of stop change the delta-maintained metrics equal a full recompute."""
+
+    def assert_reconciled(self, route):
+        route.refresh_from_db()
+        incremental = (route.stops_count, route.completed_stops_count, route.completion_percent,
+                       float(route.total_distance_km), route.estimated_duration.total_seconds() / 60)
+        full = reconcile_route(Route.objects.get(pk=route.pk))
+        self.assertEqual(incremental[:3], (full.stops_count, full.completed_stops_count, full.completion_percent))
+        self.assertAlmostEqual(incremental[3], float(full.total_distance_km), delta=0.005)
+        self.assertAlmostEqual(incremental[4], full.estimated_duration.total_seconds() / 60, delta=0.05)
+        # Start the next step from the recomputed values so errors do not carry over
+        route.refresh_from_db()
+
+    def run_mutations(self):
+        route = self.add_routes(1, 6)[0]
+        self.assert_reconciled(route)
+        stops = {stop.order: stop for stop in route.stops.all()}
+
+        # Reorder: the second stop moves to the end
+        stops[2].order = 50
+        stops[2].save()
+        self.assert_reconciled(route)
+
+        # Insert an unlinked stop into the gap it left, and one at the end
+        RouteStop.objects.create(route=route, order=2, location=Point(-0.19, 5.61), expected_minutes=9)
+        self.assert_reconciled(route)
+        RouteStop.objects.create(route=route, order=60, location=Point(-0.21, 5.59))
+        self.assert_reconciled(route)
+
+        # Delete a middle stop, then the first one
+        stops[4].delete()
+        self.assert_reconciled(route)
+        stops[1].delete()
+        self.assert_reconciled(route)
+
+        # Complete a stop, and a request linked to another stop
+        stops[3].status = 'completed'
+        stops[3].save()
+        self.assert_reconciled(route)
+        request = stops[5].ondemand_request or stops[5].scheduled_request
+        request.request_status = 'completed'
+        request.save()
+        self.assert_reconciled(route)
+
+        # Expected minutes change without a move
+        stops[6].expected_minutes = 15
+        stops[6].save()
+        self.assert_reconciled(route)
+
+    def test_straight_line_metrics(self):
+        self.run_mutations()
+
+    def test_road_minutes_metrics(self):
+        with mock.patch('routes.travel_matrix.is_enabled', return_value=True), \
+                mock.patch('routes.travel_matrix.path_minutes', side_effect=_fake_road_minutes):
+            self.run_mutations()
+
+
+class CompleteBatchTests(RouteTestCase):
+    def setUp(self):
+        self.route = self.add_routes(1, 3)[0]
+        self.stops = list(self.route.stops.order_by('order'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.route.collector.user)
+
+    def upload(self, *items):
+        completions = [
+            {'idempotency_key': key, 'stop_id': stop_id, 'completed_at': '2026-01-01T09:00:00Z'}
+            for key, stop_id in items
+        ]
+        response = self.client.post('/api/routes/route-stops/complete-batch/', {'completions': completions},
+                                    format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_replayed_key_is_a_duplicate(self):
+        first, = self.upload(('key-1', self.stops[0].pk))
+        self.assertEqual(first['status'], 'completed')
+        again, = self.upload(('key-1', self.stops[0].pk))
+        self.assertEqual(again['status'], 'duplicate')
+        self.assertEqual(again['collection_id'], first['collection_id'])
+        self.assertEqual(CollectionRecord.objects.filter(route_stop=self.stops[0]).count(), 1)
+
+    def test_second_key_for_a_stop_conflicts(self):
+        first, second = self.upload(('key-1', self.stops[0].pk), ('key-2', self.stops[0].pk))
+        self.assertEqual(first['status'], 'completed')
+        self.assertEqual(second['status'], 'conflict')
+        self.assertIsNotNone(second['collection_id'])
+        self.assertEqual(second['collection_id'], first['collection_id'])
+
+        later, = self.upload(('key-3', self.stops[0].pk))
+        self.assertEqual((later['status'], later['collection_id']), ('conflict', first['collection_id']))
+
+    def test_unknown_stop_is_not_found(self):
+        other = self.add_routes(1, 1)[0].stops.get()  # another collector's route
+        missing = max(stop.pk for stop in self.stops) + 1000
+        results = self.upload(('key-1', missing), ('key-2', other.pk))
+        self.assertEqual([r['status'] for r in results], ['not_found', 'not_found'])
+        self.assertFalse(CollectionRecord.objects.exists())
+
+
+class OneWayMatrixTests(SimpleTestCase):
+    """2-opt must price the legs it reverses when the road times are one-way."""
+
+    # road minutes; dist[i, j] != dist[j, i]
+    DIST = np.array([
+        [0, 2, 5, 6, 4],
+        [6, 0, 7, 3, 1],
+        [2, 3, 0, 3, 8],
+        [3, 7, 5, 0, 6],
+        [9, 9, 7, 6, 0],
+    ], dtype=float)
+
+    def test_two_opt_pass_never_lengthens_the_tour(self):
+        tour = nearest_neighbour(self.DIST)
+        before = path_length(self.DIST, tour)
+        # Pricing only the two boundary legs reversed this into [0 4 2 3 1], 21 minutes
+        _two_opt_pass(self.DIST, tour, None)
+        self.assertLessEqual(path_length(self.DIST, tour), before)
+
+    def test_two_opt_improves_on_nearest_neighbour(self):
+        tour = two_opt(self.DIST)
+        self.assertEqual(path_length(self.DIST, tour), 13)
+        self.assertLess(path_length(self.DIST, tour), path_length(self.DIST, nearest_neighbour(self.DIST)))
+
+
+class CleanPingsTests(SimpleTestCase):
+    def test_outlier_does_not_drop_the_fix_after_it(self):
+        epoch = np.arange(6) * 10.0
+        lats = np.array([5.6, 5.6001, 5.7, 5.6003, 5.6004, 5.6005])  # 5.7 is an 11 km jump
+        lngs = np.full(6, -0.2)
+        kept, _, _ = _clean(epoch, lats, lngs, np.full(6, np.nan))
+        self.assertEqual(kept.tolist(), [0.0, 10.0, 30.0, 40.0, 50.0])
+
+
+class OptimizeOrderTests(SimpleTestCase):
+    START = (5.6, -0.2)
+
+    def test_never_worse_than_nearest_neighbour(self):
+        rng = np.random.default_rng(7)
+        for n in (5, 20, 60):
+            lats = self.START[0] + rng.uniform(-0.05, 0.05, n)
+            lngs = self.START[1] + rng.uniform(-0.05, 0.05, n)
+            order = optimize_order(lats, lngs, start=self.START, time_budget=None)
+            self.assertEqual(sorted(order.tolist()), list(range(n)))
+
+            dist = haversine_matrix(np.append(self.START[0], lats), np.append(self.START[1], lngs))
+            optimized = path_length(dist, np.concatenate(([0], order + 1)))
+            self.assertLessEqual(optimized, path_length(dist, nearest_neighbour(dist)) + 1e-9)
+
+    def test_small_inputs(self):
+        lats, lngs = [5.61, 5.62, 5.60], [-0.2, -0.2, -0.2]
+        self.assertEqual(optimize_order([], []).tolist(), [])
+        for n in (1, 2, 3):
+            order = optimize_order(lats[:n], lngs[:n], start=self.START)
+            self.assertEqual(sorted(order.tolist()), list(range(n)))
+            order = optimize_order(lats[:n], lngs[:n])
+            self.assertEqual(sorted(order.tolist()), list(range(n)))
+        # From the start at 5.60 the stops are taken northwards
+        self.assertEqual(optimize_order(lats, lngs, start=self.START).tolist(), [2, 0, 1])
+
+
+class RouteFenceTests(SimpleTestCase):
+    """Arrival within 50 m of a stop, departure only beyond 80 m."""
+
+    LAT, LNG = 5.6, -0.2
+    T0 = datetime(2026, 1, 1, 8, tzinfo=dt_timezone.utc)
+
+    def fence(self, *stops):
+        return RouteFence(1, 1, [(stop_id, lat, lng, False, False) for stop_id, lat, lng in stops])
+
+    def north(self, metres):
+        return self.LAT + metres / METRES_PER_DEGREE
+
+    def at(self, minutes):
+        return self.T0 + timedelta(minutes=minutes)
+
+    def test_arrive_and_depart(self):
+        fence = self.fence((10, self.LAT, self.LNG), (11, self.LAT, self.LNG + 0.003))
+        self.assertEqual(fence.step(self.north(120), self.LNG, self.at(0)), [])
+        self.assertEqual(fence.step(self.north(40), self.LNG, self.at(1)), [('arrive', 10, self.at(1))])
+        self.assertEqual(fence.step(self.LAT, self.LNG, self.at(5)), [])
+        # Departure is stamped at the last ping inside, not the first one outside
+        self.assertEqual(fence.step(self.north(100), self.LNG, self.at(6)), [('depart', 10, self.at(5))])
+        self.assertEqual(fence.step(self.LAT, self.LNG + 0.003, self.at(9)), [('arrive', 11, self.at(9))])
+
+    def test_hysteresis(self):
+        fence = self.fence((10, self.LAT, self.LNG))
+        self.assertEqual(fence.step(self.north(60), self.LNG, self.at(0)), [])     # outside 50 m: no arrival
+        self.assertEqual(fence.step(self.north(45), self.LNG, self.at(1)), [('arrive', 10, self.at(1))])
+        self.assertEqual(fence.step(self.north(70), self.LNG, self.at(2)), [])     # jitter inside 80 m
+        self.assertEqual(fence.step(self.north(75), self.LNG, self.at(3)), [])
+        self.assertEqual(fence.step(self.north(85), self.LNG, self.at(4)), [('depart', 10, self.at(3))])
+        # A visited stop is not arrived at again
+        self.assertEqual(fence.step(self.LAT, self.LNG, self.at(5)), [])
+
+    def test_resumes_at_a_stop_arrived_before_loading(self):
+        fence = RouteFence(1, 1, [(10, self.LAT, self.LNG, True, False), (11, self.LAT, self.LNG + 0.003, True, True)])
+        self.assertEqual(fence.step(self.LAT, self.LNG + 0.003, self.at(0)), [('depart', 10, self.at(0))])
+
+
+class SyncCursorTests(TestCase):
+    """An idle device's cursor must keep up with the log, so a prune does not expire it."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.idle = User.objects.create(username='COL0101', phone_number='0220000101', role='collector')
+        cls.busy_id = 999
+
+    def log_changes(self, count):
+        for object_id in range(count):
+            ChangeLog.objects.create(entity='route', object_id=object_id, collector_id=self.busy_id)
+        # Older than SETTLE_SECONDS and than the prune horizon
+        ChangeLog.objects.update(changed_at=timezone.now() - timedelta(days=2))
+
+    def poll(self, cursor):
+        client = APIClient()
+        client.force_authenticate(self.idle)
+        return client.get('/api/routes/sync/', {'since': cursor})
+
+    def test_idle_device_survives_a_prune(self):
+        self.log_changes(3)
+        response = self.poll(1)
+        self.assertEqual(response.status_code, 200)
+        cursor = response.json()['cursor']
+        self.assertEqual(cursor, ChangeLog.objects.latest('id').pk)
+
+        self.log_changes(5)
+        response = self.poll(cursor)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['routes'], [])
+        cursor = response.json()['cursor']
+
+        prune(timedelta(days=1))
+        response = self.poll(cursor)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['cursor'], cursor)
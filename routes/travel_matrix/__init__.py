@@ -0,0 +1,15 @@
+"""
+Road-network travel times for routes.
+
+An OSM extract is converted once into a compact graph file
+(`manage.py build_road_graph city.osm.bz2`, saved to ROAD_GRAPH_PATH).
+Stop points are snapped to the nearest graph node and node-to-node times
+are found with a bidirectional Dijkstra (single legs) or a one-to-many
+Dijkstra that stops once every target is reached (matrices). Results are
+cached in the TravelTime table keyed by the snapped OSM node ids, with LRU
+eviction.
+
+When no graph file is present every function returns None and callers keep
+using straight-line distance at a flat average speed.
+"""
+from .matrix import get_graph, is_enabled, path_minutes, time_matrix  # noqa
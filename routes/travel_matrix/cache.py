@@ -0,0 +1,112 @@
+"""
+Pairwise travel time cache backed by the TravelTime table.
+
+Rows are keyed by the OSM ids of the snapped (from, to) nodes, so they stay
+valid for every point that snaps to the same nodes. last_used_at drives
+LRU eviction once the table grows past TRAVEL_MATRIX_CACHE_MAX_ROWS.
+
+The table is only counted when this process's inserts could have pushed it
+over the limit, or every EVICT_INTERVAL (other processes insert too), not on
+every store.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import TravelTime
+
+
+DEFAULT_CACHE_MAX_ROWS = 2_000_000
+TOUCH_INTERVAL = timedelta(hours=1)  # don't rewrite last_used_at on every hit
+EVICT_INTERVAL_SECONDS = 600
+
+_rows = None         # table size at the last count plus the rows inserted since
+_counted_at = 0.0
+_lock = threading.Lock()
+
+
+def max_rows():
+    return getattr(settings, 'TRAVEL_MATRIX_CACHE_MAX_ROWS', DEFAULT_CACHE_MAX_ROWS)
+
+
+def lookup(pairs):
+    """Cached seconds for the (from_node, to_node) pairs that are known (None = unreachable)."""
+    pairs = set(pairs)
+    if not pairs:
+        return {}
+    sources = {a for a, _ in pairs}
+    targets = {b for _, b in pairs}
+    rows = TravelTime.objects.filter(from_node__in=sources, to_node__in=targets).values_list(
+        'pk', 'from_node', 'to_node', 'seconds', 'last_used_at'
+    )
+    found, stale = {}, []
+    touch_before = timezone.now() - TOUCH_INTERVAL
+    for pk, a, b, seconds, last_used_at in rows:
+        if (a, b) in pairs:
+            found[(a, b)] = seconds
+            if last_used_at < touch_before:
+                stale.append(pk)
+    if stale:
+        TravelTime.objects.filter(pk__in=stale).update(last_used_at=timezone.now())
+    return found
+
+
+def can_store(count):
+    """Whether `count` pairs fit in the cache; a bigger batch would only evict itself."""
+    return count <= max_rows()
+
+
+def store(results):
+    """
+    Save {(from_node, to_node): seconds or None}, evicting the least recently
+    used rows when the table may have outgrown the limit. Batches larger
+    than the whole cache are not stored. Returns the number of pairs sent.
+    """
+    global _rows
+    if not results or not can_store(len(results)):
+        return 0
+    now = timezone.now()
+    TravelTime.objects.bulk_create(
+        [TravelTime(from_node=a, to_node=b, seconds=s, last_used_at=now) for (a, b), s in results.items()],
+        batch_size=5000,
+        ignore_conflicts=True,
+    )
+    with _lock:
+        due = (
+            _rows is None or _rows + len(results) > max_rows()
+            or time.monotonic() - _counted_at > EVICT_INTERVAL_SECONDS
+        )
+        if not due:
+            _rows += len(results)
+    if due:
+        evict()
+    return len(results)
+
+
+def evict(limit=None):
+    """
+    Delete the least recently used rows above `limit` (default: the
+    configured maximum), oldest last_used_at first and then oldest pk, so
+    rows sharing a timestamp are removed only as far as needed.
+    """
+    global _rows, _counted_at
+    limit = max_rows() if limit is None else limit
+    count = TravelTime.objects.count()
+    excess = count - limit
+    deleted = 0
+    if excess > 0:
+        oldest = TravelTime.objects.order_by('last_used_at', 'pk').values_list('pk', flat=True)[:excess]
+        deleted, _ = TravelTime.objects.filter(pk__in=oldest).delete()
+    with _lock:
+        _rows, _counted_at = count - deleted, time.monotonic()
+    return deleted
+
+
+def clear():
+    global _rows
+    TravelTime.objects.all().delete()
+    with _lock:
+        _rows = 0
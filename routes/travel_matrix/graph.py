@@ -0,0 +1,175 @@
+"""
+In-memory road graph.
+
+Nodes are kept in compressed sparse row (CSR) form: the edges leaving node
+`u` are `indices[indptr[u]:indptr[u + 1]]` with their travel times in
+`seconds`. The reverse graph is built on first use for the backward half
+of the bidirectional search.
+"""
+import heapq
+import math
+
+import numpy as np
+from shapely import STRtree, points as shapely_points
+
+
+class RoadGraph:
+    def __init__(self, node_ids, lats, lngs, indptr, indices, seconds):
+        self.node_ids = np.asarray(node_ids, dtype=np.int64)
+        self.lats = np.asarray(lats, dtype=float)
+        self.lngs = np.asarray(lngs, dtype=float)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.seconds = np.asarray(seconds, dtype=float)
+        self._index_of = {int(n): i for i, n in enumerate(self.node_ids)}
+        self._lng_scale = math.cos(math.radians(float(self.lats.mean()))) if len(self.lats) else 1.0
+        self._forward = None
+        self._backward = None
+        self._tree = None
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    @property
+    def edge_count(self):
+        return len(self.indices)
+
+    # ---------------------------
+    # Construction / storage
+    # ---------------------------
+
+    @classmethod
+    def from_edges(cls, node_ids, lats, lngs, src, dst, seconds):
+        """Build the CSR arrays from parallel edge arrays (node positions, not OSM ids)."""
+        src = np.asarray(src, dtype=np.int64)
+        order = np.argsort(src, kind='stable')
+        indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=len(node_ids)), out=indptr[1:])
+        return cls(node_ids, lats, lngs, indptr, np.asarray(dst)[order], np.asarray(seconds)[order])
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                data['node_ids'], data['lats'], data['lngs'],
+                data['indptr'], data['indices'], data['seconds'],
+            )
+
+    def save(self, path):
+        with open(path, 'wb') as fh:
+            np.savez_compressed(
+                fh,
+                node_ids=self.node_ids, lats=self.lats, lngs=self.lngs,
+                indptr=self.indptr, indices=self.indices, seconds=self.seconds,
+            )
+
+    # ---------------------------
+    # Snapping
+    # ---------------------------
+
+    def _scaled(self, lats, lngs):
+        # Shrink longitudes by cos(latitude) so planar nearest-neighbour matches ground distance
+        return shapely_points(np.asarray(lngs, dtype=float) * self._lng_scale, np.asarray(lats, dtype=float))
+
+    def snap(self, lats, lngs):
+        """Position (not OSM id) of the nearest graph node for each point."""
+        if self._tree is None:
+            self._tree = STRtree(self._scaled(self.lats, self.lngs))
+        query = self._scaled(lats, lngs)
+        hits = self._tree.query_nearest(query, all_matches=False)
+        nearest = np.empty(len(query), dtype=np.int64)
+        nearest[hits[0]] = hits[1]
+        return nearest
+
+    def node_id(self, position):
+        return int(self.node_ids[position])
+
+    def position(self, node_id):
+        return self._index_of[int(node_id)]
+
+    # ---------------------------
+    # Shortest paths
+    # ---------------------------
+
+    def _adjacency(self, reverse=False):
+        """Per-node (neighbour, seconds) lists; Python lists keep the heap loops fast."""
+        if not reverse:
+            if self._forward is None:
+                self._forward = self._lists(self.indptr, self.indices, self.seconds)
+            return self._forward
+        if self._backward is None:
+            src = np.repeat(np.arange(len(self)), np.diff(self.indptr))
+            reverse_graph = RoadGraph.from_edges(
+                self.node_ids, self.lats, self.lngs, self.indices, src, self.seconds
+            )
+            self._backward = self._lists(reverse_graph.indptr, reverse_graph.indices, reverse_graph.seconds)
+        return self._backward
+
+    @staticmethod
+    def _lists(indptr, indices, seconds):
+        indptr = indptr.tolist()
+        indices = indices.tolist()
+        seconds = seconds.tolist()
+        return [
+            list(zip(indices[indptr[u]:indptr[u + 1]], seconds[indptr[u]:indptr[u + 1]]))
+            for u in range(len(indptr) - 1)
+        ]
+
+    def shortest(self, source, target):
+        """
+        Travel time (seconds) from node position `source` to `target` with a
+        bidirectional Dijkstra; math.inf when unreachable.
+        """
+        if source == target:
+            return 0.0
+        forward, backward = self._adjacency(), self._adjacency(reverse=True)
+        dist = ({source: 0.0}, {target: 0.0})
+        heaps = ([(0.0, source)], [(0.0, target)])
+        settled = (set(), set())
+        adjacency = (forward, backward)
+        best = math.inf
+        while heaps[0] and heaps[1]:
+            if heaps[0][0][0] + heaps[1][0][0] >= best:
+                break
+            # Grow the smaller frontier
+            side = 0 if len(heaps[0]) <= len(heaps[1]) else 1
+            d, u = heapq.heappop(heaps[side])
+            if u in settled[side]:
+                continue
+            settled[side].add(u)
+            mine, other = dist[side], dist[1 - side]
+            for v, w in adjacency[side][u]:
+                nd = d + w
+                if nd < mine.get(v, math.inf):
+                    mine[v] = nd
+                    heapq.heappush(heaps[side], (nd, v))
+                    if v in other and nd + other[v] < best:
+                        best = nd + other[v]
+        return best
+
+    def one_to_many(self, source, targets):
+        """
+        Travel times (seconds) from `source` to every node in `targets`,
+        stopping as soon as the last target is settled. Unreachable targets
+        are missing from the result.
+        """
+        remaining = set(targets)
+        adjacency = self._adjacency()
+        dist = {source: 0.0}
+        heap = [(0.0, source)]
+        settled = set()
+        found = {}
+        while heap and remaining:
+            d, u = heapq.heappop(heap)
+            if u in settled:
+                continue
+            settled.add(u)
+            if u in remaining:
+                found[u] = d
+                remaining.discard(u)
+            for v, w in adjacency[u]:
+                nd = d + w
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        return found
@@ -0,0 +1,203 @@
+"""
+Travel times between stop points over the offline road graph.
+
+Points are snapped to their nearest graph node; the time between two points
+is the road time between their nodes plus the straight-line hop from each
+point to its node at AVERAGE_SPEED_KMH. Node-to-node times come from the
+TravelTime cache, and only the missing pairs are searched.
+"""
+import math
+import os
+import threading
+
+import numpy as np
+from django.conf import settings
+
+from ..models import AVERAGE_SPEED_KMH
+from ..optimizer import EARTH_RADIUS_KM, haversine_matrix
+from . import cache
+from .graph import RoadGraph
+
+
+DEFAULT_MATRIX_MAX_NODES = 400
+
+_graph = None
+_graph_key = None
+_lock = threading.Lock()
+
+
+def graph_path():
+    return getattr(settings, 'ROAD_GRAPH_PATH', None)
+
+
+def max_matrix_nodes():
+    return getattr(settings, 'ROAD_MATRIX_MAX_NODES', DEFAULT_MATRIX_MAX_NODES)
+
+
+def get_graph():
+    """The road graph from ROAD_GRAPH_PATH, reloaded when the file changes; None if absent."""
+    global _graph, _graph_key
+    path = graph_path()
+    if not path or not os.path.exists(path):
+        return None
+    key = (str(path), os.path.getmtime(path))
+    with _lock:
+        if _graph_key != key:
+            _graph = RoadGraph.load(path)
+            _graph_key = key
+    return _graph
+
+
+def is_enabled():
+    return get_graph() is not None
+
+
+def _km_to_minutes(km):
+    return km / AVERAGE_SPEED_KMH * 60
+
+
+def _snap(graph, lats, lngs):
+    """Snapped node positions and the minutes from each point to its node."""
+    nodes = graph.snap(lats, lngs)
+    lat1, lng1 = np.radians(lats), np.radians(lngs)
+    lat2, lng2 = np.radians(graph.lats[nodes]), np.radians(graph.lngs[nodes])
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2)
+    hop_km = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    return nodes, _km_to_minutes(hop_km)
+
+
+def _node_seconds(graph, pairs):
+    """
+    Seconds between node positions for each (from, to) pair: cached pairs
+    are read in one query, the rest are searched and written back. More
+    pairs than the cache holds bypass it entirely. Unreachable pairs map to
+    math.inf.
+    """
+    keyed = {(graph.node_id(a), graph.node_id(b)): (a, b) for a, b in pairs if a != b}
+    cached = cache.can_store(len(keyed))
+    known = cache.lookup(keyed) if cached else {}
+
+    by_source = {}
+    for key, (a, b) in keyed.items():
+        if key not in known:
+            by_source.setdefault(a, set()).add(b)
+
+    searched = {}
+    for source, targets in by_source.items():
+        if len(targets) == 1:
+            target = next(iter(targets))
+            seconds = graph.shortest(source, target)
+            found = {target: seconds} if seconds < math.inf else {}
+        else:
+            found = graph.one_to_many(source, targets)
+        for target in targets:
+            searched[(graph.node_id(source), graph.node_id(target))] = found.get(target)
+    if cached:
+        cache.store(searched)
+
+    result = {(a, b): 0.0 for a, b in pairs if a == b}
+    for key, (a, b) in keyed.items():
+        seconds = known[key] if key in known else searched[key]
+        result[(a, b)] = math.inf if seconds is None else seconds
+    return result
+
+
+def _node_matrix(graph, nodes):
+    """
+    Seconds between every pair of node positions as an m x m array
+    (math.inf = unreachable). Cached pairs are read in one query; each
+    source with missing pairs is searched once and its times are written
+    straight into the array. Matrices bigger than the cache bypass it.
+    """
+    m = len(nodes)
+    seconds = np.full((m, m), math.inf)
+    np.fill_diagonal(seconds, 0.0)
+    if m < 2:
+        return seconds
+    ids = [graph.node_id(a) for a in nodes]
+    position = {a: i for i, a in enumerate(nodes)}
+    missing = ~np.eye(m, dtype=bool)
+
+    cached = cache.can_store(m * (m - 1))
+    if cached:
+        row_of = {node_id: i for i, node_id in enumerate(ids)}
+        known = cache.lookup((a, b) for a in ids for b in ids if a != b)
+        for (a, b), value in known.items():
+            i, j = row_of[a], row_of[b]
+            seconds[i, j] = math.inf if value is None else value
+            missing[i, j] = False
+
+    searched = {}
+    for i in np.flatnonzero(missing.any(axis=1)).tolist():
+        targets = [nodes[j] for j in np.flatnonzero(missing[i]).tolist()]
+        if len(targets) == 1:
+            found = {targets[0]: graph.shortest(nodes[i], targets[0])}
+        else:
+            found = graph.one_to_many(nodes[i], targets)
+        for target, value in found.items():
+            seconds[i, position[target]] = value
+        if cached:
+            for target in targets:
+                value = float(seconds[i, position[target]])
+                searched[(ids[i], graph.node_id(target))] = value if math.isfinite(value) else None
+    if cached:
+        cache.store(searched)
+    return seconds
+
+
+def time_matrix(lats, lngs):
+    """
+    n x n travel times in minutes between the points, or None when no road
+    graph is configured. Pairs the graph cannot connect fall back to
+    straight-line distance at AVERAGE_SPEED_KMH, and so does the whole
+    matrix when the points snap to more than max_matrix_nodes() nodes (one
+    search per node would cost more than the ordering it feeds).
+    """
+    graph = get_graph()
+    if graph is None:
+        return None
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    if len(lats) == 0:
+        return np.zeros((0, 0))
+
+    nodes, hop = _snap(graph, lats, lngs)
+    unique, inverse = np.unique(nodes, return_inverse=True)
+    if len(unique) > max_matrix_nodes():
+        minutes = _km_to_minutes(haversine_matrix(lats, lngs))
+        np.fill_diagonal(minutes, 0.0)
+        return minutes
+    road = _node_matrix(graph, unique.tolist()) / 60
+
+    minutes = road[np.ix_(inverse, inverse)] + hop[:, None] + hop[None, :]
+    unreachable = ~np.isfinite(minutes)
+    if unreachable.any():
+        minutes[unreachable] = _km_to_minutes(haversine_matrix(lats, lngs))[unreachable]
+    np.fill_diagonal(minutes, 0.0)
+    return minutes
+
+
+def path_minutes(lats, lngs):
+    """
+    Travel minutes along the points in order (one search per leg), or None
+    when no road graph is configured.
+    """
+    graph = get_graph()
+    if graph is None:
+        return None
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    if len(lats) < 2:
+        return 0.0
+
+    nodes, hop = _snap(graph, lats, lngs)
+    legs = list(zip(nodes[:-1].tolist(), nodes[1:].tolist()))
+    seconds = _node_seconds(graph, legs)
+    total = 0.0
+    for i, (a, b) in enumerate(legs):
+        leg = seconds[(a, b)] / 60 + hop[i] + hop[i + 1]
+        if not math.isfinite(leg):
+            leg = _km_to_minutes(haversine_matrix(lats[i:i + 2], lngs[i:i + 2])[0, 1])
+        total += leg
+    return total
@@ -0,0 +1,119 @@
+"""
+Build a RoadGraph from an OpenStreetMap XML extract (.osm, .osm.bz2, .osm.gz).
+
+Only drivable `highway=*` ways are kept. Edge times come from the way's
+`maxspeed` tag when it is a plain km/h number, otherwise from
+ROAD_SPEEDS_KMH for its highway class. PBF extracts can be converted first,
+e.g. `osmium cat city.osm.pbf -o city.osm.bz2`.
+"""
+import bz2
+import gzip
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from ..optimizer import EARTH_RADIUS_KM
+from .graph import RoadGraph
+
+
+# Typical urban driving speeds for a loaded collection vehicle
+ROAD_SPEEDS_KMH = {
+    'motorway': 80,
+    'motorway_link': 45,
+    'trunk': 60,
+    'trunk_link': 40,
+    'primary': 45,
+    'primary_link': 35,
+    'secondary': 40,
+    'secondary_link': 30,
+    'tertiary': 30,
+    'tertiary_link': 25,
+    'unclassified': 25,
+    'residential': 20,
+    'living_street': 10,
+    'service': 15,
+    'road': 20,
+    'track': 10,
+}
+
+ONEWAY_VALUES = {'yes', 'true', '1'}
+
+
+def _open(path):
+    path = str(path)
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def _speed(tags):
+    maxspeed = (tags.get('maxspeed') or '').strip()
+    if maxspeed.isdigit() and int(maxspeed) > 0:
+        return float(maxspeed)
+    return float(ROAD_SPEEDS_KMH[tags['highway']])
+
+
+def _direction(tags):
+    """1 = forward only, -1 = backward only, 0 = both ways."""
+    oneway = (tags.get('oneway') or '').lower()
+    if oneway in ONEWAY_VALUES:
+        return 1
+    if oneway == '-1':
+        return -1
+    if oneway == 'no':
+        return 0
+    if tags.get('junction') == 'roundabout' or tags['highway'] in ('motorway', 'motorway_link'):
+        return 1
+    return 0
+
+
+def build_graph(path):
+    """Parse an OSM XML extract into a RoadGraph of its drivable roads."""
+    coords = {}
+    src, dst, speeds = [], [], []
+
+    with _open(path) as fh:
+        for _, elem in ET.iterparse(fh, events=('end',)):
+            if elem.tag == 'node':
+                coords[int(elem.get('id'))] = (float(elem.get('lat')), float(elem.get('lon')))
+            elif elem.tag == 'way':
+                tags = {t.get('k'): t.get('v') for t in elem.iter('tag')}
+                if tags.get('highway') in ROAD_SPEEDS_KMH and tags.get('access') not in ('no', 'private'):
+                    refs = [int(nd.get('ref')) for nd in elem.iter('nd')]
+                    speed = _speed(tags)
+                    direction = _direction(tags)
+                    for a, b in zip(refs[:-1], refs[1:]):
+                        if direction >= 0:
+                            src.append(a)
+                            dst.append(b)
+                            speeds.append(speed)
+                        if direction <= 0:
+                            src.append(b)
+                            dst.append(a)
+                            speeds.append(speed)
+            elif elem.tag != 'relation':
+                # <tag>/<nd> children are read by their parent before it is cleared
+                continue
+            elem.clear()
+
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    keep = np.array([a in coords and b in coords for a, b in zip(src.tolist(), dst.tolist())], dtype=bool)
+    src, dst, speeds = src[keep], dst[keep], np.asarray(speeds, dtype=float)[keep]
+
+    # Renumber the OSM ids that are actually on a road to dense positions
+    node_ids, inverse = np.unique(np.concatenate((src, dst)), return_inverse=True)
+    src_pos, dst_pos = inverse[:len(src)], inverse[len(src):]
+    latlng = np.array([coords[n] for n in node_ids.tolist()], dtype=float).reshape(-1, 2)
+    lats, lngs = latlng[:, 0], latlng[:, 1]
+
+    lat = np.radians(lats)
+    lng = np.radians(lngs)
+    a = (np.sin((lat[dst_pos] - lat[src_pos]) / 2) ** 2
+         + np.cos(lat[src_pos]) * np.cos(lat[dst_pos]) * np.sin((lng[dst_pos] - lng[src_pos]) / 2) ** 2)
+    metres = 2000 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    seconds = metres / (speeds / 3.6)
+
+    return RoadGraph.from_edges(node_ids, lats, lngs, src_pos, dst_pos, seconds)
@@ -1,14 +1,30 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.renderers import JSONRenderer
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from drf_yasg.utils import swagger_auto_schema
+from drf_yasg import openapi
 
-from .models import Route,RouteStop
-from .serializers import RouteSerializer, RouteStopSerializer
-from accounts.permissions import IsSupervisor, IsCompanyCollector
+from .models import Route, RouteDeviation, RouteStop
+from .serializers import (
+    RouteDeviationSerializer, RouteSerializer, RouteStopSerializer, RouteStopBulkEditSerializer,
+    StopCompletionBatchSerializer,
+)
+from .batch import batch_edit
+from .deviation import compute_day
+from .services import complete_stops
+from .planner import DEFAULT_PLAN_TIME_BUDGET, plan_day
+from .renderers import available_binary_renderers
+from .sheet import build_route_sheet, etag_matches, sheet_etag
+from .sync import CursorExpired, changes_since, snapshot
+from accounts.permissions import IsSupervisor, IsCompanyCollector, IsSupervisorOrCollector
+from collector.breadcrumbs import route_track
 from collection_management.models import CollectionRecord
+from collector.models import Collector
 from collection_management.serializers import CollectionRecordCreateSerializer, CollectionRecordSerializer
+from waste_management_company.models import Company
 class RouteViewSet(viewsets.ModelViewSet):
     """
     ViewSet for managing company collector routes.
@@ -19,6 +35,12 @@ class RouteViewSet(viewsets.ModelViewSet):
     queryset = Route.objects.all()
     serializer_class = RouteSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            queryset = RouteSerializer.setup_eager_loading(queryset)
+        return queryset
+
     # --- Basic CRUD endpoints ---
     @swagger_auto_schema(
         operation_summary="List all routes",
@@ -96,6 +118,121 @@ class RouteViewSet(viewsets.ModelViewSet):
         }
         return Response(summary)
 
+    @swagger_auto_schema(
+        method='get',
+        operation_summary="Compact route sheet",
+        operation_description=(
+            "Collector downloads a compact, columnar sheet of the route's stops (stop id, order, lat/lng, "
+            "expected minutes, status and a short client label). Served as JSON, or as MessagePack with "
+            "Accept: application/msgpack (or ?format=msgpack) when msgpack is installed. Send the last "
+            "ETag in If-None-Match to get 304 Not Modified when nothing changed."
+        ),
+        tags=["Routes"]
+    )
+    @action(
+        detail=True,
+        methods=['get'],
+        permission_classes=[IsSupervisorOrCollector],
+        renderer_classes=[JSONRenderer, *available_binary_renderers()],
+    )
+    def sheet(self, request, pk=None):
+        route = self.get_object()
+        if request.user.role == "collector" and route.collector_id != request.user.pk:
+            return Response({"detail": "This route is not assigned to you."}, status=status.HTTP_403_FORBIDDEN)
+
+        sheet = build_route_sheet(route)
+        etag = sheet_etag(sheet, request.accepted_renderer.format)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(request.headers.get("If-None-Match"), etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(sheet, headers=headers)
+
+    @swagger_auto_schema(
+        method='get',
+        operation_summary="Delta sync",
+        operation_description=(
+            "Collector devices poll for the routes, route stops, on-demand and scheduled requests that "
+            "changed since their last cursor. Without `since` the current state (routes from today on) "
+            "is returned with a cursor to poll from. Deleted or reassigned rows are listed under "
+            "`deleted`. When `has_more` is true, poll again straight away with the returned cursor. "
+            "410 means the cursor is too old: drop local data and sync without `since`. "
+            "Supervisors receive the changes for every collector they supervise."
+        ),
+        manual_parameters=[
+            openapi.Parameter('since', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description="Cursor returned by the previous sync"),
+        ],
+        tags=["Routes"]
+    )
+    @action(detail=False, methods=['get'], permission_classes=[IsSupervisorOrCollector])
+    def sync(self, request):
+        if request.user.role == "collector":
+            collector_ids = [request.user.pk]
+        else:
+            collector_ids = list(
+                Collector.objects.filter(supervisor=request.user.supervisor).values_list('pk', flat=True)
+            )
+
+        since = request.query_params.get("since")
+        if not since:
+            return Response(snapshot(collector_ids))
+        try:
+            cursor = int(since)
+            if cursor < 0:
+                raise ValueError
+        except ValueError:
+            return Response({"detail": "since must be a cursor returned by a previous sync."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            return Response(changes_since(cursor, collector_ids))
+        except CursorExpired:
+            return Response({"detail": "Cursor expired. Sync again without 'since'."}, status=status.HTTP_410_GONE)
+
+    @swagger_auto_schema(
+        method='post',
+        operation_summary="Plan a day's routes",
+        operation_description=(
+            "Supervisor splits every pending scheduled and on-demand request of their company for a date "
+            "across the company's collectors (capacity, time slot and zone aware) and creates one route "
+            "per collector. Use dry_run to preview the plan without saving it."
+        ),
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'route_date': openapi.Schema(type=openapi.TYPE_STRING, format='date', description="Defaults to today"),
+                'time_budget': openapi.Schema(type=openapi.TYPE_NUMBER, description="Solver time budget in seconds"),
+                'dry_run': openapi.Schema(type=openapi.TYPE_BOOLEAN),
+            },
+        ),
+        tags=["Routes"]
+    )
+    @action(detail=False, methods=['post'], permission_classes=[IsSupervisor])
+    def plan_day(self, request):
+        supervisor = request.user.supervisor
+        company = Company.objects.filter(user__username=supervisor.company_username).first()
+        if not company:
+            return Response({"detail": "Supervisor is not linked to a company."}, status=status.HTTP_400_BAD_REQUEST)
+
+        route_date = request.data.get("route_date")
+        route_date = parse_date(route_date) if route_date else timezone.now().date()
+        if route_date is None:
+            return Response({"detail": "route_date must be YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            time_budget = min(float(request.data.get("time_budget", DEFAULT_PLAN_TIME_BUDGET)), DEFAULT_PLAN_TIME_BUDGET)
+        except (TypeError, ValueError):
+            return Response({"detail": "time_budget must be a number."}, status=status.HTTP_400_BAD_REQUEST)
+
+        summary = plan_day(
+            company,
+            route_date,
+            supervisor=supervisor,
+            time_budget=time_budget,
+            dry_run=bool(request.data.get("dry_run", False)),
+        )
+        return Response(summary, status=status.HTTP_200_OK if request.data.get("dry_run") else status.HTTP_201_CREATED)
+
     @swagger_auto_schema(
         operation_summary="Start a route",
         operation_description="Collector marks the route as in progress and sets actual_start timestamp.",
@@ -123,6 +260,54 @@ class RouteViewSet(viewsets.ModelViewSet):
         route.save()
         return Response(self.get_serializer(route).data)   
 
+    @swagger_auto_schema(
+        method='get',
+        operation_summary="Planned vs actual",
+        operation_description=(
+            "Supervisor views the route's deviation from plan, computed from GPS breadcrumbs: distance "
+            "driven vs planned, distance off the planned path, stops visited out of order and dwell time "
+            "per stop vs expected_minutes. Pass `refresh=true` to recompute it now."
+        ),
+        manual_parameters=[
+            openapi.Parameter('refresh', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN),
+        ],
+        tags=["Routes"]
+    )
+    @action(detail=True, methods=['get'], permission_classes=[IsSupervisor])
+    def deviation(self, request, pk=None):
+        route = self.get_object()
+        if request.query_params.get("refresh") in ("1", "true"):
+            compute_day(route.route_date, [route.pk])
+        deviation = RouteDeviation.objects.filter(route=route).first()
+        if deviation is None:
+            return Response({"detail": "No deviation computed for this route yet."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(RouteDeviationSerializer(deviation).data)
+
+    @swagger_auto_schema(
+        method='get',
+        operation_summary="Actual route track",
+        operation_description=(
+            "The collector's GPS breadcrumbs during the route (between actual_start and actual_end, else "
+            "over the route date) as a Google encoded polyline. `simplify` drops points closer than that "
+            "many metres to the simplified line."
+        ),
+        manual_parameters=[
+            openapi.Parameter('simplify', openapi.IN_QUERY, type=openapi.TYPE_NUMBER,
+                              description="Simplification tolerance in metres (default 0)"),
+        ],
+        tags=["Routes"]
+    )
+    @action(detail=True, methods=['get'], permission_classes=[IsSupervisorOrCollector])
+    def track(self, request, pk=None):
+        route = self.get_object()
+        if request.user.role == "collector" and route.collector_id != request.user.pk:
+            return Response({"detail": "This route is not assigned to you."}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            simplify = float(request.query_params.get("simplify", 0))
+        except ValueError:
+            return Response({"detail": "simplify must be a number."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(route_track(route, simplify))
+
 
 class RouteStopViewSet(viewsets.ModelViewSet):
     """
@@ -134,6 +319,9 @@ class RouteStopViewSet(viewsets.ModelViewSet):
     queryset = RouteStop.objects.all()
     serializer_class = RouteStopSerializer
 
+    def get_queryset(self):
+        return RouteStopSerializer.setup_eager_loading(super().get_queryset())
+
     # --- Basic CRUD endpoints ---
     @swagger_auto_schema(
         operation_summary="List all route stops",
@@ -191,6 +379,37 @@ class RouteStopViewSet(viewsets.ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
     # --- Custom actions ---
+    @swagger_auto_schema(
+        method='post',
+        operation_summary="Bulk reorder / update stops",
+        operation_description=(
+            "Supervisor reorders and/or patches many stops of one route in a single request. "
+            "Changes are written with one bulk update and the route's distance, duration and "
+            "completion are recomputed once."
+        ),
+        request_body=RouteStopBulkEditSerializer,
+        responses={200: RouteSerializer},
+        tags=["RouteStops"]
+    )
+    @action(detail=False, methods=['post'], url_path='bulk-edit', permission_classes=[IsSupervisor])
+    def bulk_edit(self, request):
+        serializer = RouteStopBulkEditSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        route = serializer.validated_data['route']
+
+        try:
+            with batch_edit(route) as batch:
+                if serializer.validated_data.get('order'):
+                    batch.reorder(serializer.validated_data['order'])
+                for item in serializer.validated_data.get('stops', []):
+                    fields = dict(item)
+                    batch.update(fields.pop('stop_id'), **fields)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        route = RouteSerializer.setup_eager_loading(Route.objects.filter(pk=route.pk)).get()
+        return Response(RouteSerializer(route).data)
+
     @swagger_auto_schema(
         operation_summary="Start a stop",
         operation_description="Collector marks the stop as in progress and sets actual_start timestamp.",
@@ -200,7 +419,8 @@ class RouteStopViewSet(viewsets.ModelViewSet):
     def start(self, request, pk=None):
         stop = self.get_object()
         stop.status = "in_progress"
-        stop.actual_start = timezone.now()
+        # Keep an arrival already stamped by the geofence (routes.geofence)
+        stop.actual_start = stop.actual_start or timezone.now()
         stop.save()
         return Response(self.get_serializer(stop).data)
 
@@ -218,7 +438,7 @@ class RouteStopViewSet(viewsets.ModelViewSet):
         """
         stop = self.get_object()
         stop.status = "completed"
-        stop.actual_end = timezone.now()
+        stop.actual_end = stop.actual_end or timezone.now()
         stop.save()
 
         # Create or update CollectionRecord
@@ -240,6 +460,39 @@ class RouteStopViewSet(viewsets.ModelViewSet):
 
         return Response(CollectionRecordSerializer(record).data, status=status.HTTP_200_OK)
 
+    @swagger_auto_schema(
+        method='post',
+        operation_summary="Complete stops in a batch (offline upload)",
+        operation_description=(
+            "Collector uploads completions queued while offline. Each item carries an idempotency_key and "
+            "the device's started_at/completed_at. Everything is applied in one transaction with bulk "
+            "writes and each affected route is recomputed once. Per item status: completed, duplicate "
+            "(key already applied - safe to retry), conflict (stop completed by another upload), "
+            "not_found or rejected."
+        ),
+        request_body=StopCompletionBatchSerializer,
+        tags=["RouteStops"]
+    )
+    @action(detail=False, methods=['post'], url_path='complete-batch', permission_classes=[IsCompanyCollector])
+    def complete_batch(self, request):
+        serializer = StopCompletionBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        results, routes = complete_stops(request.user.collector, serializer.validated_data['completions'])
+        return Response({
+            "results": results,
+            "routes": [
+                {
+                    "route_id": route.pk,
+                    "status": route.status,
+                    "completion_percent": route.completion_percent,
+                    "completed_stops": route.completed_stops_count,
+                    "total_stops": route.stops_count,
+                }
+                for route in routes
+            ],
+        }, status=status.HTTP_200_OK)
+
     @swagger_auto_schema(
         operation_summary="Skip a stop",
         operation_description="Supervisor marks the stop as skipped. Useful when a client is unavailable or request is cancelled.",
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-16 14:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduled_request', '0002_scheduledrequest_updated_at'),
+        ('zones', '0003_alter_zone_center_point'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scheduledrequest',
+            name='zone',
+            field=models.ForeignKey(blank=True, help_text='Zone containing `location`, resolved on save', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='scheduled_requests', to='zones.zone'),
+        ),
+        migrations.AddIndex(
+            model_name='scheduledrequest',
+            index=models.Index(fields=['zone', 'pickup_date'], name='scheduled_r_zone_id_039852_idx'),
+        ),
+    ]
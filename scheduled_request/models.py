@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.gis.db import models as gis_models
 from django.utils import timezone
+from zones.index import zone_for_location
 
 
 class ScheduledRequest(models.Model):
@@ -53,6 +54,14 @@ class ScheduledRequest(models.Model):
     city = models.CharField(max_length=100)
     area_zone = models.CharField(max_length=100)
     location = gis_models.PointField(geography=True, null=True, blank=True)
+    zone = models.ForeignKey(
+        'zones.Zone',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='scheduled_requests',
+        help_text="Zone containing `location`, resolved on save"
+    )
 
     # Waste type choices
     WASTE_TYPE_CHOICES = [
@@ -100,9 +109,17 @@ class ScheduledRequest(models.Model):
     cancelled_at = models.DateTimeField(null=True, blank=True)
 
     cancellation_reason = models.TextField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['pickup_date', 'pickup_time_slot']
+        indexes = [
+            models.Index(fields=['zone', 'pickup_date']),
+        ]
 
     def __str__(self):
         return f"ScheduledRequest {self.id} for {self.client} on {self.pickup_date}"
+
+    def save(self, *args, **kwargs):
+        self.zone_id = zone_for_location(self.location)
+        super().save(*args, **kwargs)
@@ -30,6 +30,7 @@ class ScheduledRequestDetailSerializer(serializers.ModelSerializer):
             'landmark',
             'city',
             #'area_zone',
+            'zone',
             'latitude',
             'longitude',
             'waste_type',
@@ -6,9 +6,11 @@ from rest_framework.decorators import action
 from django.utils import timezone
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from geopy.distance import geodesic
+from borla_master import geo
 from django.contrib.gis.geos import Point
 from django_filters.rest_framework import DjangoFilterBackend
+from collector import telemetry
+from collector.serializers import LocationPingSerializer
 
 
 from .models import ScheduledRequest
@@ -122,16 +124,18 @@ class ScheduledRequestViewSet(viewsets.ModelViewSet):
                 {"detail": "Latitude and longitude are required."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+        position = LocationPingSerializer(data={"latitude": lat, "longitude": lng})
+        if not position.is_valid():
+            return Response(position.errors, status=status.HTTP_400_BAD_REQUEST)
+        lat, lng = position.validated_data["latitude"], position.validated_data["longitude"]
 
-        collector.last_known_latitude = lat
-        collector.last_known_longitude = lng
-        collector.save()
+        telemetry.record(collector.pk, [{"latitude": lat, "longitude": lng}])
 
         # GPS validation
         if scheduled_request.location:
-            client_coords = (scheduled_request.location.y, scheduled_request.location.x)  # (lat, lon)
-            collector_coords = (float(lat), float(lng))
-            distance_m = geodesic(client_coords, collector_coords).meters
+            distance_m = geo.vincenty(
+                scheduled_request.location.y, scheduled_request.location.x, lat, lng
+            )
 
             if distance_m > 300:
                 return Response(
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ZonesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'zones'
+
+    def ready(self):
+        """Import signals when app is ready"""
+        import zones.signals  # noqa
@@ -0,0 +1,233 @@
+"""
+Overlap and coverage analysis of the active zones.
+
+- Overlaps: candidate pairs come from one STRtree query over the zone
+  index (zones.index), so only boundaries whose boxes meet are intersected.
+  The result is stored in ZoneOverlap and refreshed for a single zone when
+  it is saved (zones.signals).
+- Gaps: holes in the unary union of the boundaries, i.e. areas enclosed by
+  zones but served by none.
+- Uncovered locations: request locations that fall outside every zone,
+  resolved in one vectorized pass over the index.
+
+Areas are in km², approximated from degrees at each geometry's latitude;
+that is well within a percent at zone scale.
+"""
+import json
+from datetime import timedelta
+
+import numpy as np
+import shapely
+from django.contrib.gis.geos import GEOSGeometry
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from on_demand.models import OnDemandRequest
+from scheduled_request.models import ScheduledRequest
+from . import index as zone_index
+from .models import ZoneOverlap
+
+
+KM_PER_DEGREE = 111.32
+MIN_OVERLAP_KM2 = 0.0001   # 100 m²; smaller slivers are digitizing noise
+MIN_GAP_KM2 = 0.001
+LOCATION_LOOKBACK_DAYS = 90
+MAX_LISTED = 500
+
+
+def area_km2(geometries):
+    """Approximate area in km² of WGS 84 geometries (vectorized)."""
+    geometries = np.asarray(geometries, dtype=object)
+    if not len(geometries):
+        return np.empty(0)
+    latitudes = shapely.get_y(shapely.centroid(geometries))
+    return shapely.area(geometries) * KM_PER_DEGREE ** 2 * np.cos(np.radians(latitudes))
+
+
+def _polygonal(geometry):
+    """Only the polygon parts of an intersection (shared edges and corners are dropped)."""
+    parts = shapely.get_parts(geometry)
+    parts = parts[np.isin(shapely.get_type_id(parts), (3, 6))]
+    return shapely.union_all(parts) if len(parts) else None
+
+
+# ---------------------------
+# Overlaps
+# ---------------------------
+
+def find_overlaps(index, positions=None):
+    """
+    (zone_a_id, zone_b_id, overlap geometry, km²) for every pair of zones in
+    `index` sharing more than MIN_OVERLAP_KM2; `positions` restricts it to
+    pairs involving those zones.
+    """
+    boundaries = index.boundaries
+    if not len(index):
+        return []
+    if positions is None:
+        left, right = index.tree.query(boundaries, predicate='intersects')
+    else:
+        positions = np.asarray(positions, dtype=np.int64)
+        left, right = index.tree.query(boundaries[positions], predicate='intersects')
+        left = positions[left]
+    pairs = np.unique(np.sort(np.column_stack((left, right)), axis=1), axis=0)
+    pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+    if not len(pairs):
+        return []
+
+    shared = shapely.intersection(boundaries[pairs[:, 0]], boundaries[pairs[:, 1]])
+    areas = area_km2(shared)
+    rows = []
+    for (a, b), geometry, area in zip(pairs.tolist(), shared, areas.tolist()):
+        if area < MIN_OVERLAP_KM2:
+            continue
+        geometry = _polygonal(geometry)
+        if geometry is None:
+            continue
+        zone_a, zone_b = sorted((int(index.zone_ids[a]), int(index.zone_ids[b])))
+        rows.append((zone_a, zone_b, geometry, area))
+    return rows
+
+
+def _store(rows):
+    ZoneOverlap.objects.bulk_create([
+        ZoneOverlap(
+            zone_a_id=zone_a, zone_b_id=zone_b, area_km2=area,
+            overlap=GEOSGeometry(memoryview(shapely.to_wkb(geometry)), srid=4326),
+        )
+        for zone_a, zone_b, geometry, area in rows
+    ], batch_size=500)
+
+
+def refresh_overlaps(zone_ids=None):
+    """
+    Recompute stored overlaps: for every zone when `zone_ids` is None,
+    otherwise only the pairs involving those zones. Returns the rows stored.
+    """
+    index = zone_index.get_zone_index()
+    with transaction.atomic():
+        if zone_ids is None:
+            ZoneOverlap.objects.all().delete()
+            rows = find_overlaps(index)
+        else:
+            zone_ids = list(zone_ids)
+            ZoneOverlap.objects.filter(Q(zone_a_id__in=zone_ids) | Q(zone_b_id__in=zone_ids)).delete()
+            positions = np.flatnonzero(np.isin(index.zone_ids, zone_ids))
+            rows = find_overlaps(index, positions) if len(positions) else []
+        _store(rows)
+    return len(rows)
+
+
+# ---------------------------
+# Gaps and uncovered locations
+# ---------------------------
+
+def _neighbourhood(index, zone_id):
+    """Positions of the zones near `zone_id`, and the box they are judged in."""
+    position = np.flatnonzero(index.zone_ids == zone_id)
+    if not len(position):
+        return None, None
+    boundary = index.boundaries[position[0]]
+    xmin, ymin, xmax, ymax = shapely.bounds(boundary)
+    pad = max(xmax - xmin, ymax - ymin)
+    # A generous box so holes bordered by more distant zones are still closed
+    area = shapely.box(xmin - pad, ymin - pad, xmax + pad, ymax + pad)
+    return index.tree.query(area, predicate='intersects'), shapely.envelope(boundary)
+
+
+def find_gaps(index, positions=None, near=None):
+    """Holes in the union of the zones at `positions` (all by default), optionally only those touching `near`."""
+    boundaries = index.boundaries if positions is None else index.boundaries[positions]
+    if not len(boundaries):
+        return []
+    union = shapely.union_all(boundaries)
+    holes = [
+        shapely.Polygon(ring)
+        for polygon in shapely.get_parts(union)
+        for ring in polygon.interiors
+    ]
+    holes = np.asarray(holes, dtype=object)
+    if near is not None and len(holes):
+        holes = holes[shapely.intersects(holes, near)]
+    areas = area_km2(holes)
+    return [(hole, area) for hole, area in zip(holes, areas.tolist()) if area >= MIN_GAP_KM2]
+
+
+def uncovered_locations(index, since=None, near=None):
+    """
+    Active request locations (not cancelled, pickup on or after `since`)
+    outside every zone: {'on_demand_requests': [ids], 'scheduled_requests': [ids], 'clients': n}.
+    """
+    since = since or timezone.now().date() - timedelta(days=LOCATION_LOOKBACK_DAYS)
+    result, clients = {}, set()
+    for key, model in (('on_demand_requests', OnDemandRequest), ('scheduled_requests', ScheduledRequest)):
+        rows = (
+            model.objects.filter(location__isnull=False, pickup_date__gte=since)
+            .exclude(request_status='cancelled')
+            .values_list('pk', 'client_id', 'location')
+        )
+        if near is not None:
+            rows = rows.filter(location__intersects=GEOSGeometry(memoryview(shapely.to_wkb(near)), srid=4326))
+        rows = list(rows)
+        ids = np.array([pk for pk, _, _ in rows], dtype=np.int64)
+        lats = np.array([location.y for _, _, location in rows], dtype=float)
+        lngs = np.array([location.x for _, _, location in rows], dtype=float)
+        outside = index.lookup(lats, lngs) == zone_index.NO_ZONE
+        result[key] = ids[outside].tolist()
+        clients.update(client_id for (_, client_id, _), out in zip(rows, outside) if out)
+    result['clients'] = len(clients)
+    return result
+
+
+# ---------------------------
+# Reports
+# ---------------------------
+
+def _geojson(geometry):
+    return json.loads(shapely.to_geojson(shapely.set_precision(geometry, 1e-6)))
+
+
+def _overlap_rows(queryset):
+    return [
+        {'zone_a': o.zone_a_id, 'zone_b': o.zone_b_id, 'area_km2': round(o.area_km2, 4)}
+        for o in queryset.only('zone_a', 'zone_b', 'area_km2')[:MAX_LISTED]
+    ]
+
+
+def _uncovered_summary(uncovered):
+    return {
+        'clients': uncovered['clients'],
+        'on_demand_requests': len(uncovered['on_demand_requests']),
+        'scheduled_requests': len(uncovered['scheduled_requests']),
+        'on_demand_request_ids': uncovered['on_demand_requests'][:MAX_LISTED],
+        'scheduled_request_ids': uncovered['scheduled_requests'][:MAX_LISTED],
+    }
+
+
+def coverage_report(since=None):
+    """Stored overlaps, gap polygons and uncovered locations across all active zones."""
+    index = zone_index.get_zone_index()
+    overlaps = ZoneOverlap.objects.all()
+    return {
+        'zones': len(index),
+        'overlap_count': overlaps.count(),
+        'overlaps': _overlap_rows(overlaps),
+        'gaps': [{'area_km2': round(area, 4), 'geometry': _geojson(hole)} for hole, area in find_gaps(index)],
+        'uncovered': _uncovered_summary(uncovered_locations(index, since)),
+    }
+
+
+def zone_coverage_report(zone_id, since=None):
+    """The same report limited to one zone and its surroundings."""
+    index = zone_index.get_zone_index()
+    overlaps = ZoneOverlap.objects.filter(Q(zone_a_id=zone_id) | Q(zone_b_id=zone_id))
+    positions, near = _neighbourhood(index, zone_id)
+    gaps = find_gaps(index, positions, near) if positions is not None else []
+    return {
+        'zone_id': zone_id,
+        'overlap_count': overlaps.count(),
+        'overlaps': _overlap_rows(overlaps),
+        'gaps': [{'area_km2': round(area, 4), 'geometry': _geojson(hole)} for hole, area in gaps],
+        'uncovered': _uncovered_summary(uncovered_locations(index, since, near)) if near is not None else None,
+    }
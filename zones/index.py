@@ -0,0 +1,133 @@
+"""
+In-process spatial index of active zone boundaries.
+
+The boundaries are loaded once into a shapely STRtree of prepared polygons,
+so resolving a point to its zone is a tree probe plus one prepared
+containment test instead of a database round trip. Lookups are vectorized:
+many points are resolved in a single STRtree query.
+
+The index is rebuilt lazily:
+- immediately in the process that saves or deletes a Zone (zones.signals),
+- in other processes once their copy is older than REVALIDATE_SECONDS and
+  the zones table's (count, latest updated_at) stamp has changed.
+"""
+import threading
+import time
+
+import numpy as np
+import shapely
+from django.db.models import Count, Max
+from shapely import STRtree
+
+
+REVALIDATE_SECONDS = 30
+NO_ZONE = -1
+
+
+class ZoneIndex:
+    """STRtree over zone boundaries; when zones overlap the smallest one wins."""
+
+    def __init__(self, zone_ids, boundaries, stamp=None):
+        self.zone_ids = np.asarray(zone_ids, dtype=np.int64)
+        self.boundaries = np.asarray(boundaries, dtype=object)
+        shapely.prepare(self.boundaries)
+        self.areas = shapely.area(self.boundaries) if len(self.boundaries) else np.empty(0)
+        self.tree = STRtree(self.boundaries)
+        self.stamp = stamp
+
+    def __len__(self):
+        return len(self.zone_ids)
+
+    @classmethod
+    def from_zones(cls, zones, stamp=None):
+        """Build from (zone_id, GEOS polygon) pairs."""
+        zones = [(zone_id, boundary) for zone_id, boundary in zones if boundary]
+        boundaries = shapely.from_wkb([bytes(boundary.wkb) for _, boundary in zones])
+        return cls([zone_id for zone_id, _ in zones], boundaries, stamp)
+
+    def lookup(self, lats, lngs):
+        """
+        Zone id for each point (NO_ZONE when outside every zone), preferring
+        the smallest zone where zones overlap.
+        """
+        lats = np.asarray(lats, dtype=float)
+        lngs = np.asarray(lngs, dtype=float)
+        result = np.full(len(lats), NO_ZONE, dtype=np.int64)
+        if not len(self) or not len(lats):
+            return result
+        points = shapely.points(lngs, lats)
+        point_idx, zone_idx = self._matches(points)
+        if len(point_idx):
+            # Largest first so that the smallest zone is written last for each point
+            order = np.argsort(-self.areas[zone_idx], kind='stable')
+            result[point_idx[order]] = self.zone_ids[zone_idx[order]]
+        return result
+
+    def _matches(self, points):
+        """(point, zone) index pairs: STRtree bounding-box candidates, then covers() on the prepared polygons."""
+        point_idx, zone_idx = self.tree.query(points)
+        inside = shapely.covers(self.boundaries[zone_idx], points[point_idx])
+        return point_idx[inside], zone_idx[inside]
+
+    def zones_containing(self, lat, lng):
+        """Ids of every zone containing the point, smallest first."""
+        if not len(self):
+            return []
+        _, hits = self._matches(np.array([shapely.Point(lng, lat)], dtype=object))
+        hits = sorted(hits.tolist(), key=lambda i: self.areas[i])
+        return [int(self.zone_ids[i]) for i in hits]
+
+    def zone_for_point(self, lat, lng):
+        zones = self.zones_containing(lat, lng)
+        return zones[0] if zones else None
+
+
+_index = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def zones_stamp():
+    """(count, latest updated_at) of the active zones; changes whenever a zone does."""
+    from .models import Zone
+    stats = Zone.objects.filter(is_active=True).aggregate(count=Count('pk'), latest=Max('updated_at'))
+    return stats['count'], stats['latest']
+
+
+def get_zone_index():
+    """The process-wide index of active zones, rebuilt when zones have changed."""
+    global _index, _checked_at
+    with _lock:
+        now = time.monotonic()
+        if _index is not None and now - _checked_at < REVALIDATE_SECONDS:
+            return _index
+        stamp = zones_stamp()
+        if _index is None or _index.stamp != stamp:
+            from .models import Zone
+            _index = ZoneIndex.from_zones(
+                Zone.objects.filter(is_active=True).values_list('zone_id', 'boundary'), stamp
+            )
+        _checked_at = now
+        return _index
+
+
+def invalidate():
+    """Drop the cached index; the next lookup rebuilds it."""
+    global _index
+    with _lock:
+        _index = None
+
+
+def zone_for_point(lat, lng):
+    """Id of the (smallest) active zone containing the point, or None."""
+    return get_zone_index().zone_for_point(lat, lng)
+
+
+def zone_for_location(location):
+    """zone_for_point for a GEOS Point (x = lng, y = lat); None when there is no location."""
+    return zone_for_point(location.y, location.x) if location else None
+
+
+def lookup(lats, lngs):
+    """Vectorized zone_for_point: an array of zone ids, NO_ZONE where no zone matches."""
+    return get_zone_index().lookup(lats, lngs)
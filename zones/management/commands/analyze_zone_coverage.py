@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from zones.coverage import coverage_report, refresh_overlaps
+
+
+class Command(BaseCommand):
+    help = "Recompute overlaps between all active zones and report gaps and uncovered request locations."
+
+    def handle(self, *args, **options):
+        stored = refresh_overlaps()
+        report = coverage_report()
+        uncovered = report['uncovered']
+        self.stdout.write(f"Zones: {report['zones']}")
+        self.stdout.write(f"Overlapping pairs: {stored}")
+        for overlap in report['overlaps'][:20]:
+            self.stdout.write(f"  {overlap['zone_a']} / {overlap['zone_b']}: {overlap['area_km2']} km²")
+        self.stdout.write(f"Gaps: {len(report['gaps'])} ({sum(g['area_km2'] for g in report['gaps']):.3f} km²)")
+        self.stdout.write(
+            f"Uncovered: {uncovered['on_demand_requests']} on-demand and "
+            f"{uncovered['scheduled_requests']} scheduled requests from {uncovered['clients']} clients"
+        )
+        self.stdout.write(self.style.SUCCESS("Coverage analysis done."))
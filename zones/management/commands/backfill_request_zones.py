@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from on_demand.models import OnDemandRequest
+from scheduled_request.models import ScheduledRequest
+from zones.services import BACKFILL_BATCH_SIZE, assign_zones_batch
+
+
+class Command(BaseCommand):
+    help = "Resolve the zone of on-demand and scheduled requests from their location, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE,
+                            help=f"Rows per spatial join (default {BACKFILL_BATCH_SIZE}).")
+        parser.add_argument('--all', action='store_true',
+                            help="Recompute every row, not only rows without a zone (e.g. after zones were redrawn).")
+
+    def handle(self, *args, **options):
+        for model in (OnDemandRequest, ScheduledRequest):
+            after_pk, total = 0, 0
+            while True:
+                after_pk, updated = assign_zones_batch(
+                    model, after_pk, options['batch_size'], only_missing=not options['all']
+                )
+                if after_pk is None:
+                    break
+                total += updated
+                self.stdout.write(f"{model._meta.verbose_name}: up to #{after_pk}, {total} updated")
+            self.stdout.write(self.style.SUCCESS(f"Updated the zone of {total} {model._meta.verbose_name_plural}."))
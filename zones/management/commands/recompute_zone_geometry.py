@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from zones.models import BOUNDARY_BANDS, PROJECTION_FIELDS, Zone
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored projected center, area and simplified boundaries of every zone."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Zones per bulk update (default 500).")
+        parser.add_argument('--missing', action='store_true', help="Only zones that have no projection yet.")
+
+    def handle(self, *args, **options):
+        zones = Zone.objects.exclude(boundary__isnull=True).order_by('pk')
+        if options['missing']:
+            zones = zones.filter(utm_srid__isnull=True)
+        fields = list(PROJECTION_FIELDS) + [field for _, field in BOUNDARY_BANDS]
+
+        batch, count = [], 0
+        for zone in zones.iterator(chunk_size=options['batch_size']):
+            zone.compute_projection()
+            zone.simplify_boundary()
+            batch.append(zone)
+            if len(batch) >= options['batch_size']:
+                Zone.objects.bulk_update(batch, fields)
+                count += len(batch)
+                batch = []
+        if batch:
+            Zone.objects.bulk_update(batch, fields)
+            count += len(batch)
+        self.stdout.write(self.style.SUCCESS(f"Recomputed {count} zones."))
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-16 14:40
+
+from django.db import migrations, models
+
+
+def build_paths(apps, schema_editor):
+    Zone = apps.get_model('zones', 'Zone')
+    parents = dict(Zone.objects.values_list('zone_id', 'parent_zone_id'))
+    paths = {}
+
+    def path_of(zone_id, seen=()):
+        if zone_id not in paths:
+            parent_id = parents.get(zone_id)
+            if parent_id is None or parent_id in seen:
+                paths[zone_id] = f'{zone_id}/'
+            else:
+                paths[zone_id] = path_of(parent_id, seen + (zone_id,)) + f'{zone_id}/'
+        return paths[zone_id]
+
+    zones = list(Zone.objects.only('zone_id'))
+    for zone in zones:
+        zone.path = path_of(zone.zone_id)
+        zone.depth = zone.path.count('/') - 1
+    Zone.objects.bulk_update(zones, ['path', 'depth'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zones', '0003_alter_zone_center_point'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='zone',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='zone',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(build_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-16 15:20
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+
+BANDS = ((9, 'boundary_z9'), (13, 'boundary_z13'))
+
+
+def simplify_boundaries(apps, schema_editor):
+    Zone = apps.get_model('zones', 'Zone')
+    zones = list(Zone.objects.exclude(boundary__isnull=True))
+    for zone in zones:
+        for zoom, field in BANDS:
+            simplified = zone.boundary.simplify(360.0 / (256 * 2 ** zoom), preserve_topology=True)
+            if simplified.geom_type != 'Polygon' or simplified.empty:
+                simplified = zone.boundary
+            simplified.srid = zone.boundary.srid
+            setattr(zone, field, simplified)
+    Zone.objects.bulk_update(zones, [field for _, field in BANDS], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zones', '0004_zone_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='zone',
+            name='boundary_z9',
+            field=django.contrib.gis.db.models.fields.PolygonField(blank=True, editable=False, null=True, spatial_index=False, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='zone',
+            name='boundary_z13',
+            field=django.contrib.gis.db.models.fields.PolygonField(blank=True, editable=False, null=True, spatial_index=False, srid=4326),
+        ),
+        migrations.RunPython(simplify_boundaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-16 15:55
+
+from django.db import migrations, models
+
+
+def compute_projections(apps, schema_editor):
+    from zones.projection import zone_projection
+
+    Zone = apps.get_model('zones', 'Zone')
+    zones = list(Zone.objects.exclude(boundary__isnull=True))
+    for zone in zones:
+        zone.utm_srid, zone.center_easting, zone.center_northing, zone.area_km2 = (
+            zone_projection(zone.boundary, zone.center_point)
+        )
+    Zone.objects.bulk_update(zones, ['utm_srid', 'center_easting', 'center_northing', 'area_km2'], batch_size=500)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zones', '0005_zone_simplified_boundaries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='zone',
+            name='utm_srid',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='zone',
+            name='center_easting',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='zone',
+            name='center_northing',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='zone',
+            name='area_km2',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(compute_projections, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-16 16:30
+
+import django.contrib.gis.db.models.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zones', '0006_zone_projection'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ZoneOverlap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('overlap', django.contrib.gis.db.models.fields.GeometryField(srid=4326)),
+                ('area_km2', models.FloatField()),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('zone_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='zones.zone')),
+                ('zone_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='zones.zone')),
+            ],
+            options={
+                'ordering': ['-area_km2'],
+                'constraints': [models.UniqueConstraint(fields=('zone_a', 'zone_b'), name='unique_zone_overlap')],
+            },
+        ),
+    ]
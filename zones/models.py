@@ -1,6 +1,58 @@
+import math
+
 from django.contrib.gis.db import models as gis_models
 from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
+from . import projection
+
+
+PATH_SEPARATOR = '/'
+
+# Boundaries pre-simplified for map overviews: (highest zoom served, field).
+# Each is simplified to about one screen pixel at that zoom; above the last
+# band the full boundary is used.
+BOUNDARY_BANDS = (
+    (9, 'boundary_z9'),
+    (13, 'boundary_z13'),
+)
+
+
+PROJECTION_FIELDS = ('utm_srid', 'center_easting', 'center_northing', 'area_km2')
+
+
+def pixel_degrees(zoom):
+    """Width of one 256px-tile pixel at `zoom`, in degrees of longitude."""
+    return 360.0 / (256 * 2 ** zoom)
+
+
+class ZoneQuerySet(models.QuerySet):
+    def descendants_of(self, zone, include_self=False):
+        """Every zone below `zone` in the hierarchy, at any depth (one indexed prefix match)."""
+        queryset = self.filter(path__startswith=zone.path)
+        return queryset if include_self else queryset.exclude(pk=zone.pk)
+
+    def ancestors_of(self, point):
+        """
+        The chain of zones containing `point` (a GEOS Point, srid 4326), from
+        the top-level zone down to the deepest one.
+        """
+        path = (
+            self.filter(boundary__contains=point)
+            .order_by('-depth')
+            .values_list('path', flat=True)
+            .first()
+        )
+        if not path:
+            return self.none()
+        return self.filter(pk__in=path_ids(path)).order_by('depth')
+
+
+def path_ids(path):
+    """Zone ids along a materialized path, root first."""
+    return [int(part) for part in path.split(PATH_SEPARATOR) if part]
 
 
 class Zone(models.Model):
@@ -35,6 +87,9 @@ class Zone(models.Model):
         blank=True,
         related_name='sub_zones'
     )
+    # Materialized path of zone ids from the root, e.g. "3/17/42/"; maintained by save()
+    path = models.CharField(max_length=255, blank=True, editable=False, db_index=True)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
 
     # Zone characteristics
     ZONE_TYPE_CHOICES = [
@@ -55,12 +110,22 @@ class Zone(models.Model):
         help_text="Polygon defining zone boundaries (GeoJSON/WKT)"
     )
 
+    # Simplified copies of boundary (see BOUNDARY_BANDS), maintained by save()
+    boundary_z9 = gis_models.PolygonField(null=True, blank=True, editable=False, spatial_index=False)
+    boundary_z13 = gis_models.PolygonField(null=True, blank=True, editable=False, spatial_index=False)
+
     center_point = gis_models.PointField(
         null=False,
         blank=True,
         help_text="Center point of zone (auto-calculated if not provided)"
     )
 
+    # Center in the UTM zone of the centroid, and the area measured there; maintained by save()
+    utm_srid = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    center_easting = models.FloatField(null=True, blank=True, editable=False)
+    center_northing = models.FloatField(null=True, blank=True, editable=False)
+    area_km2 = models.FloatField(null=True, blank=True, editable=False)
+
     # Optional circular radius
     radius_meters = models.FloatField(
         null=True,
@@ -120,22 +185,84 @@ class Zone(models.Model):
         ]
         # Spatial index is automatically created in GIS models
 
+    objects = ZoneQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.zone_code} - {self.name}"
 
     def save(self, *args, **kwargs):
-        """Auto-calculate center_point if not provided."""
+        """
+        Auto-calculate center_point if not provided, refresh the simplified
+        boundaries and the projected center and area, and keep the materialized path in sync.
+        """
         if not self.center_point and self.boundary:
             self.center_point = self.boundary.centroid
+        self.simplify_boundary()
+        self.compute_projection()
+
+        parent = self.parent_zone if self.parent_zone_id else None
+        if parent and self.pk and (parent.pk == self.pk or self.pk in path_ids(parent.path)):
+            raise ValidationError("A zone cannot be nested under itself or one of its sub-zones.")
+        parent_path = parent.path if parent else ''
+        depth = parent.depth + 1 if parent else 0
+
+        if self.pk is None:
+            super().save(*args, **kwargs)
+            self.path, self.depth = f'{parent_path}{self.pk}{PATH_SEPARATOR}', depth
+            Zone.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+            return
+
+        old_path, old_depth = (
+            Zone.objects.filter(pk=self.pk).values_list('path', 'depth').first() or ('', 0)
+        )
+        self.path, self.depth = f'{parent_path}{self.pk}{PATH_SEPARATOR}', depth
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'path', 'depth'}
+            if 'boundary' in kwargs['update_fields']:
+                kwargs['update_fields'] |= {field for _, field in BOUNDARY_BANDS}
+            if kwargs['update_fields'] & {'boundary', 'center_point'}:
+                kwargs['update_fields'] |= set(PROJECTION_FIELDS)
         super().save(*args, **kwargs)
+        if old_path and old_path != self.path:
+            # Re-parented: move the whole subtree in one statement
+            Zone.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                path=Concat(Value(self.path), Substr('path', len(old_path) + 1)),
+                depth=F('depth') + (self.depth - old_depth),
+            )
+
+    def simplify_boundary(self):
+        """Recompute the per-zoom-band simplified boundaries (Douglas-Peucker, topology preserved)."""
+        for zoom, field in BOUNDARY_BANDS:
+            simplified = None
+            if self.boundary:
+                simplified = self.boundary.simplify(pixel_degrees(zoom), preserve_topology=True)
+                if simplified.geom_type != 'Polygon' or simplified.empty:
+                    simplified = self.boundary
+                simplified.srid = self.boundary.srid
+            setattr(self, field, simplified)
+
+    def get_ancestors(self):
+        """Zones above this one, root first."""
+        return Zone.objects.filter(pk__in=path_ids(self.path)[:-1]).order_by('depth')
+
+    def get_descendants(self):
+        return Zone.objects.descendants_of(self)
+
+    def compute_projection(self):
+        """
+        Project boundary and center into the UTM zone of the centroid and store
+        the center with the area, so area and distance lookups need no
+        reprojection.
+        """
+        self.utm_srid, self.center_easting, self.center_northing, self.area_km2 = (
+            projection.zone_projection(self.boundary, self.center_point)
+        )
 
     def get_area_km2(self):
         """Calculate area in square kilometers."""
-        if self.boundary:
-            boundary_transformed = self.boundary.transform(32630, clone=True)
-            area_m2 = boundary_transformed.area
-            return round(area_m2 / 1_000_000, 2)
-        return 0
+        if self.boundary and self.area_km2 is None:
+            self.compute_projection()
+        return round(self.area_km2, 2) if self.area_km2 is not None else 0
 
     def contains_point(self, latitude, longitude):
         """Check if latitude/longitude is inside the zone."""
@@ -146,9 +273,32 @@ class Zone(models.Model):
     def distance_to_point(self, latitude, longitude):
         """Distance in meters from zone center to a point."""
         from django.contrib.gis.geos import Point
-        if self.center_point:
-            point = Point(longitude, latitude, srid=4326)
-            center_t = self.center_point.transform(32630, clone=True)
-            point_t = point.transform(32630, clone=True)
-            return round(center_t.distance(point_t), 2)
-        return None
+        if not self.center_point:
+            return None
+        if self.center_easting is None and self.boundary:
+            self.compute_projection()
+        if self.center_easting is None:
+            return None
+        point = projection.project(Point(longitude, latitude, srid=4326), self.utm_srid)
+        return round(math.hypot(point.x - self.center_easting, point.y - self.center_northing), 2)
+
+
+class ZoneOverlap(models.Model):
+    """
+    Area shared by two active zones (zone_a_id < zone_b_id), kept current by
+    zones.coverage whenever either zone is saved or deleted.
+    """
+    zone_a = models.ForeignKey(Zone, on_delete=models.CASCADE, related_name='+')
+    zone_b = models.ForeignKey(Zone, on_delete=models.CASCADE, related_name='+')
+    overlap = gis_models.GeometryField(srid=4326)
+    area_km2 = models.FloatField()
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-area_km2']
+        constraints = [
+            models.UniqueConstraint(fields=['zone_a', 'zone_b'], name='unique_zone_overlap'),
+        ]
+
+    def __str__(self):
+        return f"{self.zone_a_id} / {self.zone_b_id}: {self.area_km2:.3f} km²"
@@ -0,0 +1,218 @@
+"""
+Minimal Mapbox Vector Tile (v2) encoder.
+
+Used when the database cannot build tiles itself (ST_AsMVT needs PostGIS).
+Geometries are shapely objects in Web Mercator metres; they are clipped to
+the tile (plus a buffer), scaled to the tile's integer grid and written as
+protobuf by hand, so no protobuf or vector tile package is required.
+"""
+import math
+import struct
+
+import shapely
+from shapely.geometry import Polygon
+from shapely.geometry.polygon import orient
+
+EXTENT = 4096
+BUFFER = 64
+
+# Web Mercator
+ORIGIN_SHIFT = math.pi * 6378137.0
+
+GEOM_POINT, GEOM_LINESTRING, GEOM_POLYGON = 1, 2, 3
+CMD_MOVE_TO, CMD_LINE_TO, CMD_CLOSE_PATH = 1, 2, 7
+
+
+def tile_bounds(z, x, y):
+    """(minx, miny, maxx, maxy) of tile z/x/y in Web Mercator metres."""
+    size = 2 * ORIGIN_SHIFT / (2 ** z)
+    minx = -ORIGIN_SHIFT + x * size
+    maxy = ORIGIN_SHIFT - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def lnglat_to_mercator(lngs, lats):
+    lats = [max(min(lat, 85.0511287798), -85.0511287798) for lat in lats]
+    xs = [lng * ORIGIN_SHIFT / 180.0 for lng in lngs]
+    ys = [math.log(math.tan((90 + lat) * math.pi / 360.0)) * 6378137.0 for lat in lats]
+    return xs, ys
+
+
+def tile_bounds_lnglat(z, x, y):
+    """(west, south, east, north) of tile z/x/y in degrees."""
+    n = 2 ** z
+    west = x / n * 360.0 - 180.0
+    east = (x + 1) / n * 360.0 - 180.0
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return west, south, east, north
+
+
+# ---------------------------
+# protobuf primitives
+# ---------------------------
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        bits = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(bits | 0x80)
+        else:
+            out.append(bits)
+            return bytes(out)
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 31)
+
+
+def _key(field, wire_type):
+    return _varint((field << 3) | wire_type)
+
+
+def _bytes_field(field, payload):
+    return _key(field, 2) + _varint(len(payload)) + payload
+
+
+def _varint_field(field, value):
+    return _key(field, 0) + _varint(value)
+
+
+def _packed(field, values):
+    return _bytes_field(field, b''.join(_varint(v) for v in values))
+
+
+def _value(value):
+    """A Layer.Value message."""
+    if isinstance(value, bool):
+        return _varint_field(7, int(value))
+    if isinstance(value, int):
+        return _key(6, 0) + _varint(((value << 1) ^ (value >> 63)) & 0xFFFFFFFFFFFFFFFF)
+    if isinstance(value, float):
+        return _key(3, 1) + struct.pack('<d', value)
+    return _bytes_field(1, str(value).encode('utf-8'))
+
+
+# ---------------------------
+# geometry
+# ---------------------------
+
+def _to_tile_grid(geom, bounds, extent):
+    minx, miny, maxx, maxy = bounds
+    sx = extent / (maxx - minx)
+    sy = extent / (maxy - miny)
+
+    def scale(coords):
+        coords = coords.copy()
+        coords[:, 0] = (coords[:, 0] - minx) * sx
+        coords[:, 1] = (maxy - coords[:, 1]) * sy
+        return coords.round()
+
+    return shapely.transform(geom, scale)
+
+
+class _Cursor:
+    def __init__(self):
+        self.x = self.y = 0
+        self.commands = []
+
+    def move(self, coords, command):
+        self.commands.append((len(coords) << 3) | command)
+        for x, y in coords:
+            x, y = int(x), int(y)
+            self.commands.append(_zigzag(x - self.x))
+            self.commands.append(_zigzag(y - self.y))
+            self.x, self.y = x, y
+
+
+def _dedupe(coords):
+    out = []
+    for point in coords:
+        if not out or point != out[-1]:
+            out.append(point)
+    return out
+
+
+def _ring(cursor, ring):
+    coords = _dedupe(list(ring.coords)[:-1])
+    if len(coords) < 3:
+        return
+    cursor.move(coords[:1], CMD_MOVE_TO)
+    cursor.move(coords[1:], CMD_LINE_TO)
+    cursor.commands.append((1 << 3) | CMD_CLOSE_PATH)
+
+
+def _geometry(geom):
+    """(feature type, command integers) for a geometry on the tile grid; None if nothing is left."""
+    cursor = _Cursor()
+    if geom.geom_type in ('Point', 'MultiPoint'):
+        points = _dedupe([(p.x, p.y) for p in getattr(geom, 'geoms', [geom])])
+        if points:
+            cursor.move(points, CMD_MOVE_TO)
+        kind = GEOM_POINT
+    elif geom.geom_type in ('LineString', 'MultiLineString'):
+        for line in getattr(geom, 'geoms', [geom]):
+            coords = _dedupe(list(line.coords))
+            if len(coords) > 1:
+                cursor.move(coords[:1], CMD_MOVE_TO)
+                cursor.move(coords[1:], CMD_LINE_TO)
+        kind = GEOM_LINESTRING
+    elif geom.geom_type in ('Polygon', 'MultiPolygon'):
+        for polygon in getattr(geom, 'geoms', [geom]):
+            # Exterior rings have positive surveyor's-formula area in tile coordinates
+            # (clockwise on screen, since tile y points down); holes the opposite
+            polygon = orient(Polygon(polygon.exterior, polygon.interiors), sign=1.0)
+            _ring(cursor, polygon.exterior)
+            for interior in polygon.interiors:
+                _ring(cursor, interior)
+        kind = GEOM_POLYGON
+    else:
+        return None
+    return (kind, cursor.commands) if cursor.commands else None
+
+
+def encode_layer(name, features, bounds, extent=EXTENT, buffer=BUFFER):
+    """
+    One Tile.layers entry. `features` are (id, geometry in Web Mercator,
+    {property: value}); `bounds` is the tile's Mercator box from tile_bounds().
+    Returns b'' when no feature falls inside the tile.
+    """
+    minx, miny, maxx, maxy = bounds
+    pad = (maxx - minx) * buffer / extent
+    clip = (minx - pad, miny - pad, maxx + pad, maxy + pad)
+
+    keys, values = {}, {}
+    encoded = []
+    for feature_id, geom, properties in features:
+        if geom is None or geom.is_empty:
+            continue
+        if geom.geom_type not in ('Point', 'MultiPoint'):
+            geom = shapely.clip_by_rect(geom, *clip)
+            if geom.is_empty:
+                continue
+        parts = _geometry(_to_tile_grid(geom, bounds, extent))
+        if parts is None:
+            continue
+        kind, commands = parts
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault((type(value).__name__, value), len(values)))
+        message = b''
+        if feature_id is not None:
+            message += _varint_field(1, int(feature_id))
+        message += _packed(2, tags) + _varint_field(3, kind) + _packed(4, commands)
+        encoded.append(message)
+
+    if not encoded:
+        return b''
+    layer = _varint_field(15, 2) + _bytes_field(1, name.encode('utf-8'))
+    layer += b''.join(_bytes_field(2, feature) for feature in encoded)
+    layer += b''.join(_bytes_field(3, key.encode('utf-8')) for key in keys)
+    layer += b''.join(_bytes_field(4, _value(value)) for _, value in values)
+    layer += _varint_field(5, extent)
+    return _bytes_field(3, layer)
@@ -0,0 +1,19 @@
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from .services import InvalidPoints, MAX_BATCH_POINTS, POINT_DTYPE, points_from_buffer
+
+
+class PointArrayParser(BaseParser):
+    """Binary (lat, lng) float64 pairs, e.g. numpy.asarray(pairs, '<f8').tobytes()."""
+    media_type = 'application/octet-stream'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        limit = MAX_BATCH_POINTS * 2 * POINT_DTYPE.itemsize
+        data = stream.read(limit + 1) if stream is not None else b''
+        if len(data) > limit:
+            raise ParseError(f'at most {MAX_BATCH_POINTS} points per request')
+        try:
+            return points_from_buffer(data)
+        except InvalidPoints as exc:
+            raise ParseError(str(exc))
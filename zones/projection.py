@@ -0,0 +1,54 @@
+"""
+Local metric projections for zones.
+
+Each zone is projected once, on save, into the WGS 84 / UTM zone that
+contains its centroid, so areas and distances come out in metres without
+reprojecting on every call.
+"""
+from django.contrib.gis.gdal import CoordTransform, SpatialReference
+
+
+WGS84_SRID = 4326
+_transforms = {}
+
+
+def utm_srid(lng, lat):
+    """EPSG code of the WGS 84 / UTM zone containing (lng, lat): 326xx north, 327xx south."""
+    zone = min(max(int((lng + 180) // 6) + 1, 1), 60)
+    return (32600 if lat >= 0 else 32700) + zone
+
+
+def to_srid(srid):
+    """Cached WGS 84 -> `srid` CoordTransform."""
+    transform = _transforms.get(srid)
+    if transform is None:
+        transform = _transforms[srid] = CoordTransform(SpatialReference(WGS84_SRID), SpatialReference(srid))
+    return transform
+
+
+def project(geometry, srid):
+    """Copy of a WGS 84 GEOS geometry in `srid`."""
+    projected = geometry.clone()
+    if projected.srid is None:
+        projected.srid = WGS84_SRID
+    projected.transform(to_srid(srid))
+    return projected
+
+
+def zone_projection(boundary, center):
+    """
+    (utm_srid, center easting, center northing, area in km²) for a zone's
+    WGS 84 boundary and center point, in the UTM zone of the boundary's
+    centroid; the center is None when the zone has no center point. Shared
+    by Zone.compute_projection() and the migration that backfills existing
+    zones.
+    """
+    if not boundary:
+        return None, None, None, None
+    centroid = boundary.centroid
+    srid = utm_srid(centroid.x, centroid.y)
+    easting = northing = None
+    if center:
+        projected_center = project(center, srid)
+        easting, northing = projected_center.x, projected_center.y
+    return srid, easting, northing, project(boundary, srid).area / 1_000_000
@@ -0,0 +1,87 @@
+"""
+Zone rollups over the materialized path.
+
+Everything below a zone shares its path prefix, so each metric is one
+query filtered with `zone__path__startswith` and grouped by the zone path;
+the per-zone rows are then folded into the zone and its direct sub-zones.
+"""
+from django.db.models import Count
+
+from on_demand.models import OnDemandRequest
+from routes.models import RouteStop
+from scheduled_request.models import ScheduledRequest
+from .models import path_ids
+
+
+def _request_counts(model, zone, date_from, date_to):
+    queryset = model.objects.filter(zone__path__startswith=zone.path)
+    if date_from:
+        queryset = queryset.filter(pickup_date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(pickup_date__lte=date_to)
+    counts = queryset.values_list('zone__path').annotate(count=Count('pk'))
+    collectors = queryset.filter(collector__isnull=False).values_list('zone__path', 'collector_id').distinct()
+    return list(counts), list(collectors)
+
+
+def _route_links(zone, date_from, date_to):
+    """Distinct (zone path, route id, collector id) for route stops on requests in the subtree."""
+    links = set()
+    for link in ('ondemand_request', 'scheduled_request'):
+        stops = RouteStop.objects.filter(**{f'{link}__zone__path__startswith': zone.path})
+        if date_from:
+            stops = stops.filter(route__route_date__gte=date_from)
+        if date_to:
+            stops = stops.filter(route__route_date__lte=date_to)
+        links.update(stops.values_list(f'{link}__zone__path', 'route_id', 'route__collector_id').distinct())
+    return links
+
+
+def zone_rollup(zone, date_from=None, date_to=None):
+    """
+    Request, route and collector totals for `zone` and for each of its direct
+    sub-zones, each total covering the whole subtree below it. Optional dates
+    bound the pickup date (requests) and route date (routes).
+    """
+    sub_zones = list(zone.sub_zones.order_by('name'))
+    totals = {
+        zone_id: {'on_demand_requests': 0, 'scheduled_requests': 0, 'routes': set(), 'collectors': set()}
+        for zone_id in [zone.zone_id] + [sub.zone_id for sub in sub_zones]
+    }
+
+    def targets(path):
+        """The zone itself, plus the direct sub-zone the path runs through (if any)."""
+        ids = path_ids(path)
+        child = ids[zone.depth + 1] if len(ids) > zone.depth + 1 else None
+        return [zone.zone_id] + ([child] if child in totals else [])
+
+    for model, key in ((OnDemandRequest, 'on_demand_requests'), (ScheduledRequest, 'scheduled_requests')):
+        counts, collectors = _request_counts(model, zone, date_from, date_to)
+        for path, count in counts:
+            for target in targets(path):
+                totals[target][key] += count
+        for path, collector_id in collectors:
+            for target in targets(path):
+                totals[target]['collectors'].add(collector_id)
+
+    for path, route_id, collector_id in _route_links(zone, date_from, date_to):
+        for target in targets(path):
+            totals[target]['routes'].add(route_id)
+            totals[target]['collectors'].add(collector_id)
+
+    def row(z):
+        data = totals[z.zone_id]
+        return {
+            'zone_id': z.zone_id,
+            'zone_code': z.zone_code,
+            'name': z.name,
+            'depth': z.depth,
+            'on_demand_requests': data['on_demand_requests'],
+            'scheduled_requests': data['scheduled_requests'],
+            'routes': len(data['routes']),
+            'collectors': len(data['collectors']),
+        }
+
+    result = row(zone)
+    result['sub_zones'] = [row(sub) for sub in sub_zones]
+    return result
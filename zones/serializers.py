@@ -1,6 +1,96 @@
+import math
+
+import numpy as np
+from rest_framework import serializers
+from rest_framework_gis.fields import GeometryField, GeoJsonDict
 from rest_framework_gis.serializers import GeoFeatureModelSerializer
 from django.contrib.gis.geos import Polygon
-from .models import Zone
+from .models import BOUNDARY_BANDS, Zone, path_ids, pixel_degrees
+
+MAX_ZOOM = 22
+MAX_PRECISION = 15
+BOUNDARY_FIELDS = ['boundary'] + [field for _, field in BOUNDARY_BANDS]
+
+
+def boundary_options(query_params):
+    """
+    Serializer context choosing how ZoneListSerializer renders `boundary`, from
+    ?zoom= (map zoom level), ?simplify= (tolerance in degrees) and ?precision=
+    (decimal places). Zoom picks the pre-simplified band for that zoom and a
+    matching precision; simplify starts from the coarsest band that is still
+    finer than the tolerance.
+    """
+    options = {}
+    zoom = _number(query_params, 'zoom', int, 0, MAX_ZOOM)
+    tolerance = _number(query_params, 'simplify', float, 0, 1)
+    precision = _number(query_params, 'precision', int, 0, MAX_PRECISION)
+
+    if zoom is not None:
+        options['boundary_field'] = next(
+            (field for max_zoom, field in BOUNDARY_BANDS if zoom <= max_zoom), 'boundary'
+        )
+        # Enough decimals to resolve one pixel at this zoom
+        options['precision'] = max(0, math.ceil(-math.log10(pixel_degrees(zoom))))
+    if tolerance:
+        bands = [(pixel_degrees(z), field) for z, field in BOUNDARY_BANDS if pixel_degrees(z) <= tolerance]
+        options['boundary_field'] = max(bands)[1] if bands else 'boundary'
+        options['simplify'] = tolerance
+    if precision is not None:
+        options['precision'] = precision
+    return options
+
+
+def unused_boundary_fields(options):
+    """Geometry columns a response with these options never reads (for queryset.defer())."""
+    used = options.get('boundary_field', 'boundary')
+    return [field for field in BOUNDARY_FIELDS if field != used]
+
+
+def _number(query_params, name, cast, low, high):
+    value = query_params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        value = cast(value)
+    except ValueError:
+        raise serializers.ValidationError({name: f"Must be a number between {low} and {high}."})
+    if not low <= value <= high:
+        raise serializers.ValidationError({name: f"Must be a number between {low} and {high}."})
+    return value
+
+
+class ZoneBoundaryField(GeometryField):
+    """Zone boundary, or a simplified copy of it, as chosen by boundary_options() in the context."""
+
+    def get_attribute(self, instance):
+        geometry = getattr(instance, self.context.get('boundary_field', 'boundary')) or instance.boundary
+        tolerance = self.context.get('simplify')
+        if geometry and tolerance:
+            geometry = geometry.simplify(tolerance, preserve_topology=True)
+        return geometry
+
+    def to_representation(self, value):
+        # The field instance is shared between requests, so precision is never stored on it
+        precision = self.context.get('precision')
+        if value is None or precision is None:
+            return super().to_representation(value)
+        if value.geom_type != 'Polygon':
+            geojson = super().to_representation(value)
+            geometries = geojson['geometries'] if geojson['type'] == 'GeometryCollection' else [geojson]
+            for geometry in geometries:
+                geometry['coordinates'] = self._recursive_round(geometry['coordinates'], precision)
+            return geojson
+        rings = []
+        for i, ring in enumerate(value):
+            coords = np.round(np.asarray(ring.coords), precision)
+            # Drop points that became duplicates after rounding
+            coords = coords[np.r_[True, (np.diff(coords, axis=0) != 0).any(axis=1)]]
+            if len(coords) >= 4:
+                rings.append(coords.tolist())
+            elif i == 0:
+                # The shell collapsed at this precision; only holes may be dropped, so serve it exact
+                return super().to_representation(value)
+        return GeoJsonDict({"type": "Polygon", "coordinates": rings})
 
 class ZoneCreateSerializer(GeoFeatureModelSerializer):
     class Meta:
@@ -41,8 +131,16 @@ class ZoneUpdateSerializer(GeoFeatureModelSerializer):
             "is_active",
         ]
 
+    def validate_parent_zone(self, value):
+        zone = self.instance
+        if value and zone and (value.pk == zone.pk or zone.pk in path_ids(value.path)):
+            raise serializers.ValidationError("A zone cannot be nested under itself or one of its sub-zones.")
+        return value
+
 
 class ZoneListSerializer(GeoFeatureModelSerializer):
+    boundary = ZoneBoundaryField()
+
     class Meta:
         model = Zone
         geo_field = "boundary"
@@ -50,8 +148,10 @@ class ZoneListSerializer(GeoFeatureModelSerializer):
             "zone_id", "zone_code",
             "name", "description",
             "city", "district", "region",
+            "parent_zone", "depth",
             "zone_type",
             "center_point",
+            "area_km2",
             "radius_meters",
             "population_density",
             "estimated_households",
@@ -0,0 +1,137 @@
+"""
+Batch resolution of coordinates to zones.
+
+Points are resolved in one vectorized pass over the cached STRtree in
+zones.index, and the results are produced in chunks so a response can be
+streamed while it is encoded. Stored rows with a `location` and a `zone`
+foreign key are backfilled in the database with one spatial join per batch.
+"""
+import json
+
+import numpy as np
+from django.db import connection
+
+from . import index
+from .models import Zone
+
+
+MAX_BATCH_POINTS = 100_000
+STREAM_CHUNK_SIZE = 10_000
+
+# Binary bodies are little-endian float64 (lat, lng) pairs: numpy.asarray(pairs, '<f8').tobytes()
+POINT_DTYPE = np.dtype('<f8')
+ZONE_ID_DTYPE = np.dtype('<i8')
+
+
+class InvalidPoints(ValueError):
+    pass
+
+
+def points_from_pairs(pairs):
+    """(lats, lngs) arrays from a sequence of [lat, lng] pairs."""
+    try:
+        coords = np.asarray(pairs, dtype=float)
+    except (TypeError, ValueError):
+        raise InvalidPoints('points must be [lat, lng] number pairs')
+    if coords.size == 0:
+        return np.empty(0), np.empty(0)
+    if coords.ndim != 2 or coords.shape[1] != 2:
+        raise InvalidPoints('points must be [lat, lng] number pairs')
+    return _checked(coords[:, 0], coords[:, 1])
+
+
+def points_from_arrays(lats, lngs):
+    """(lats, lngs) arrays from parallel sequences of latitudes and longitudes."""
+    try:
+        lats = np.asarray(lats, dtype=float).ravel()
+        lngs = np.asarray(lngs, dtype=float).ravel()
+    except (TypeError, ValueError):
+        raise InvalidPoints('lats and lngs must be arrays of numbers')
+    if len(lats) != len(lngs):
+        raise InvalidPoints('lats and lngs must have the same length')
+    return _checked(lats, lngs)
+
+
+def points_from_buffer(data):
+    """(lats, lngs) arrays from a binary body of POINT_DTYPE (lat, lng) pairs."""
+    if len(data) % (2 * POINT_DTYPE.itemsize):
+        raise InvalidPoints(f'binary body must be {POINT_DTYPE.itemsize}-byte float (lat, lng) pairs')
+    coords = np.frombuffer(data, dtype=POINT_DTYPE).reshape(-1, 2)
+    return _checked(coords[:, 0], coords[:, 1])
+
+
+def _checked(lats, lngs):
+    if len(lats) > MAX_BATCH_POINTS:
+        raise InvalidPoints(f'at most {MAX_BATCH_POINTS} points per request')
+    if not (np.isfinite(lats).all() and np.isfinite(lngs).all()):
+        raise InvalidPoints('coordinates must be finite numbers')
+    if (np.abs(lats) > 90).any() or (np.abs(lngs) > 180).any():
+        raise InvalidPoints('coordinates out of range')
+    return lats, lngs
+
+
+def resolve_points(lats, lngs):
+    """Zone id for each point (index.NO_ZONE when outside every active zone)."""
+    if len(lats) > MAX_BATCH_POINTS:
+        raise InvalidPoints(f'at most {MAX_BATCH_POINTS} points per request')
+    return index.lookup(lats, lngs)
+
+
+def iter_json(zone_ids, chunk_size=STREAM_CHUNK_SIZE):
+    """Encode as {"count": n, "zone_ids": [...]} in chunks; points outside every zone are null."""
+    yield f'{{"count": {len(zone_ids)}, "zone_ids": ['
+    for start in range(0, len(zone_ids), chunk_size):
+        chunk = zone_ids[start:start + chunk_size].tolist()
+        body = json.dumps([None if z == index.NO_ZONE else z for z in chunk])[1:-1]
+        yield (',' if start else '') + body
+    yield ']}'
+
+
+def iter_binary(zone_ids, chunk_size=STREAM_CHUNK_SIZE):
+    """Encode as ZONE_ID_DTYPE values in chunks; points outside every zone are index.NO_ZONE."""
+    for start in range(0, len(zone_ids), chunk_size):
+        yield zone_ids[start:start + chunk_size].astype(ZONE_ID_DTYPE).tobytes()
+
+
+BACKFILL_BATCH_SIZE = 10_000
+
+
+def assign_zones_batch(model, after_pk=0, batch_size=BACKFILL_BATCH_SIZE, only_missing=True):
+    """
+    Set `zone` on the next `batch_size` rows of `model` with a location and pk
+    above `after_pk`, from one spatial join against the active zones (the
+    smallest zone wins where zones overlap; rows outside every zone get NULL).
+    Returns (last pk in the batch or None when done, rows whose zone changed).
+    """
+    table = connection.ops.quote_name(model._meta.db_table)
+    pk = connection.ops.quote_name(model._meta.pk.column)
+    zones = connection.ops.quote_name(Zone._meta.db_table)
+    missing = 'AND zone_id IS NULL' if only_missing else ''
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT max({pk}) FROM (
+                SELECT {pk} FROM {table}
+                WHERE {pk} > %s AND location IS NOT NULL {missing}
+                ORDER BY {pk} LIMIT %s
+            ) batch
+        """, [after_pk, batch_size])
+        last_pk = cursor.fetchone()[0]
+        if last_pk is None:
+            return None, 0
+
+        cursor.execute(f"""
+            UPDATE {table} AS r SET zone_id = matched.zone_id
+            FROM (
+                SELECT b.{pk} AS id, (
+                    SELECT z.zone_id FROM {zones} z
+                    WHERE z.is_active AND ST_Covers(z.boundary, b.location::geometry)
+                    ORDER BY ST_Area(z.boundary) LIMIT 1
+                ) AS zone_id
+                FROM {table} b
+                WHERE b.{pk} > %s AND b.{pk} <= %s AND b.location IS NOT NULL {missing.replace('zone_id', 'b.zone_id')}
+            ) matched
+            WHERE r.{pk} = matched.id AND r.zone_id IS DISTINCT FROM matched.zone_id
+        """, [after_pk, last_pk])
+        updated = cursor.rowcount
+    return last_pk, updated
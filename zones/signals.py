@@ -0,0 +1,43 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Substr
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Zone
+from . import index
+
+
+@receiver(post_save, sender=Zone)
+@receiver(post_delete, sender=Zone)
+def invalidate_zone_index(sender, instance, **kwargs):
+    # Other processes pick the change up on their next revalidation (zones.index)
+    index.invalidate()
+
+
+@receiver(post_save, sender=Zone)
+@receiver(post_delete, sender=Zone)
+def prune_zone_tiles(sender, instance, raw=False, **kwargs):
+    # After commit, so the current tile version already reflects the change
+    if raw:
+        return
+    from .tiles import prune_cache
+    transaction.on_commit(prune_cache)
+
+
+@receiver(post_delete, sender=Zone)
+def detach_sub_zones(sender, instance, **kwargs):
+    # parent_zone is SET_NULL, so the sub-zones become roots; trim their paths to match
+    if instance.path:
+        Zone.objects.filter(path__startswith=instance.path).update(
+            path=Substr('path', len(instance.path) + 1),
+            depth=F('depth') - (instance.depth + 1),
+        )
+
+
+@receiver(post_save, sender=Zone)
+def refresh_zone_overlaps(sender, instance, raw=False, **kwargs):
+    # Only the edited zone's pairs; after commit so the zone index sees the new boundary
+    if raw:
+        return
+    from .coverage import refresh_overlaps
+    transaction.on_commit(lambda: refresh_overlaps([instance.pk]))
@@ -0,0 +1,218 @@
+"""
+Vector tiles (MVT) for the supervisor map.
+
+A tile is the concatenation of up to three layers:
+- zones: active zone boundaries. Cached on disk under ZONE_TILE_CACHE_DIR,
+  keyed by the zones' (count, latest updated_at), so editing any zone
+  retires the whole cache at once; the retired versions are deleted once
+  the edit commits (prune_cache), never from the tile path.
+- requests: pending on-demand requests,
+- stops: today's route stops, at the linked request's location when there is one.
+The live layers are rendered on every request. On PostGIS each layer is one
+ST_AsMVT query; other databases use the pure-Python encoder in zones.mvt.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+import shapely
+from django.conf import settings
+from django.contrib.gis.geos import Polygon
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from on_demand.models import OnDemandRequest
+from routes.models import Route, RouteStop
+from scheduled_request.models import ScheduledRequest
+from . import mvt
+from .index import zones_stamp
+from .models import Zone
+
+
+MAX_ZOOM = 22
+
+
+def is_valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+# ---------------------------
+# PostGIS
+# ---------------------------
+
+_ENVELOPE = "ST_TileEnvelope(%(z)s, %(x)s, %(y)s)"
+
+LAYER_SQL = {
+    'zones': f"""
+        SELECT ST_AsMVT(t, 'zones', {mvt.EXTENT}, 'geom', 'zone_id') FROM (
+            SELECT z.zone_id, z.zone_code, z.name, z.zone_type,
+                   ST_AsMVTGeom(ST_Transform(z.boundary, 3857), {_ENVELOPE}, {mvt.EXTENT}, {mvt.BUFFER}, true) AS geom
+            FROM {Zone._meta.db_table} z
+            WHERE z.is_active AND z.boundary && ST_Transform({_ENVELOPE}, 4326)
+        ) t
+    """,
+    'requests': f"""
+        SELECT ST_AsMVT(t, 'requests', {mvt.EXTENT}, 'geom', 'request_id') FROM (
+            SELECT r.request_id, r.pickup_date::text AS pickup_date, r.pickup_time_slot, r.waste_type,
+                   ST_AsMVTGeom(ST_Transform(r.location::geometry, 3857), {_ENVELOPE}, {mvt.EXTENT}, {mvt.BUFFER}, true) AS geom
+            FROM {OnDemandRequest._meta.db_table} r
+            WHERE r.request_status = 'pending'
+              AND r.location && ST_Transform({_ENVELOPE}, 4326)::geography
+        ) t
+    """,
+    # Stops are placed like RouteStop.effective_location: the linked request's point first
+    'stops': f"""
+        SELECT ST_AsMVT(t, 'stops', {mvt.EXTENT}, 'geom', 'stop_id') FROM (
+            SELECT p.stop_id, p.route_id, p."order", p.status,
+                   ST_AsMVTGeom(ST_Transform(p.point, 3857), {_ENVELOPE}, {mvt.EXTENT}, {mvt.BUFFER}, true) AS geom
+            FROM (
+                SELECT s.stop_id, s.route_id, s."order", s.status,
+                       COALESCE(o.location::geometry, sr.location::geometry, s.location) AS point
+                FROM {RouteStop._meta.db_table} s
+                JOIN {Route._meta.db_table} rt ON rt.route_id = s.route_id
+                LEFT JOIN {OnDemandRequest._meta.db_table} o ON o.{OnDemandRequest._meta.pk.column} = s.ondemand_request_id
+                LEFT JOIN {ScheduledRequest._meta.db_table} sr ON sr.{ScheduledRequest._meta.pk.column} = s.scheduled_request_id
+                WHERE rt.route_date = %(today)s
+            ) p
+            WHERE p.point && ST_Transform({_ENVELOPE}, 4326)
+        ) t
+    """,
+}
+
+
+def _render_postgis(layer, z, x, y):
+    with connection.cursor() as cursor:
+        cursor.execute(LAYER_SQL[layer], {'z': z, 'x': x, 'y': y, 'today': timezone.now().date()})
+        row = cursor.fetchone()
+    return bytes(row[0]) if row and row[0] else b''
+
+
+# ---------------------------
+# Pure-Python fallback
+# ---------------------------
+
+def _mercator(geos):
+    geom = shapely.from_wkb(bytes(geos.wkb))
+    return shapely.transform(geom, _project)
+
+
+def _project(coords):
+    xs, ys = mvt.lnglat_to_mercator(coords[:, 0].tolist(), coords[:, 1].tolist())
+    coords = coords.copy()
+    coords[:, 0], coords[:, 1] = xs, ys
+    return coords
+
+
+def _features(layer, bbox):
+    if layer == 'zones':
+        for zone in Zone.objects.filter(is_active=True, boundary__bboverlaps=bbox).only(
+            'zone_id', 'zone_code', 'name', 'zone_type', 'boundary'
+        ):
+            yield zone.zone_id, _mercator(zone.boundary), {
+                'zone_id': zone.zone_id, 'zone_code': zone.zone_code, 'name': zone.name, 'zone_type': zone.zone_type,
+            }
+    elif layer == 'requests':
+        rows = OnDemandRequest.objects.filter(request_status='pending', location__intersects=bbox).values_list(
+            'request_id', 'pickup_date', 'pickup_time_slot', 'waste_type', 'location'
+        )
+        for request_id, pickup_date, slot, waste_type, location in rows:
+            yield request_id, _mercator(location), {
+                'request_id': request_id, 'pickup_date': str(pickup_date),
+                'pickup_time_slot': slot, 'waste_type': waste_type,
+            }
+    elif layer == 'stops':
+        on_tile = (
+            Q(ondemand_request__location__intersects=bbox) | Q(scheduled_request__location__intersects=bbox)
+            | Q(location__intersects=bbox)
+        )
+        rows = RouteStop.objects.filter(on_tile, route__route_date=timezone.now().date()).values_list(
+            'stop_id', 'route_id', 'order', 'status',
+            'ondemand_request__location', 'scheduled_request__location', 'location',
+        )
+        for stop_id, route_id, order, stop_status, *locations in rows:
+            location = next(point for point in locations if point)
+            if not bbox.intersects(location):
+                continue
+            yield stop_id, _mercator(location), {
+                'stop_id': stop_id, 'route_id': route_id, 'order': order, 'status': stop_status,
+            }
+
+
+def _render_python(layer, z, x, y):
+    bbox = Polygon.from_bbox(mvt.tile_bounds_lnglat(z, x, y))
+    bbox.srid = 4326
+    return mvt.encode_layer(layer, _features(layer, bbox), mvt.tile_bounds(z, x, y))
+
+
+def render_layer(layer, z, x, y):
+    if connection.vendor == 'postgresql':
+        return _render_postgis(layer, z, x, y)
+    return _render_python(layer, z, x, y)
+
+
+# ---------------------------
+# Disk cache for the zones layer
+# ---------------------------
+
+def cache_dir():
+    return getattr(settings, 'ZONE_TILE_CACHE_DIR', None)
+
+
+def _version():
+    count, latest = zones_stamp()
+    raw = f"{count}:{latest.isoformat() if latest else ''}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:12]
+
+
+def _cached_zones_layer(z, x, y):
+    root = cache_dir()
+    if not root:
+        return render_layer('zones', z, x, y)
+
+    version = _version()
+    path = os.path.join(root, version, str(z), str(x), f'{y}.mvt')
+    try:
+        with open(path, 'rb') as fh:
+            return fh.read()
+    except FileNotFoundError:
+        pass
+
+    data = render_layer('zones', z, x, y)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so concurrent readers never see a partial tile
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+    except FileNotFoundError:
+        # prune_cache() removed this version's directory under us; serve uncached
+        pass
+    return data
+
+
+def prune_cache():
+    """Remove every cached version but the current one. Run after zones change, not per tile."""
+    root = cache_dir()
+    if not root or not os.path.isdir(root):
+        return
+    version = _version()
+    for name in os.listdir(root):
+        if name != version:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def clear_cache():
+    root = cache_dir()
+    if root and os.path.isdir(root):
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def render_tile(z, x, y, live_layers=True):
+    """MVT bytes for tile z/x/y; `live_layers` adds the requests and stops layers."""
+    data = _cached_zones_layer(z, x, y)
+    if live_layers:
+        data += render_layer('requests', z, x, y) + render_layer('stops', z, x, y)
+    return data
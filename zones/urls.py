@@ -1,6 +1,8 @@
 from django.urls import path
 from .views import (
-    ZoneCreateView, ZoneUpdateView, ZoneListView, ZoneDetailView, PointInZoneView
+    ZoneCreateView, ZoneUpdateView, ZoneListView, ZoneDetailView, PointInZoneView,
+    BatchPointInZoneView, ZoneRollupView, ZoneTileView,
+    ZoneCoverageView, ZoneCoverageDetailView,
 )
 
 urlpatterns = [
@@ -8,5 +10,10 @@ urlpatterns = [
     path("create/", ZoneCreateView.as_view(), name="zone-create"),
     path("<int:zone_id>/", ZoneDetailView.as_view(), name="zone-detail"),
     path("<int:zone_id>/update/", ZoneUpdateView.as_view(), name="zone-update"),
+    path("<int:zone_id>/rollup/", ZoneRollupView.as_view(), name="zone-rollup"),
+    path("<int:zone_id>/coverage/", ZoneCoverageDetailView.as_view(), name="zone-coverage-detail"),
+    path("coverage/", ZoneCoverageView.as_view(), name="zone-coverage"),
     path("check-point/", PointInZoneView.as_view(), name="point-in-zone"),
+    path("check-points/", BatchPointInZoneView.as_view(), name="batch-point-in-zone"),
+    path("tiles/<int:z>/<int:x>/<int:y>.mvt", ZoneTileView.as_view(), name="zone-tile"),
 ]
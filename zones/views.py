@@ -1,14 +1,27 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.exceptions import ValidationError
+from django.contrib.gis.geos import Point
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.dateparse import parse_date
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from .models import Zone
+from .parsers import PointArrayParser
+from .renderers import MVTRenderer
+from .coverage import coverage_report, zone_coverage_report
+from .rollups import zone_rollup
+from . import services, tiles
 from .serializers import (
     ZoneCreateSerializer,
     ZoneUpdateSerializer,
     ZoneListSerializer,
+    boundary_options,
+    unused_boundary_fields,
 )
 
 # Reusable error responses
@@ -17,6 +30,16 @@ error_404 = openapi.Response('Not Found', examples={"application/json": {"detail
 
 tag = ['Zones']
 
+# Boundary rendering options (zones.serializers.boundary_options)
+boundary_parameters = [
+    openapi.Parameter('zoom', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, required=False,
+                      description="Map zoom level; serves a boundary simplified for that zoom"),
+    openapi.Parameter('simplify', openapi.IN_QUERY, type=openapi.TYPE_NUMBER, required=False,
+                      description="Simplification tolerance in degrees"),
+    openapi.Parameter('precision', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, required=False,
+                      description="Decimal places kept in boundary coordinates"),
+]
+
 # -------------------------------
 # CREATE ZONE
 # -------------------------------
@@ -88,14 +111,28 @@ class ZoneListView(APIView):
                 type=openapi.TYPE_STRING,
                 required=False,
                 example="Accra"
-            )
+            ),
+            openapi.Parameter(
+                'within',
+                openapi.IN_QUERY,
+                description="Only sub-zones (at any depth) of this zone id",
+                type=openapi.TYPE_INTEGER,
+                required=False
+            ),
+            *boundary_parameters,
         ],
         responses={200: ZoneListSerializer(many=True)},
     )
     def get(self, request):
+        options = boundary_options(request.query_params)
         city = request.query_params.get('city')
         queryset = Zone.objects.filter(city__iexact=city) if city else Zone.objects.all()
-        serializer = ZoneListSerializer(queryset, many=True)
+        queryset = queryset.defer(*unused_boundary_fields(options))
+        within = request.query_params.get('within')
+        if within:
+            parent = get_object_or_404(Zone, zone_id=within)
+            queryset = queryset.descendants_of(parent)
+        serializer = ZoneListSerializer(queryset, many=True, context=options)
         return Response(serializer.data)
 
 
@@ -104,11 +141,75 @@ class ZoneDetailView(APIView):
         tags=tag,
         operation_summary="Retrieve a single zone",
         operation_id="retrieve_zone",
+        manual_parameters=boundary_parameters,
         responses={200: ZoneListSerializer, 404: error_404},
     )
+    def get(self, request, zone_id):
+        options = boundary_options(request.query_params)
+        zone = get_object_or_404(Zone.objects.defer(*unused_boundary_fields(options)), zone_id=zone_id)
+        return Response(ZoneListSerializer(zone, context=options).data)
+
+class ZoneRollupView(APIView):
+    @swagger_auto_schema(
+        tags=tag,
+        operation_summary="Request, route and collector totals for a zone and its sub-zones",
+        operation_id="zone_rollup",
+        manual_parameters=[
+            openapi.Parameter('date_from', openapi.IN_QUERY, type=openapi.TYPE_STRING, format='date', required=False),
+            openapi.Parameter('date_to', openapi.IN_QUERY, type=openapi.TYPE_STRING, format='date', required=False),
+        ],
+        responses={200: "Totals for the zone and each direct sub-zone", 400: error_400, 404: error_404},
+    )
     def get(self, request, zone_id):
         zone = get_object_or_404(Zone, zone_id=zone_id)
-        return Response(ZoneListSerializer(zone).data)
+        dates = {}
+        for param in ('date_from', 'date_to'):
+            value = request.query_params.get(param)
+            if value:
+                dates[param] = parse_date(value)
+                if dates[param] is None:
+                    return Response({"error": f"{param} must be YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(zone_rollup(zone, **dates))
+
+coverage_parameters = [
+    openapi.Parameter('since', openapi.IN_QUERY, type=openapi.TYPE_STRING, format='date', required=False,
+                      description="Only request locations with a pickup date on or after this (default: last 90 days)"),
+]
+
+
+def _since(request):
+    value = request.query_params.get('since')
+    if not value:
+        return None
+    since = parse_date(value)
+    if since is None:
+        raise ValidationError({"since": "Must be YYYY-MM-DD."})
+    return since
+
+
+class ZoneCoverageView(APIView):
+    @swagger_auto_schema(
+        tags=tag,
+        operation_summary="Zone overlaps, coverage gaps and request locations outside every zone",
+        operation_id="zone_coverage",
+        manual_parameters=coverage_parameters,
+        responses={200: "Coverage report", 400: error_400},
+    )
+    def get(self, request):
+        return Response(coverage_report(_since(request)))
+
+
+class ZoneCoverageDetailView(APIView):
+    @swagger_auto_schema(
+        tags=tag,
+        operation_summary="Overlaps, nearby gaps and uncovered locations around one zone",
+        operation_id="zone_coverage_detail",
+        manual_parameters=coverage_parameters,
+        responses={200: "Coverage report", 400: error_400, 404: error_404},
+    )
+    def get(self, request, zone_id):
+        get_object_or_404(Zone, zone_id=zone_id)
+        return Response(zone_coverage_report(zone_id, _since(request)))
 
 ## ===========================
 # POINT IN ZONE CHECK (BONUS & SUPER USEFUL)
@@ -152,11 +253,104 @@ class PointInZoneView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Assuming your Zone model has a .contains_point(lat, lng) method
-        zones = [
-            zone for zone in Zone.objects.all()
-            if zone.contains_point(lat, lng)
-        ]
+        # Filtered in the database so the GiST index on boundary is used
+        zones = Zone.objects.filter(boundary__contains=Point(lng, lat, srid=4326))
 
         serializer = ZoneListSerializer(zones, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+
+
+# ===========================
+# BATCH POINT IN ZONE
+# ===========================
+batch_point_request_schema = openapi.Schema(
+    type=openapi.TYPE_OBJECT,
+    description=(
+        "Either `points` as [lat, lng] pairs or parallel `lats`/`lngs` arrays, up to "
+        f"{services.MAX_BATCH_POINTS} points. An application/octet-stream body of "
+        "little-endian float64 (lat, lng) pairs is also accepted."
+    ),
+    properties={
+        "points": openapi.Schema(
+            type=openapi.TYPE_ARRAY,
+            items=openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_NUMBER)),
+        ),
+        "lats": openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_NUMBER)),
+        "lngs": openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_NUMBER)),
+    },
+    example={"points": [[5.603718, -0.187197], [5.614818, -0.205874]]}
+)
+
+
+class BatchPointInZoneView(APIView):
+    parser_classes = [JSONParser, PointArrayParser]
+
+    @swagger_auto_schema(
+        tags=tag,
+        operation_summary="Resolve many coordinates to zone ids",
+        operation_description=(
+            "Returns {\"count\", \"zone_ids\"} in request order, null where no active zone "
+            "contains the point (the smallest zone wins where zones overlap). With "
+            "Accept: application/octet-stream the ids are returned as little-endian int64, -1 for no zone."
+        ),
+        operation_id="batch_point_in_zone",
+        request_body=batch_point_request_schema,
+        responses={200: "Zone ids in request order", 400: error_400}
+    )
+    def post(self, request):
+        data = request.data
+        try:
+            if isinstance(data, tuple):
+                lats, lngs = data
+            elif isinstance(data, dict) and "points" in data:
+                lats, lngs = services.points_from_pairs(data["points"])
+            elif isinstance(data, dict) and "lats" in data and "lngs" in data:
+                lats, lngs = services.points_from_arrays(data["lats"], data["lngs"])
+            else:
+                return Response(
+                    {"error": "Send points, or lats and lngs"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            zone_ids = services.resolve_points(lats, lngs)
+        except services.InvalidPoints as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if "application/octet-stream" in request.META.get("HTTP_ACCEPT", ""):
+            return StreamingHttpResponse(
+                services.iter_binary(zone_ids), content_type="application/octet-stream"
+            )
+        return StreamingHttpResponse(services.iter_json(zone_ids), content_type="application/json")
+
+
+# ===========================
+# VECTOR TILES
+# ===========================
+LIVE_LAYER_ROLES = ('supervisor', 'company')
+
+
+class ZoneTileView(APIView):
+    # Map clients send the tile type or */*; JSON stays available for API clients
+    renderer_classes = [MVTRenderer, JSONRenderer]
+
+    @swagger_auto_schema(
+        tags=tag,
+        operation_summary="Mapbox vector tile of zones, pending requests and today's route stops",
+        operation_description=(
+            "Layers: `zones` (active zone boundaries), plus `requests` (pending on-demand requests) "
+            "and `stops` (today's route stops) for supervisor and company accounts."
+        ),
+        operation_id="zone_tile",
+        responses={200: "application/vnd.mapbox-vector-tile", 404: error_404},
+    )
+    def get(self, request, z, x, y):
+        if not tiles.is_valid_tile(z, x, y):
+            return Response({"detail": "Tile out of range"}, status=status.HTTP_404_NOT_FOUND)
+        user = request.user
+        live = bool(user and user.is_authenticated and getattr(user, 'role', None) in LIVE_LAYER_ROLES)
+        response = HttpResponse(
+            tiles.render_tile(z, x, y, live_layers=live),
+            content_type="application/vnd.mapbox-vector-tile",
+        )
+        response["Cache-Control"] = "private, max-age=30" if live else "public, max-age=300"
+        response["Vary"] = "Authorization, Cookie"
+        return response